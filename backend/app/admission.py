@@ -0,0 +1,201 @@
+"""
+Admission control for the API: requests are refused early and cheaply instead of queueing
+without bound once the process is saturated.
+
+- Rate limits: a token bucket per client and route class. `auth` (login and registration, bcrypt
+  bound), `write` (other non-GET API calls) and `read` (GET API calls) each have their own rate
+  and burst. Over the limit: 429 with Retry-After (when the next token arrives).
+- Concurrency: at most ADMISSION_MAX_CONCURRENT API requests run at once. Beyond that up to
+  ADMISSION_MAX_QUEUED wait up to ADMISSION_QUEUE_TIMEOUT_SECONDS for a slot; the rest, and those
+  whose wait times out, get 503 with Retry-After.
+
+The client is the connection's peer address; behind a reverse proxy run uvicorn with
+--proxy-headers (and --forwarded-allow-ips) so that is the real client. State is per process:
+with N workers a client can get up to N times its rate. The event stream (GET /posts/stream) is
+rate limited like any read but does not hold a concurrency slot. The feeds count as reads; other
+non-API paths (the SPA, static files, /metrics, health checks) are not limited at all.
+"""
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from . import metrics
+from .serialization import dumps
+
+ADMISSION_CONTROL = os.getenv("ADMISSION_CONTROL", "true").lower() in ("1", "true", "yes")
+ADMISSION_RATE_LIMITS = os.getenv("ADMISSION_RATE_LIMITS", "true").lower() in ("1", "true", "yes")
+
+def _limit(value: str) -> Tuple[float, float]:
+    # "rate,burst": tokens per second and bucket size. A rate of 0 disables the class's limit.
+    rate, _, burst = value.partition(",")
+    rate = float(rate)
+    return rate, float(burst) if burst else max(1.0, rate)
+
+RATE_LIMITS: Dict[str, Tuple[float, float]] = {
+    "auth": _limit(os.getenv("ADMISSION_AUTH_LIMIT", "0.2,10")),
+    "write": _limit(os.getenv("ADMISSION_WRITE_LIMIT", "5,30")),
+    "read": _limit(os.getenv("ADMISSION_READ_LIMIT", "50,200")),
+}
+# Buckets kept; the least recently seen client's is dropped beyond this (it restarts full).
+ADMISSION_MAX_CLIENTS = int(os.getenv("ADMISSION_MAX_CLIENTS", "100000"))
+
+ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", "64"))
+ADMISSION_MAX_QUEUED = int(os.getenv("ADMISSION_MAX_QUEUED", "128"))
+ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "1"))
+ADMISSION_RETRY_AFTER_SECONDS = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", "1"))
+
+API_PREFIX = "/api/v1/"
+AUTH_PATHS = frozenset({"/api/v1/users/token", "/api/v1/users/register"})
+# Long-lived responses: rate limited when opened, but never hold a concurrency slot.
+UNBOUNDED_PATHS = frozenset({"/api/v1/posts/stream"})
+
+DECISIONS = metrics.Counter("admission_requests_total", "API requests by admission outcome (admitted, rate_limited, shed).", ("route_class", "outcome"))
+QUEUE_WAIT = metrics.Histogram("admission_queue_wait_seconds", "Time admitted requests waited for a concurrency slot.")
+
+def route_class(method: str, path: str) -> Optional[str]:
+    """The rate limit class of a request, or None for requests admission control ignores."""
+    if method == "OPTIONS":
+        return None
+    if not path.startswith(API_PREFIX):
+        # Feeds are polled by readers on their own schedule, so they are limited like API reads.
+        return "read" if path.endswith("/feed.xml") else None
+    if path in AUTH_PATHS:
+        return "auth"
+    return "read" if method in ("GET", "HEAD") else "write"
+
+class RateLimiter:
+    """Token buckets per (route class, client). Only used from the event loop, so no locking."""
+
+    def __init__(self, limits: Dict[str, Tuple[float, float]] = RATE_LIMITS, max_clients: int = ADMISSION_MAX_CLIENTS):
+        self.limits = limits
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[Tuple[str, str], list]" = OrderedDict() # -> [tokens, updated_at]
+
+    def acquire(self, cls: str, client: str) -> float:
+        """Takes a token; returns 0 if one was available, else the seconds until the next one."""
+        rate, burst = self.limits[cls]
+        if rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        key = (cls, client)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [burst, now]
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return 0.0
+        return (1 - bucket[0]) / rate
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+class ConcurrencyLimiter:
+    """Caps requests running at once, with a short bounded wait for a slot instead of a queue."""
+
+    def __init__(self, limit: int = ADMISSION_MAX_CONCURRENT, max_queued: int = ADMISSION_MAX_QUEUED,
+                 timeout: float = ADMISSION_QUEUE_TIMEOUT_SECONDS):
+        self.limit = limit
+        self.max_queued = max_queued
+        self.timeout = timeout
+        self.running = 0
+        self.queued = 0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def acquire(self) -> bool:
+        """True once a slot is held (release() it afterwards), False if the request is shed."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.limit)
+        if not self._semaphore.locked():
+            await self._semaphore.acquire() # Free slot: returns without suspending
+            self.running += 1
+            return True
+        if self.queued >= self.max_queued:
+            return False
+        self.queued += 1
+        start = time.perf_counter()
+        # An explicit waiter rather than wait_for(): a slot granted just as the deadline passes
+        # (or as this request is cancelled) must be handed back, not leaked with the 503.
+        waiter = asyncio.ensure_future(self._semaphore.acquire())
+        try:
+            await asyncio.wait((waiter,), timeout=self.timeout)
+        except BaseException: # This request was cancelled while waiting
+            self._abandon(waiter)
+            raise
+        finally:
+            self.queued -= 1
+        if not waiter.done():
+            self._abandon(waiter)
+            return False
+        QUEUE_WAIT.observe(time.perf_counter() - start)
+        self.running += 1
+        return True
+
+    def release(self) -> None:
+        self.running -= 1
+        self._semaphore.release()
+
+    def _abandon(self, waiter: asyncio.Future) -> None:
+        # Cancels a wait nobody will use; a slot granted anyway (even already) is released.
+        waiter.cancel()
+        waiter.add_done_callback(lambda done: done.cancelled() or self._semaphore.release())
+
+rate_limiter = RateLimiter()
+concurrency_limiter = ConcurrencyLimiter()
+
+async def _reject(send, status_code: int, detail: str, retry_after: int) -> None:
+    body = dumps({"detail": detail})
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(retry_after).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+class AdmissionMiddleware:
+    """Pure ASGI middleware applying the rate and concurrency limits before any routing or I/O."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        cls = route_class(scope["method"], scope["path"]) if scope["type"] == "http" and ADMISSION_CONTROL else None
+        if cls is None:
+            await self.app(scope, receive, send)
+            return
+        if ADMISSION_RATE_LIMITS:
+            client = scope["client"][0] if scope.get("client") else "unknown"
+            wait = rate_limiter.acquire(cls, client)
+            if wait > 0:
+                DECISIONS.inc(route_class=cls, outcome="rate_limited")
+                await _reject(send, 429, "Too many requests. Please retry later.", math.ceil(wait))
+                return
+        if scope["path"] in UNBOUNDED_PATHS:
+            DECISIONS.inc(route_class=cls, outcome="admitted")
+            await self.app(scope, receive, send)
+            return
+        if not await concurrency_limiter.acquire():
+            DECISIONS.inc(route_class=cls, outcome="shed")
+            await _reject(send, 503, "The server is busy. Please retry shortly.", ADMISSION_RETRY_AFTER_SECONDS)
+            return
+        DECISIONS.inc(route_class=cls, outcome="admitted")
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            concurrency_limiter.release()
+
+metrics.CallbackMetric("admission_running", "API requests holding a concurrency slot.", "gauge", lambda: concurrency_limiter.running)
+metrics.CallbackMetric("admission_queued", "API requests waiting for a concurrency slot.", "gauge", lambda: concurrency_limiter.queued)
+metrics.CallbackMetric("admission_rate_limit_buckets", "Per-client rate limit buckets in memory.", "gauge", lambda: len(rate_limiter))
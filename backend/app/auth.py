@@ -4,13 +4,13 @@ from typing import Optional, Annotated
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
-from passlib.context import CryptContext
 from pydantic import ValidationError
-from sqlalchemy.orm import Session
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.orm import make_transient_to_detached
 
-from . import crud, models, schemas
-from .database import get_db
+from . import crud_async, hashing, metrics, models, schemas
+from .database import DbSession, get_db, is_async_session, release, write_session
+from .principal_cache import principal_cache
 
 # Environment variables - Ensure these are set in your environment for production
 # For development, the defaults are used.
@@ -21,21 +21,21 @@ ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
 if SECRET_KEY == "your-secret-key-for-dev-only-change-in-prod":
     print("WARNING: Using default SECRET_KEY. This is insecure and should only be used for development.")
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 # This URL must match the full path to the token endpoint
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/users/token")
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verifies a plain password against a hashed password."""
-    return pwd_context.verify(plain_password, hashed_password)
+    """Verifies a plain password against a hashed password. Blocking; request handlers use
+    hashing.verify_and_update instead."""
+    return hashing.get_pwd_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    """Hashes a plain password."""
-    return pwd_context.hash(password)
+    """Hashes a plain password. Blocking; request handlers use hashing.hash_password instead."""
+    return hashing.get_pwd_context().hash(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Creates a new JWT access token."""
+    from jose import jwt # Imported on first use: python-jose loads its crypto backend eagerly
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.now(timezone.utc) + expires_delta
@@ -45,45 +45,76 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def authenticate_user(db: Session, username_or_email: str, password: str) -> Optional[models.User]:
-    """Authenticates a user by username or email and password."""
+async def authenticate_user(db: DbSession, username_or_email: str, password: str) -> Optional[models.User]:
+    """Authenticates a user by username or email and password. `db` is only used for the
+    lookup (a read session will do) and is released before the password is checked."""
     # Try to find user by username first
-    user = crud.get_user_by_username(db, username=username_or_email)
+    user = await crud_async.get_user_by_username(db, username=username_or_email)
     if not user:
         # If not found by username, try by email
-        user = crud.get_user_by_email(db, email=username_or_email)
+        user = await crud_async.get_user_by_email(db, email=username_or_email)
     
     if not user:
         return None # User not found by either username or email
-    if not verify_password(password, user.hashed_password):
+    # The lookup is done: no connection is held while bcrypt runs. The user stays usable detached.
+    await release(db)
+    # bcrypt verification is CPU-bound, so it runs in the bounded hash pool
+    with metrics.phase("auth"):
+        verified, new_hash = await hashing.verify_and_update(password, user.hashed_password)
+    if not verified:
         return None # Password does not match
+    if new_hash:
+        # The stored hash predates the current bcrypt settings; upgrade it while we know the password.
+        # Only this write needs the writer, so it gets a session of its own.
+        async with write_session() as write_db:
+            user = await crud_async.update_password_hash(write_db, db_user=user, hashed_password=new_hash)
     return user
 
-async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], db: Session = Depends(get_db)) -> models.User:
+def _user_snapshot(user: models.User) -> dict:
+    """Captures a loaded user's column values for the principal cache."""
+    return {attr.key: getattr(user, attr.key) for attr in sa_inspect(models.User).column_attrs}
+
+def _attach_cached_user(db: DbSession, snapshot: dict) -> models.User:
+    """Rebuilds a cached user as a persistent instance of this request's session without a SELECT.
+    Each request gets its own instance, so routes can still modify and commit it."""
+    user = models.User(**snapshot)
+    make_transient_to_detached(user)
+    session = db.sync_session if is_async_session(db) else db
+    return session.merge(user, load=False)
+
+async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], db: DbSession = Depends(get_db)) -> models.User:
     """Dependency to get the current user from a JWT token."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        subject: Optional[str] = payload.get("sub") # 'sub' typically holds the username or user ID
-        if subject is None:
-            raise credentials_exception
+    cached = principal_cache.get(token)
+    if cached is not None:
+        return _attach_cached_user(db, cached)
+    cache_epoch = principal_cache.epoch
+    from jose import JWTError, jwt
+
+    with metrics.phase("auth"):
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            subject: Optional[str] = payload.get("sub") # 'sub' typically holds the username or user ID
+            if subject is None:
+                raise credentials_exception
         
-        # Validate the payload structure using Pydantic schema
-        token_data = schemas.TokenPayload(sub=subject)
-    except (JWTError, ValidationError) as e: # Catch JWT errors or Pydantic validation errors
-        # For debugging: print(f"Token validation error: {e}")
-        raise credentials_exception
+            # Validate the payload structure using Pydantic schema
+            token_data = schemas.TokenPayload(sub=subject)
+        except (JWTError, ValidationError) as e: # Catch JWT errors or Pydantic validation errors
+            # For debugging: print(f"Token validation error: {e}")
+            raise credentials_exception
     
-    # Fetch user based on 'sub' (username) from token payload
-    user = crud.get_user_by_username(db, username=token_data.sub) 
-    if user is None:
-        # This case implies the token's subject refers to a non-existent user.
-        # This could happen if a user was deleted after a token was issued.
-        raise credentials_exception
+        # Fetch user based on 'sub' (username) from token payload
+        user = await crud_async.get_user_by_username(db, username=token_data.sub) 
+        if user is None:
+            # This case implies the token's subject refers to a non-existent user.
+            # This could happen if a user was deleted after a token was issued.
+            raise credentials_exception
+    principal_cache.put(token, user.id, _user_snapshot(user), payload.get("exp"), cache_epoch)
     return user
 
 async def get_current_active_user(current_user: Annotated[models.User, Depends(get_current_user)]) -> models.User:
@@ -0,0 +1,34 @@
+import os
+from typing import Any, List, Sequence, Tuple
+
+from fastapi import HTTPException, status
+
+# Upper bound on ids per GET /posts/batch or /users/batch request: one IN (...) query and one
+# response each, so the cap bounds the statement's parameters and the response size.
+BATCH_MAX_IDS = int(os.getenv("BATCH_MAX_IDS", "100"))
+# Largest id a BIGINT (and SQLite's INTEGER) column holds; bigger ones cannot be bound as parameters.
+MAX_ID = 2**63 - 1
+
+def parse_ids(raw: str) -> List[int]:
+    """Parses the comma-separated `ids` query parameter. Duplicates are dropped, keeping the
+    first occurrence, so the result is the order the items come back in."""
+    ids = []
+    for part in raw.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        # Plain ASCII digits only: int() also takes "+5", "1_0" and other Unicode digits.
+        if not (part.isascii() and part.isdigit()) or int(part) > MAX_ID:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid id: {part[:20]!r}")
+        ids.append(int(part))
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No ids given")
+    if len(ids) > BATCH_MAX_IDS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"At most {BATCH_MAX_IDS} ids per request")
+    return ids
+
+def in_request_order(ids: Sequence[int], rows: Sequence[Any]) -> Tuple[List[Any], List[int]]:
+    """Orders rows fetched by an IN (...) query like `ids`; returns (rows, ids with no row)."""
+    by_id = {row.id: row for row in rows}
+    return [by_id[i] for i in ids if i in by_id], [i for i in ids if i not in by_id]
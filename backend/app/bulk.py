@@ -0,0 +1,254 @@
+"""
+Streaming NDJSON export and batched import of posts.
+
+Export walks posts in id order through a server-side cursor (yield_per), so memory stays flat
+however many posts exist. Import validates each line on its own, inserts valid rows with one
+executemany INSERT per batch, commits once per batch, and records per-line errors instead of
+aborting. Lines in the export format can be imported as-is; extra fields are ignored.
+
+CLI (run from backend/; uses DATABASE_URL, by default the server's database in the project root):
+    python -m app.bulk export > posts.ndjson
+    python -m app.bulk import posts.ndjson --owner alice [--batch-size 1000]
+"""
+import json
+from datetime import datetime, timezone
+from typing import AsyncIterator, Callable, Iterable, Iterator, List, Optional, Union
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from . import crud, models, response_cache, schemas
+from .database import DB_ASYNC, AsyncReadSessionLocal, ReadSessionLocal
+
+EXPORT_BATCH_SIZE = 1000
+IMPORT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000 # Beyond this only the count is kept
+# Longer lines are reported as errors without being buffered (and without stalling on a body that
+# never sends a newline).
+MAX_LINE_BYTES = 1024 * 1024
+
+def _export_statement():
+    return (
+        select(
+            models.Post.id, models.Post.title, models.Post.content, models.Post.owner_id,
+            models.User.username.label("owner_username"), models.Post.created_at, models.Post.updated_at,
+        )
+        .join(models.Post.owner)
+        .order_by(models.Post.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+
+def _encode_rows(rows) -> bytes:
+    # One chunk per fetched batch keeps write calls (and threadpool hops) down.
+    return b"".join(
+        (json.dumps({**row._mapping}, default=lambda value: value.isoformat(), ensure_ascii=False) + "\n").encode("utf-8")
+        for row in rows
+    )
+
+def export_posts_sync() -> Iterator[bytes]:
+    """Yields NDJSON chunks for all posts using a dedicated session and a server-side cursor."""
+    with ReadSessionLocal() as db:
+        result = db.execute(_export_statement())
+        for rows in result.partitions():
+            yield _encode_rows(rows)
+
+async def export_posts_async() -> AsyncIterator[bytes]:
+    """DB_ASYNC counterpart of export_posts_sync, streaming through AsyncSession.stream()."""
+    async with AsyncReadSessionLocal() as db:
+        result = await db.stream(_export_statement())
+        async for rows in result.partitions():
+            yield _encode_rows(rows)
+
+def export_posts():
+    """Returns the NDJSON chunk iterator matching the configured database mode."""
+    return export_posts_async() if DB_ASYNC else export_posts_sync()
+
+class ImportReport:
+    """Accumulates the outcome of an import: inserted count plus per-line errors."""
+
+    def __init__(self):
+        self.inserted = 0
+        self.failed = 0
+        self.errors: List[schemas.BulkImportError] = []
+
+    def add_error(self, line: int, error: str) -> None:
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(schemas.BulkImportError(line=line, error=error))
+
+    def result(self) -> schemas.BulkImportResult:
+        return schemas.BulkImportResult(inserted=self.inserted, failed=self.failed, errors=self.errors)
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # SQLite stores a datetime's wall-clock time and drops its offset, so an imported
+    # 05:00+05:00 would sort as 05:00 UTC among the other posts. Naive values are taken as UTC.
+    if value is None:
+        return None
+    return value.astimezone(timezone.utc) if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+def parse_line(raw: Union[bytes, str], owner_id: int, now: datetime) -> dict:
+    """Validates one NDJSON line and returns the row to insert. Raises ValueError on bad input."""
+    try:
+        item = schemas.PostImport.model_validate_json(raw)
+    except ValidationError as e:
+        raise ValueError("; ".join(f"{'.'.join(map(str, err['loc'])) or 'line'}: {err['msg']}" for err in e.errors())) from None
+    created_at = _as_utc(item.created_at) or now
+    return {
+        "title": item.title,
+        "content": item.content,
+        **crud.summarize_content(item.content),
+        "owner_id": owner_id,
+        "created_at": created_at,
+        "updated_at": _as_utc(item.updated_at) or created_at,
+    }
+
+def insert_batch(db: Session, rows: List[dict], line_numbers: List[int], report: ImportReport) -> None:
+    """Inserts a batch in one transaction. If the batch fails as a whole, rows are retried one
+    at a time so a single bad row only costs its own line."""
+    if not rows:
+        return
+    try:
+        db.execute(insert(models.Post), rows)
+        db.commit()
+        report.inserted += len(rows)
+    except SQLAlchemyError:
+        db.rollback()
+        for row, line in zip(rows, line_numbers):
+            try:
+                db.execute(insert(models.Post), [row])
+                db.commit()
+                report.inserted += 1
+            except SQLAlchemyError as e:
+                db.rollback()
+                report.add_error(line, f"database error: {e.__class__.__name__}")
+    response_cache.invalidate_post_created(rows[0]["owner_id"])
+
+class BatchImporter:
+    """
+    Turns NDJSON lines into insert batches. feed() returns True once a batch is full (feed_chunk(),
+    for a body read in chunks, yields instead); callers then pass take_batch() to insert_batch
+    however suits them (directly, or via crud_async.run).
+    """
+
+    def __init__(self, owner_id: int, batch_size: int = IMPORT_BATCH_SIZE):
+        self.owner_id = owner_id
+        self.batch_size = batch_size
+        self.report = ImportReport()
+        self.line_no = 0
+        self._now = datetime.now(timezone.utc)
+        self._rows: List[dict] = []
+        self._lines: List[int] = []
+        self._tail = bytearray() # The start of a line split across chunks, see feed_chunk()
+        self._skipping = False # The current line is too long and is being discarded
+
+    def feed(self, raw: Union[bytes, str]) -> bool:
+        """Parses one line. Returns True when a full batch is ready to be taken."""
+        self.line_no += 1
+        if len(raw) > MAX_LINE_BYTES:
+            self._reject_long_line()
+            return False
+        if not raw.strip():
+            return False
+        try:
+            self._rows.append(parse_line(raw, self.owner_id, self._now))
+            self._lines.append(self.line_no)
+        except ValueError as e:
+            self.report.add_error(self.line_no, str(e))
+        return len(self._rows) >= self.batch_size
+
+    def feed_chunk(self, chunk: bytes) -> Iterator[None]:
+        """Feeds the complete lines of a body chunk, yielding each time a batch is ready to be taken.
+        Only the new chunk is scanned for newlines; the unterminated rest is kept for the next chunk,
+        unless the line has outgrown MAX_LINE_BYTES, in which case it is dropped up to its end."""
+        start = 0
+        while True:
+            end = chunk.find(b"\n", start)
+            if end < 0:
+                break
+            ready = False
+            if self._skipping:
+                self._skipping = False
+                self.line_no += 1
+                self._reject_long_line()
+            elif self._tail:
+                self._tail += chunk[start:end]
+                ready = self.feed(bytes(self._tail))
+                self._tail.clear()
+            else:
+                ready = self.feed(chunk[start:end])
+            start = end + 1
+            if ready:
+                yield
+        if not self._skipping:
+            self._tail += chunk[start:]
+            if len(self._tail) > MAX_LINE_BYTES:
+                self._skipping = True
+                self._tail.clear()
+
+    def finish(self) -> None:
+        """Feeds the last line of the body if it did not end with a newline."""
+        if self._skipping or self._tail:
+            for _ in self.feed_chunk(b"\n"): # The caller inserts what is left, full batch or not
+                pass
+
+    def _reject_long_line(self) -> None:
+        self.report.add_error(self.line_no, f"line longer than {MAX_LINE_BYTES} bytes")
+
+    def take_batch(self):
+        rows, lines = self._rows, self._lines
+        self._rows, self._lines = [], []
+        return rows, lines
+
+def import_lines(db: Session, lines: Iterable[Union[bytes, str]], owner_id: int, batch_size: int = IMPORT_BATCH_SIZE,
+                 progress: Optional[Callable[[ImportReport], None]] = None) -> schemas.BulkImportResult:
+    """Synchronous import used by the CLI."""
+    importer = BatchImporter(owner_id, batch_size)
+    for raw in lines:
+        if importer.feed(raw):
+            insert_batch(db, *importer.take_batch(), importer.report)
+            if progress:
+                progress(importer.report)
+    insert_batch(db, *importer.take_batch(), importer.report)
+    return importer.report.result()
+
+def _main() -> None:
+    import argparse
+    import sys
+
+    from . import schema
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Bulk export/import posts as NDJSON.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("export", help="write all posts to stdout as NDJSON")
+    import_parser = sub.add_parser("import", help="insert posts from an NDJSON file ('-' for stdin)")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--owner", required=True, help="username that will own the imported posts")
+    import_parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        for chunk in export_posts_sync():
+            sys.stdout.buffer.write(chunk)
+        return
+
+    schema.ensure_schema()
+    with SessionLocal() as db:
+        owner = crud.get_user_by_username(db, username=args.owner)
+        if owner is None:
+            parser.error(f"unknown user: {args.owner}")
+        source = sys.stdin.buffer if args.path == "-" else open(args.path, "rb")
+        with source:
+            result = import_lines(
+                db, source, owner.id, args.batch_size,
+                progress=lambda report: print(f"\rinserted {report.inserted}, failed {report.failed}", end="", file=sys.stderr),
+            )
+    print(file=sys.stderr)
+    for error in result.errors:
+        print(f"line {error.line}: {error.error}", file=sys.stderr)
+    print(json.dumps({"inserted": result.inserted, "failed": result.failed}))
+
+if __name__ == "__main__":
+    _main()
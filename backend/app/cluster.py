@@ -0,0 +1,246 @@
+"""
+Coordination between worker processes started by app.serve, through a small SQLite file shared
+by the workers on one host (CLUSTER_STATE_PATH; app.serve creates it). No server is involved.
+
+- Cache invalidation: the caches invalidate locally, then publish() the event to the `changes`
+  table. Every worker polls the table and applies other workers' events, so a write served by
+  one worker reaches the response and principal caches of all of them within CLUSTER_POLL_SECONDS.
+  A worker that falls behind the retained log clears its caches instead of guessing.
+- Ordered events: subscribe_ordered() handlers get every worker's events of a kind, this
+  worker's own included, in `changes.id` order with that id, which is the same in all workers
+  (post_events uses it as the SSE event id, so a client can resume on any worker).
+- Load report: each worker writes a heartbeat row with its CPU utilisation, request rate and
+  in-flight requests; app.serve logs them (see load_report()).
+
+With CLUSTER_STATE_PATH unset (a single process), publish() does nothing and no thread is started.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional
+
+from . import metrics
+
+CLUSTER_STATE_PATH = os.getenv("CLUSTER_STATE_PATH", "")
+CLUSTER_POLL_SECONDS = float(os.getenv("CLUSTER_POLL_SECONDS", "0.1"))
+CLUSTER_HEARTBEAT_SECONDS = float(os.getenv("CLUSTER_HEARTBEAT_SECONDS", "5"))
+# Events older than this are pruned; a worker paused for longer clears its caches on resume.
+CLUSTER_CHANGE_RETENTION_SECONDS = float(os.getenv("CLUSTER_CHANGE_RETENTION_SECONDS", "60"))
+
+log = logging.getLogger("app.cluster")
+
+_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS changes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, origin INTEGER NOT NULL, kind TEXT NOT NULL,
+        payload TEXT NOT NULL, created_at REAL NOT NULL)""",
+    """CREATE TABLE IF NOT EXISTS workers (
+        pid INTEGER PRIMARY KEY, started_at REAL NOT NULL, updated_at REAL NOT NULL,
+        requests INTEGER NOT NULL, requests_per_second REAL NOT NULL, in_flight INTEGER NOT NULL,
+        cpu_seconds REAL NOT NULL, cpu_percent REAL NOT NULL)""",
+    "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)",
+]
+
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+def init_state(path: str) -> None:
+    """Creates an empty state file. Called once by the parent before any worker starts."""
+    for suffix in ("", "-wal", "-shm"):
+        try:
+            os.remove(path + suffix)
+        except FileNotFoundError:
+            pass
+    conn = _connect(path)
+    try:
+        for statement in _SCHEMA:
+            conn.execute(statement)
+        # Identifies this state file: change ids start over with a new one (a server restart).
+        conn.execute("INSERT INTO meta VALUES ('epoch', ?)", (uuid.uuid4().hex[:8],))
+    finally:
+        conn.close()
+
+def _last_change_id(conn: sqlite3.Connection) -> int:
+    # The AUTOINCREMENT counter, not MAX(id): the table may have been pruned empty.
+    return conn.execute("SELECT COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'changes'), 0)").fetchone()[0]
+
+# kind -> handler(payload); registered by the caches at import time.
+_handlers: Dict[str, Callable[[object], None]] = {}
+# kind -> handler(change_id, payload) for the events of every worker, see subscribe_ordered().
+_ordered_handlers: Dict[str, Callable[[int, object], None]] = {}
+# Called when this worker may have missed events.
+_resync_handlers: List[Callable[[], None]] = []
+
+def subscribe(kind: str, handler: Callable[[object], None], resync: Optional[Callable[[], None]] = None) -> None:
+    """Registers the handler applying another worker's `kind` events to this process."""
+    _handlers[kind] = handler
+    if resync is not None:
+        _resync_handlers.append(resync)
+
+def subscribe_ordered(kind: str, handler: Callable[[int, object], None], resync: Optional[Callable[[], None]] = None) -> None:
+    """Registers a handler getting all `kind` events, this worker's own too, in change id order.
+    An event published here reaches it only through the poll, up to CLUSTER_POLL_SECONDS later."""
+    _ordered_handlers[kind] = handler
+    if resync is not None:
+        _resync_handlers.append(resync)
+
+class Cluster:
+    """This worker's connection to the shared state file: publishing, polling and heartbeats."""
+
+    def __init__(self, path: str = CLUSTER_STATE_PATH):
+        self.path = path
+        self.pid = os.getpid()
+        self.published = 0
+        self.applied = 0
+        self.resyncs = 0
+        # Set by start(): the state file's epoch, and the last change id before this worker started.
+        self.epoch: Optional[str] = None
+        self.start_id = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def publish(self, kind: str, payload: object) -> None:
+        """Records an event for the other workers (and for this one's subscribe_ordered() handler,
+        if the kind has one). Otherwise the caller has already applied it locally."""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._conn is None:
+                self._conn = _connect(self.path)
+            self._conn.execute(
+                "INSERT INTO changes (origin, kind, payload, created_at) VALUES (?, ?, ?, ?)",
+                (self.pid, kind, json.dumps(payload), time.time()),
+            )
+            self.published += 1
+
+    def start(self) -> None:
+        """Starts the poll/heartbeat thread (app startup). Events before this point are skipped:
+        a new worker starts with empty caches."""
+        if not self.enabled or self._thread is not None:
+            return
+        self.pid = os.getpid()
+        conn = _connect(self.path)
+        try:
+            self.epoch = conn.execute("SELECT value FROM meta WHERE key = 'epoch'").fetchone()[0]
+            self.start_id = _last_change_id(conn)
+        finally:
+            conn.close()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="cluster", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stops the thread and removes this worker's heartbeat row (app shutdown)."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self) -> None:
+        conn = _connect(self.path)
+        try:
+            last_id = self.start_id
+            started = time.time()
+            beat = _Heartbeat(started)
+            next_beat = 0.0
+            while not self._stop.wait(CLUSTER_POLL_SECONDS):
+                try:
+                    last_id = self._poll(conn, last_id)
+                    now = time.monotonic()
+                    if now >= next_beat:
+                        beat.write(conn, self.pid)
+                        conn.execute("DELETE FROM changes WHERE created_at < ?", (time.time() - CLUSTER_CHANGE_RETENTION_SECONDS,))
+                        next_beat = now + CLUSTER_HEARTBEAT_SECONDS
+                except Exception:
+                    # Keep polling: a dead thread would silently stop cross-worker invalidation.
+                    log.exception("Cluster poll failed")
+            conn.execute("DELETE FROM workers WHERE pid = ?", (self.pid,))
+        finally:
+            conn.close()
+
+    def _poll(self, conn: sqlite3.Connection, last_id: int) -> int:
+        rows = conn.execute(
+            "SELECT id, origin, kind, payload FROM changes WHERE id > ? ORDER BY id", (last_id,)
+        ).fetchall()
+        if rows and rows[0][0] != last_id + 1:
+            # Events between last_id and the oldest retained one were pruned before we saw them.
+            self.resyncs += 1
+            for resync in _resync_handlers:
+                resync()
+        for change_id, origin, kind, payload in rows:
+            ordered = _ordered_handlers.get(kind)
+            if ordered is not None:
+                ordered(change_id, json.loads(payload))
+            elif origin != self.pid:
+                handler = _handlers.get(kind)
+                if handler is not None:
+                    handler(json.loads(payload))
+                    self.applied += 1
+            last_id = change_id
+        return last_id
+
+class _Heartbeat:
+    """Computes this worker's load over each heartbeat interval and writes it to `workers`."""
+
+    def __init__(self, started_at: float):
+        self.started_at = started_at
+        self.last_time = time.monotonic()
+        self.last_cpu = time.process_time()
+        self.last_requests = metrics.REQUESTS.total()
+
+    def write(self, conn: sqlite3.Connection, pid: int) -> None:
+        now, cpu, requests = time.monotonic(), time.process_time(), metrics.REQUESTS.total()
+        elapsed = max(now - self.last_time, 1e-6)
+        conn.execute(
+            "INSERT OR REPLACE INTO workers VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (pid, self.started_at, time.time(), int(requests), (requests - self.last_requests) / elapsed,
+             int(metrics.IN_FLIGHT.total()), cpu, (cpu - self.last_cpu) / elapsed * 100),
+        )
+        self.last_time, self.last_cpu, self.last_requests = now, cpu, requests
+
+def load_report(path: str = CLUSTER_STATE_PATH) -> List[dict]:
+    """The latest heartbeat of every live worker (one that reported within three intervals)."""
+    conn = _connect(path)
+    try:
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute(
+            "SELECT * FROM workers WHERE updated_at >= ? ORDER BY pid", (time.time() - 3 * CLUSTER_HEARTBEAT_SECONDS,)
+        ).fetchall()
+        return [dict(row) for row in rows]
+    finally:
+        conn.close()
+
+def format_load_report(workers: List[dict]) -> str:
+    if not workers:
+        return "Load report: no workers have reported yet."
+    lines = [f"Load report ({len(workers)} workers, {os.cpu_count()} CPUs):"]
+    for worker in workers:
+        lines.append(
+            f"  worker {worker['pid']}: {worker['cpu_percent']:5.1f}% CPU, "
+            f"{worker['requests_per_second']:7.1f} req/s, {worker['in_flight']} in flight, {worker['requests']} requests"
+        )
+    mean_cpu = sum(worker["cpu_percent"] for worker in workers) / len(workers)
+    total_rps = sum(worker["requests_per_second"] for worker in workers)
+    # A worker runs Python on one core at a time, so ~100% CPU per worker means it is core-bound.
+    lines.append(f"  total: {total_rps:.1f} req/s, mean {mean_cpu:.1f}% CPU per worker")
+    return "\n".join(lines)
+
+cluster = Cluster()
+
+metrics.CallbackMetric("cluster_changes_published_total", "Cache invalidations published to the other workers.", "counter", lambda: cluster.published)
+metrics.CallbackMetric("cluster_changes_applied_total", "Cache invalidations received from other workers and applied.", "counter", lambda: cluster.applied)
+metrics.CallbackMetric("cluster_resyncs_total", "Times this worker fell behind the change log and cleared its caches.", "counter", lambda: cluster.resyncs)
+metrics.CallbackMetric("process_cpu_seconds_total", "CPU time used by this worker process.", "counter", time.process_time)
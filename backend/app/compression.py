@@ -0,0 +1,201 @@
+import gzip
+import os
+import zlib
+from typing import Dict, Iterable, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+# Content codings shared by the static file layer and API responses.
+# brotli and zstd are optional (pip install brotli zstandard); gzip is always available.
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() in ("1", "true", "yes")
+# Smaller bodies are sent as-is: below roughly one packet compression saves nothing.
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+ZSTD_LEVEL = int(os.getenv("ZSTD_LEVEL", "3"))
+# Files compressed ahead of time (see static_files.py) use the highest settings; the cost is paid once.
+PRECOMPRESS_GZIP_LEVEL = 9
+PRECOMPRESS_BROTLI_QUALITY = 11
+PRECOMPRESS_ZSTD_LEVEL = 19
+
+# Server preference order: the first coding the client accepts wins.
+ENCODINGS = (["br"] if brotli is not None else []) + (["zstd"] if zstandard is not None else []) + ["gzip"]
+FILE_SUFFIXES = {"br": ".br", "zstd": ".zst", "gzip": ".gz"}
+
+COMPRESSIBLE_TYPES = (
+    "text/", "application/json", "application/javascript", "application/x-javascript",
+    "application/xml", "application/rss+xml", "application/atom+xml", "application/manifest+json", "application/x-ndjson", "image/svg+xml",
+)
+
+def is_compressible(media_type: Optional[str]) -> bool:
+    # Event streams are excluded: a compressor would hold events back until its buffer fills.
+    return bool(media_type) and media_type.startswith(COMPRESSIBLE_TYPES) and not media_type.startswith("text/event-stream")
+
+def _parse_accept_encoding(header: str) -> Dict[str, float]:
+    accepted = {}
+    for item in header.split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+def negotiate(accept_encoding: Optional[str], offered: Iterable[str] = None) -> Optional[str]:
+    """Picks the content coding to use for a request's Accept-Encoding, or None for identity."""
+    if not accept_encoding:
+        return None
+    accepted = _parse_accept_encoding(accept_encoding)
+    wildcard = accepted.get("*", 0.0)
+    for coding in offered if offered is not None else ENCODINGS:
+        if accepted.get(coding, wildcard) > 0:
+            return coding
+    return None
+
+def compress(data: bytes, encoding: str, best: bool = False) -> bytes:
+    """Compresses `data` with `encoding`; `best` selects the slow, maximum-ratio settings."""
+    if encoding == "gzip":
+        # mtime=0 keeps the output deterministic, so equal inputs give equal bytes.
+        return gzip.compress(data, compresslevel=PRECOMPRESS_GZIP_LEVEL if best else GZIP_LEVEL, mtime=0)
+    if encoding == "br" and brotli is not None:
+        return brotli.compress(data, quality=PRECOMPRESS_BROTLI_QUALITY if best else BROTLI_QUALITY)
+    if encoding == "zstd" and zstandard is not None:
+        return zstandard.ZstdCompressor(level=PRECOMPRESS_ZSTD_LEVEL if best else ZSTD_LEVEL).compress(data)
+    raise ValueError(f"Unsupported content coding: {encoding}")
+
+class StreamCompressor:
+    """Incremental compressor for streaming responses: compress() per chunk, finish() at the end."""
+
+    def __init__(self, encoding: str):
+        if encoding == "gzip":
+            self._obj = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31) # wbits 31: gzip container
+            self._compress, self._finish = self._obj.compress, self._obj.flush
+        elif encoding == "br" and brotli is not None:
+            self._obj = brotli.Compressor(quality=BROTLI_QUALITY)
+            self._compress, self._finish = self._obj.process, self._obj.finish
+        elif encoding == "zstd" and zstandard is not None:
+            self._obj = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+            self._compress, self._finish = self._obj.compress, self._obj.flush
+        else:
+            raise ValueError(f"Unsupported content coding: {encoding}")
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compress(data)
+
+    def finish(self) -> bytes:
+        return self._finish()
+
+def choose_encoding(request_headers: Headers, media_type: Optional[str], size: Optional[int]) -> Optional[str]:
+    """The coding to apply to a dynamic response, or None to send it uncompressed.
+    `size` is None for streaming bodies of unknown length."""
+    if not COMPRESSION_ENABLED or not is_compressible(media_type):
+        return None
+    if size is not None and size < COMPRESSION_MIN_BYTES:
+        return None
+    return negotiate(request_headers.get("accept-encoding"))
+
+def mark_encoded(headers: MutableHeaders, encoding: str) -> None:
+    """Headers for a body encoded with `encoding`: Content-Encoding, Vary, and a weak ETag.
+    The ETag is weakened (as nginx does) rather than changed, so If-None-Match still compares
+    equal against the identity ETag that the conditional-request code checks."""
+    headers["Content-Encoding"] = encoding
+    vary = headers.get("vary")
+    if not vary:
+        headers["Vary"] = "Accept-Encoding"
+    elif "accept-encoding" not in vary.lower():
+        headers["Vary"] = f"{vary}, Accept-Encoding"
+    etag = headers.get("etag")
+    if etag and not etag.startswith("W/"):
+        headers["ETag"] = "W/" + etag
+
+def no_compression(endpoint):
+    """Route decorator: CompressionMiddleware leaves this endpoint's responses uncompressed."""
+    endpoint._no_compression = True
+    return endpoint
+
+class CompressionMiddleware:
+    """
+    Pure ASGI middleware compressing API responses by Accept-Encoding. Whole bodies below
+    COMPRESSION_MIN_BYTES are left alone; streaming bodies are compressed chunk by chunk.
+    Responses that already carry Content-Encoding (e.g. response cache hits, which keep their
+    compressed bodies, and precompressed static files) pass through untouched.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not COMPRESSION_ENABLED or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        request_headers = Headers(scope=scope)
+        if negotiate(request_headers.get("accept-encoding")) is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor: Optional[StreamCompressor] = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, compressor, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message # Held until the first body chunk shows the size
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is not None:
+                chunk = compressor.compress(body)
+                if not more_body:
+                    chunk += compressor.finish()
+                await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+                return
+
+            headers = MutableHeaders(raw=list(start_message["headers"]))
+            encoding = None
+            route = scope.get("route")
+            if (
+                200 <= start_message["status"] < 300 and start_message["status"] not in (204, 206)
+                and "content-encoding" not in headers
+                and "no-transform" not in headers.get("cache-control", "")
+                and not getattr(getattr(route, "endpoint", None), "_no_compression", False)
+            ):
+                encoding = choose_encoding(request_headers, headers.get("content-type"), None if more_body else len(body))
+            if encoding is None:
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            mark_encoded(headers, encoding)
+            if more_body:
+                compressor = StreamCompressor(encoding)
+                del headers["content-length"]
+                body = compressor.compress(body)
+            else:
+                body = compress(body, encoding)
+                headers["Content-Length"] = str(len(body))
+            await send({**start_message, "headers": headers.raw})
+            await send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,59 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+from fastapi import Request, Response, status
+
+# Helpers for HTTP conditional GET (RFC 9110 section 13): build validators for a resource
+# and answer If-None-Match / If-Modified-Since with 304 Not Modified.
+
+def make_etag(*parts) -> str:
+    """Builds a strong ETag from the values that fully determine a representation."""
+    digest = hashlib.blake2b(repr(parts).encode("utf-8"), digest_size=16).hexdigest()
+    return f'"{digest}"'
+
+def as_utc(value: datetime) -> datetime:
+    # SQLite hands back naive datetimes; the app always stores UTC.
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison, so W/"x" matches "x".
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    """True when the request's validators show the client already has this representation.
+    If-Modified-Since is only consulted when If-None-Match is absent."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            return False # Not a valid HTTP-date; ignore per the RFC
+        # HTTP-dates have one-second resolution
+        return as_utc(last_modified).replace(microsecond=0) <= since
+    return False
+
+def set_validators(response: Response, etag: str, last_modified: Optional[datetime] = None) -> None:
+    response.headers["ETag"] = etag
+    if last_modified is not None:
+        response.headers["Last-Modified"] = format_datetime(as_utc(last_modified), usegmt=True)
+
+def not_modified(etag: str, last_modified: Optional[datetime] = None) -> Response:
+    """An empty 304 response carrying the current validators."""
+    response = Response(status_code=status.HTTP_304_NOT_MODIFIED)
+    set_validators(response, etag, last_modified)
+    return response
+
+def has_conditional_headers(request: Request) -> bool:
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
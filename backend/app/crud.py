@@ -1,7 +1,11 @@
-from sqlalchemy.orm import Session
-from . import models, schemas
-from .auth import get_password_hash # Assuming auth.py will have this utility
-from typing import List, Optional
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.orm import Query, Session, defer, joinedload, load_only
+from . import auth, models, schemas # auth imported as a module: auth -> crud_async -> crud is a cycle
+from .pagination import CursorKey
+from .principal_cache import principal_cache
+from . import post_events, response_cache
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
 
 # --- User CRUD Operations ---
 
@@ -21,28 +25,55 @@ def get_users(db: Session, skip: int = 0, limit: int = 100) -> List[models.User]
     """Retrieve a list of users with pagination."""
     return db.query(models.User).offset(skip).limit(limit).all()
 
-def create_user(db: Session, user: schemas.UserCreate) -> models.User:
-    """Create a new user in the database."""
-    hashed_password = get_password_hash(user.password)
+def get_users_by_ids(db: Session, user_ids: List[int]) -> List[models.User]:
+    """Retrieve users by ID in a single IN (...) query. Order is unspecified; missing IDs are skipped.
+    Only id and username are loaded (the public fields); the rest, notably hashed_password, are deferred."""
+    if not user_ids:
+        return []
+    return db.query(models.User).options(load_only(models.User.id, models.User.username)).filter(models.User.id.in_(user_ids)).all()
+
+def create_user(db: Session, user: schemas.UserCreate, hashed_password: Optional[str] = None) -> models.User:
+    """Create a new user in the database.
+    Pass hashed_password to skip hashing here (crud_async hashes off the event loop)."""
+    if hashed_password is None:
+        hashed_password = auth.get_password_hash(user.password)
     db_user = models.User(username=user.username, email=user.email, hashed_password=hashed_password)
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
     return db_user
 
-def update_user(db: Session, db_user: models.User, user_in: schemas.UserUpdate) -> models.User:
-    """Update an existing user's information."""
+def update_user(db: Session, db_user: models.User, user_in: schemas.UserUpdate, hashed_password: Optional[str] = None) -> models.User:
+    """Update an existing user's information.
+    Pass hashed_password (the hash of user_in.password) to skip hashing here."""
     update_data = user_in.model_dump(exclude_unset=True)
     if "password" in update_data and update_data["password"]:
-        hashed_password = get_password_hash(update_data["password"])
+        if hashed_password is None:
+            hashed_password = auth.get_password_hash(update_data["password"])
         db_user.hashed_password = hashed_password
-        del update_data["password"] # Don't try to set 'password' attribute directly
+    update_data.pop("password", None) # Don't try to set 'password' attribute directly
+    renamed = update_data.get("username") not in (None, db_user.username)
     
     for field, value in update_data.items():
         setattr(db_user, field, value)
     
+    user_id = db_user.id # Read before commit() expires it; reading it after would cost a SELECT
+    db.add(db_user)
+    db.commit()
+    principal_cache.invalidate_user(user_id) # Tokens must see the new username/is_active right away
+    if renamed:
+        response_cache.invalidate_user_renamed(user_id) # Cached post JSON embeds the username
+    db.refresh(db_user)
+    return db_user
+
+def update_password_hash(db: Session, db_user: models.User, hashed_password: str) -> models.User:
+    """Replaces a user's stored password hash, e.g. when a login finds it used outdated bcrypt settings.
+    db_user may come from another (closed) session; it is added to this one."""
+    user_id = db_user.id
     db.add(db_user)
+    db_user.hashed_password = hashed_password
     db.commit()
+    principal_cache.invalidate_user(user_id)
     db.refresh(db_user)
     return db_user
 
@@ -50,45 +81,189 @@ def delete_user(db: Session, user_id: int) -> Optional[models.User]:
     """Delete a user from the database by their ID."""
     db_user = get_user(db, user_id)
     if db_user:
+        # The ORM cascade deletes the user's posts; their stats go first, in the same transaction.
+        _delete_post_stats(db, select(models.Post.id).where(models.Post.owner_id == user_id))
         db.delete(db_user)
         db.commit()
+        principal_cache.invalidate_user(user_id)
+        response_cache.invalidate_user_deleted(user_id)
     return db_user
 
 # --- Post CRUD Operations ---
 
+# Post responses embed schemas.UserMinimal, so every read path loads the owner eagerly in the
+# same statement (only the columns UserMinimal needs) instead of one lazy SELECT per post.
+_post_owner_minimal = joinedload(models.Post.owner, innerjoin=True).load_only(models.User.id, models.User.username)
+
+# A single post also loads the owner's updated_at, which its Last-Modified depends on (see get_post_version).
+_post_owner_versioned = joinedload(models.Post.owner, innerjoin=True).load_only(models.User.id, models.User.username, models.User.updated_at)
+
 def get_post(db: Session, post_id: int) -> Optional[models.Post]:
     """Retrieve a single post by its ID."""
-    return db.query(models.Post).filter(models.Post.id == post_id).first()
+    return db.query(models.Post).options(_post_owner_versioned).filter(models.Post.id == post_id).first()
+
+def get_posts_by_ids(db: Session, post_ids: List[int], include_content: bool = True) -> List[models.Post]:
+    """Retrieve posts by ID in a single IN (...) query. Order is unspecified; missing IDs are skipped."""
+    if not post_ids:
+        return []
+    return db.query(models.Post).options(*_list_options(include_content)).filter(models.Post.id.in_(post_ids)).all()
+
+def get_post_version(db: Session, post_id: int) -> Optional[Tuple[datetime, datetime, str]]:
+    """Retrieve only what a post's HTTP validators depend on: (updated_at, owner updated_at,
+    owner username). Two primary-key lookups; used to answer conditional GETs without loading the post."""
+    row = (
+        db.query(models.Post.updated_at, models.User.updated_at, models.User.username)
+        .join(models.Post.owner)
+        .filter(models.Post.id == post_id)
+        .first()
+    )
+    return tuple(row) if row else None
+
+EXCERPT_LENGTH = 200 # Characters of content kept in Post.excerpt
 
-def get_posts(db: Session, skip: int = 0, limit: int = 100) -> List[models.Post]: # Corrected: Type hint
-    """Retrieve a list of posts with pagination, ordered by creation date descending."""
-    return db.query(models.Post).order_by(models.Post.created_at.desc()).offset(skip).limit(limit).all()
+def summarize_content(content: str) -> dict:
+    """Computes the stored excerpt and word count for a post body."""
+    words = content.split()
+    excerpt = " ".join(words)
+    if len(excerpt) > EXCERPT_LENGTH:
+        # Cut at the last word boundary that fits so the excerpt never ends mid-word.
+        cut = excerpt.rfind(" ", 0, EXCERPT_LENGTH)
+        excerpt = excerpt[:cut if cut > 0 else EXCERPT_LENGTH].rstrip() + "..."
+    return {"excerpt": excerpt, "word_count": len(words)}
 
-def get_posts_by_user(db: Session, owner_id: int, skip: int = 0, limit: int = 100) -> List[models.Post]: # Corrected: Parameter name and Type hint
+def _list_options(include_content: bool) -> list:
+    options = [_post_owner_minimal]
+    if not include_content:
+        options.append(defer(models.Post.content))
+    return options
+
+def _paginate_posts(query: Query, skip: int, limit: int, after: Optional[CursorKey]) -> List[models.Post]:
+    """Applies newest-first ordering plus either keyset (`after`) or offset (`skip`) pagination.
+    Keyset pages seek straight into the (created_at, id) indexes, so their cost does not grow with depth."""
+    if after is not None:
+        after_created_at, after_id = after
+        # Compare against the anchor row's stored created_at when it still exists, so the
+        # comparison is exact regardless of how the backend formats bound datetimes.
+        # Falls back to the timestamp carried in the cursor if the anchor row was deleted.
+        anchor_created_at = select(models.Post.created_at).where(models.Post.id == after_id).scalar_subquery()
+        query = query.filter(
+            tuple_(models.Post.created_at, models.Post.id)
+            < tuple_(func.coalesce(anchor_created_at, after_created_at), after_id)
+        )
+    query = query.order_by(models.Post.created_at.desc(), models.Post.id.desc())
+    if after is None and skip:
+        query = query.offset(skip)
+    return query.limit(limit).all()
+
+def get_posts(db: Session, skip: int = 0, limit: int = 100, after: Optional[CursorKey] = None, include_content: bool = True) -> List[models.Post]: # Corrected: Type hint
+    """Retrieve a list of posts with pagination, ordered by creation date descending.
+    With include_content=False the content column is never selected."""
+    return _paginate_posts(db.query(models.Post).options(*_list_options(include_content)), skip, limit, after)
+
+def get_posts_by_user(db: Session, owner_id: int, skip: int = 0, limit: int = 100, after: Optional[CursorKey] = None, include_content: bool = True) -> List[models.Post]: # Corrected: Parameter name and Type hint
     """Retrieve posts for a specific user with pagination."""
-    return db.query(models.Post).filter(models.Post.owner_id == owner_id).order_by(models.Post.created_at.desc()).offset(skip).limit(limit).all()
+    query = db.query(models.Post).options(*_list_options(include_content)).filter(models.Post.owner_id == owner_id)
+    return _paginate_posts(query, skip, limit, after)
 
 def create_post(db: Session, post: schemas.PostCreate, owner_id: int) -> models.Post:
     """Create a new post for a given user."""
-    db_post = models.Post(**post.model_dump(), owner_id=owner_id)
+    db_post = models.Post(**post.model_dump(), **summarize_content(post.content), owner_id=owner_id)
     db.add(db_post)
     db.commit()
+    response_cache.invalidate_post_created(owner_id)
     db.refresh(db_post)
+    db_post.owner # Load the owner while still in session context; AsyncSession cannot lazy-load it during serialization
+    post_events.post_created(db_post)
     return db_post
 
 def update_post(db: Session, db_post: models.Post, post_in: schemas.PostUpdate) -> models.Post:
     """Update an existing post. Assumes ownership check is done prior to calling."""
     update_data = post_in.model_dump(exclude_unset=True)
+    if update_data.get("content") is not None:
+        update_data.update(summarize_content(update_data["content"]))
     for field, value in update_data.items():
         setattr(db_post, field, value)
     
+    post_id = db_post.id # Read before commit() expires it; reading it after would cost a SELECT
     db.add(db_post)
     db.commit()
+    response_cache.invalidate_post_updated(post_id)
     db.refresh(db_post)
+    db_post.owner # Load the owner while still in session context; AsyncSession cannot lazy-load it during serialization
+    post_events.post_updated(db_post)
     return db_post
 
 def delete_post(db: Session, db_post: models.Post) -> models.Post: # Corrected: Parameter name to db_post
     """Delete a post. Assumes ownership check is done prior to calling."""
+    post_id, owner_id = db_post.id, db_post.owner_id
+    _delete_post_stats(db, [post_id])
     db.delete(db_post)
     db.commit()
+    response_cache.invalidate_post_deleted(post_id, owner_id)
+    post_events.post_deleted(post_id, owner_id)
     return db_post
+
+def backfill_post_summaries(db: Session, batch_size: int = 500) -> int:
+    """Computes excerpt/word_count for posts written before those columns existed.
+    Returns the number of posts updated."""
+    updated, last_id = 0, 0
+    while True:
+        batch = (
+            db.query(models.Post)
+            .filter(models.Post.excerpt == "", models.Post.id > last_id)
+            .order_by(models.Post.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not batch:
+            return updated
+        for db_post in batch:
+            for field, value in summarize_content(db_post.content).items():
+                setattr(db_post, field, value)
+        last_id = batch[-1].id
+        db.commit()
+        updated += len(batch)
+
+# --- Post view counts ---
+
+def _delete_post_stats(db: Session, post_ids) -> None:
+    """Deletes the view counts of posts about to be deleted. Needed on SQLite, which does not
+    enforce the ON DELETE CASCADE (foreign_keys is off) and reuses a deleted post's id for the
+    next post, which would then inherit its count."""
+    db.query(models.PostStats).filter(models.PostStats.post_id.in_(post_ids)).delete(synchronize_session=False)
+
+def add_post_views(db: Session, counts: Dict[int, int]) -> int:
+    """Adds view counts to post_stats in one batched upsert (one row per post). Returns the
+    number of views written."""
+    # Views of posts deleted since they were counted are dropped (the foreign key would reject them).
+    existing = db.execute(select(models.Post.id).where(models.Post.id.in_(list(counts)))).scalars().all()
+    counts = {post_id: counts[post_id] for post_id in existing}
+    if not counts:
+        return 0
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    now = datetime.now(timezone.utc)
+    statement = insert(models.PostStats)
+    statement = statement.on_conflict_do_update(
+        index_elements=[models.PostStats.post_id],
+        set_={"view_count": models.PostStats.view_count + statement.excluded.view_count, "updated_at": statement.excluded.updated_at},
+    )
+    db.execute(statement, [{"post_id": post_id, "view_count": count, "updated_at": now} for post_id, count in counts.items()])
+    db.commit()
+    return sum(counts.values())
+
+def get_popular_posts(db: Session, limit: int = 20) -> List[Tuple[models.Post, int]]:
+    """The most viewed posts with their view counts, highest first. Walks
+    ix_post_stats_view_count_post_id backwards, so the cost depends on `limit`, not on the table size."""
+    rows = (
+        db.query(models.Post, models.PostStats.view_count)
+        .join(models.PostStats, models.PostStats.post_id == models.Post.id)
+        .options(*_list_options(include_content=False))
+        .order_by(models.PostStats.view_count.desc(), models.PostStats.post_id.desc())
+        .limit(limit)
+        .all()
+    )
+    return [(post, view_count) for post, view_count in rows]
@@ -0,0 +1,108 @@
+"""
+Awaitable counterparts of the functions in crud.py.
+
+Each function accepts either kind of session handed out by database.get_db:
+- AsyncSession (DB_ASYNC=true): the sync crud function runs through AsyncSession.run_sync,
+  so its I/O goes through the async driver without blocking the event loop.
+- Session (default): the sync crud function runs in Starlette's threadpool.
+
+Routes and auth dependencies call these so they can be `async def` in both modes,
+while the query logic itself lives only in crud.py.
+"""
+from datetime import datetime
+from typing import Any, Callable, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy.exc import IntegrityError
+from starlette.concurrency import run_in_threadpool
+
+# Module imports (not `from .crud import ...`): crud, auth and this module import each other.
+from . import crud, hashing, models, schemas, write_pipeline
+from .database import DbSession, is_async_session, release
+from .pagination import CursorKey
+
+async def run(db: DbSession, fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Runs a sync crud-style function `fn(session, *args, **kwargs)` without blocking the event loop."""
+    if is_async_session(db):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
+
+# --- User CRUD Operations ---
+
+async def get_user(db: DbSession, user_id: int) -> Optional[models.User]:
+    return await run(db, crud.get_user, user_id=user_id)
+
+async def get_users_by_ids(db: DbSession, user_ids: List[int]) -> List[models.User]:
+    return await run(db, crud.get_users_by_ids, user_ids=user_ids)
+
+async def get_user_by_email(db: DbSession, email: str) -> Optional[models.User]:
+    return await run(db, crud.get_user_by_email, email=email)
+
+async def get_user_by_username(db: DbSession, username: str) -> Optional[models.User]:
+    return await run(db, crud.get_user_by_username, username=username)
+
+async def get_users(db: DbSession, skip: int = 0, limit: int = 100) -> List[models.User]:
+    return await run(db, crud.get_users, skip=skip, limit=limit)
+
+async def create_user(db: DbSession, user: schemas.UserCreate) -> models.User:
+    # bcrypt is CPU-bound; hash in the bounded hash pool rather than in the request threadpool,
+    # without holding the connection of the route's earlier lookups meanwhile.
+    await release(db)
+    hashed_password = await hashing.hash_password(user.password)
+    if write_pipeline.WRITE_PIPELINE:
+        return await write_pipeline.create_user(db, user=user, hashed_password=hashed_password)
+    try:
+        return await run(db, crud.create_user, user=user, hashed_password=hashed_password)
+    except IntegrityError:
+        # A concurrent registration took the name or email while this one was hashing, after the
+        # route's own checks passed; report it the way those checks do (as write_pipeline does).
+        await release(db)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Username or email already registered")
+
+async def update_user(db: DbSession, db_user: models.User, user_in: schemas.UserUpdate) -> models.User:
+    hashed_password = None
+    if user_in.password:
+        await release(db) # db_user is detached until crud.update_user adds it back
+        hashed_password = await hashing.hash_password(user_in.password)
+    return await run(db, crud.update_user, db_user=db_user, user_in=user_in, hashed_password=hashed_password)
+
+async def update_password_hash(db: DbSession, db_user: models.User, hashed_password: str) -> models.User:
+    return await run(db, crud.update_password_hash, db_user=db_user, hashed_password=hashed_password)
+
+async def delete_user(db: DbSession, user_id: int) -> Optional[models.User]:
+    return await run(db, crud.delete_user, user_id=user_id)
+
+# --- Post CRUD Operations ---
+
+async def get_post(db: DbSession, post_id: int) -> Optional[models.Post]:
+    return await run(db, crud.get_post, post_id=post_id)
+
+async def get_posts_by_ids(db: DbSession, post_ids: List[int], include_content: bool = True) -> List[models.Post]:
+    return await run(db, crud.get_posts_by_ids, post_ids=post_ids, include_content=include_content)
+
+async def get_post_version(db: DbSession, post_id: int) -> Optional[Tuple[datetime, datetime, str]]:
+    return await run(db, crud.get_post_version, post_id=post_id)
+
+async def get_posts(db: DbSession, skip: int = 0, limit: int = 100, after: Optional[CursorKey] = None, include_content: bool = True) -> List[models.Post]:
+    return await run(db, crud.get_posts, skip=skip, limit=limit, after=after, include_content=include_content)
+
+async def get_posts_by_user(db: DbSession, owner_id: int, skip: int = 0, limit: int = 100, after: Optional[CursorKey] = None, include_content: bool = True) -> List[models.Post]:
+    return await run(db, crud.get_posts_by_user, owner_id=owner_id, skip=skip, limit=limit, after=after, include_content=include_content)
+
+async def create_post(db: DbSession, post: schemas.PostCreate, owner_id: int) -> models.Post:
+    if write_pipeline.WRITE_PIPELINE:
+        return await write_pipeline.create_post(db, post=post, owner_id=owner_id)
+    return await run(db, crud.create_post, post=post, owner_id=owner_id)
+
+async def update_post(db: DbSession, db_post: models.Post, post_in: schemas.PostUpdate) -> models.Post:
+    if write_pipeline.WRITE_PIPELINE:
+        return await write_pipeline.update_post(db, db_post=db_post, post_in=post_in)
+    return await run(db, crud.update_post, db_post=db_post, post_in=post_in)
+
+async def delete_post(db: DbSession, db_post: models.Post) -> models.Post:
+    if write_pipeline.WRITE_PIPELINE:
+        return await write_pipeline.delete_post(db, db_post=db_post)
+    return await run(db, crud.delete_post, db_post=db_post)
+
+async def get_popular_posts(db: DbSession, limit: int = 20) -> List[Tuple[models.Post, int]]:
+    return await run(db, crud.get_popular_posts, limit=limit)
@@ -1,32 +1,232 @@
-from sqlalchemy import create_engine
+from contextlib import asynccontextmanager
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.schema import CreateColumn
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from pathlib import Path
+from typing import AsyncIterator, Optional, Union
+from urllib.parse import quote
 import os
 from dotenv import load_dotenv
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
 
 # Load environment variables from .env file
 load_dotenv()
 
-DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./simpleblog.db")
+# The default database is simpleblog.db in the project root, where startup.sh runs the server,
+# whatever directory a process starts in (the CLIs such as `python -m app.bulk` run from backend/).
+DEFAULT_SQLITE_PATH = Path(__file__).resolve().parent.parent.parent / "simpleblog.db"
+DATABASE_URL = os.getenv("DATABASE_URL", f"sqlite:///{DEFAULT_SQLITE_PATH.as_posix()}")
 
-engine = create_engine(
-    DATABASE_URL, 
-    # connect_args are specific to SQLite. Not needed for other databases.
-    connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
-)
+# DB_ASYNC=true serves requests from an AsyncEngine (aiosqlite / asyncpg) instead of the
+# synchronous engine. The sync engine is still created either way; it runs schema setup.
+DB_ASYNC = os.getenv("DB_ASYNC", "false").lower() in ("1", "true", "yes")
 
+# Maps synchronous driver URLs onto their asyncio counterparts when ASYNC_DATABASE_URL is not set.
+_ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+}
+
+def _async_url(url: str) -> str:
+    scheme, sep, rest = url.partition("://")
+    return _ASYNC_DRIVERS.get(scheme, scheme) + sep + rest
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or _async_url(DATABASE_URL)
+
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+# --- SQLite tuning profile ---
+# Applied to every new SQLite connection. WAL lets readers run alongside the single writer;
+# busy_timeout makes a blocked writer wait instead of failing with "database is locked".
+SQLITE_TUNING = os.getenv("SQLITE_TUNING", "true").lower() in ("1", "true", "yes")
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")), # Negative = KiB, i.e. 64 MiB per connection
+    "temp_store": os.getenv("SQLITE_TEMP_STORE", "MEMORY"),
+}
+# Pragmas a read-only connection cannot (or need not) set.
+_WRITER_ONLY_PRAGMAS = {"journal_mode", "synchronous"}
+READ_POOL_SIZE = int(os.getenv("SQLITE_READ_POOL_SIZE", "8"))
+WRITE_POOL_TIMEOUT = float(os.getenv("SQLITE_WRITE_POOL_TIMEOUT", "30"))
+
+def _install_sqlite_pragmas(target: Engine, read_only: bool = False) -> None:
+    pragmas = {
+        name: value for name, value in SQLITE_PRAGMAS.items()
+        if not (read_only and name in _WRITER_ONLY_PRAGMAS)
+    }
+
+    @event.listens_for(target, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+def _read_only_url(url: str) -> Optional[str]:
+    """The same SQLite database opened with mode=ro, or None for in-memory databases."""
+    parsed = make_url(url)
+    if not parsed.database or parsed.database == ":memory:" or parsed.database.startswith("file:"):
+        return None
+    path = quote(os.path.abspath(parsed.database))
+    return parsed.set(database=f"file:{path}", query={**parsed.query, "mode": "ro", "uri": "true"}).render_as_string(hide_password=False)
+
+def _sqlite_engines(url: str, create, pool_class):
+    """Builds (writer, reader) engines for SQLite: one pooled connection for all writes, so
+    writers queue in the pool rather than contending for the database lock, and a pool of
+    mode=ro connections for reads."""
+    connect_args = {"check_same_thread": False}
+    writer = create(url, connect_args=connect_args, poolclass=pool_class, pool_size=1, max_overflow=0, pool_timeout=WRITE_POOL_TIMEOUT)
+    read_url = _read_only_url(url)
+    reader = writer
+    if read_url:
+        reader = create(read_url, connect_args=connect_args, poolclass=pool_class, pool_size=READ_POOL_SIZE, max_overflow=READ_POOL_SIZE)
+    for target, read_only in ((writer, False), (reader, True)):
+        if reader is writer and read_only:
+            continue
+        _install_sqlite_pragmas(getattr(target, "sync_engine", target), read_only=read_only)
+    return writer, reader
+
+def create_savepoint_writer_engine() -> Engine:
+    """A separate single-connection writer engine whose transactions support SAVEPOINT (used by
+    the write pipeline). pysqlite's own transaction handling breaks savepoints (releasing the
+    outermost one commits), so it is switched off and transactions are begun explicitly, as the
+    SQLAlchemy docs recommend; IMMEDIATE takes the write lock up front."""
+    if not IS_SQLITE:
+        return create_engine(DATABASE_URL, pool_size=1, max_overflow=0, pool_timeout=WRITE_POOL_TIMEOUT)
+    writer = create_engine(DATABASE_URL, connect_args={"check_same_thread": False}, poolclass=QueuePool, pool_size=1, max_overflow=0)
+    if SQLITE_TUNING:
+        _install_sqlite_pragmas(writer)
+
+    @event.listens_for(writer, "connect")
+    def _disable_pysqlite_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(writer, "begin")
+    def _begin_immediate(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+    return writer
+
+if IS_SQLITE and SQLITE_TUNING:
+    engine, read_engine = _sqlite_engines(DATABASE_URL, create_engine, QueuePool)
+else:
+    engine = create_engine(
+        DATABASE_URL, 
+        # connect_args are specific to SQLite. Not needed for other databases.
+        connect_args={"check_same_thread": False} if IS_SQLITE else {}
+    )
+    read_engine = engine
+
+# `engine`/SessionLocal are the writer and are used for schema setup and mutations;
+# ReadSessionLocal serves GET requests.
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+# Only built in async mode so the async driver is not required otherwise.
+# expire_on_commit=False: attributes cannot be lazily reloaded outside the greenlet, so
+# objects must stay usable for response serialization after a commit.
+async_engine = async_read_engine = None
+AsyncSessionLocal = AsyncReadSessionLocal = None
+if DB_ASYNC:
+    # Imported only in async mode: sqlalchemy.ext.asyncio adds about 100 ms to every startup.
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+    from sqlalchemy.pool import AsyncAdaptedQueuePool
+    if IS_SQLITE and SQLITE_TUNING:
+        async_engine, async_read_engine = _sqlite_engines(ASYNC_DATABASE_URL, create_async_engine, AsyncAdaptedQueuePool)
+    else:
+        async_engine = async_read_engine = create_async_engine(ASYNC_DATABASE_URL)
+    AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+    AsyncReadSessionLocal = async_sessionmaker(bind=async_read_engine, autoflush=False, expire_on_commit=False)
+
+# Either kind of session may be handed to routes; crud_async accepts both.
+DbSession = Union[Session, AsyncSession] if DB_ASYNC else Session
+
+def is_async_session(db: DbSession) -> bool:
+    # Checked without importing AsyncSession, which is not loaded in sync mode.
+    return not isinstance(db, Session)
+
+# Requests with these methods get a read-only session.
+READ_METHODS = ("GET", "HEAD")
 
 Base = declarative_base()
 
-def get_db():
-    """ FastAPI dependency to get a database session. """
-    db = SessionLocal()
+def _sync_session(factory):
+    db = factory()
     try:
         yield db
     finally:
         db.close()
 
+def get_sync_db(request: Request):
+    """ FastAPI dependency to get a database session (read-only for GET/HEAD requests). """
+    yield from _sync_session(ReadSessionLocal if request.method in READ_METHODS else SessionLocal)
+
+async def get_async_db(request: Request):
+    """ FastAPI dependency to get an AsyncSession (DB_ASYNC mode). """
+    factory = AsyncReadSessionLocal if request.method in READ_METHODS else AsyncSessionLocal
+    async with factory() as db:
+        yield db
+
+def get_sync_read_db():
+    yield from _sync_session(ReadSessionLocal)
+
+async def get_async_read_db():
+    async with AsyncReadSessionLocal() as db:
+        yield db
+
+# The dependencies routes use; selected once at import time from DB_ASYNC. get_read_db is for
+# non-GET routes that mostly read and write rarely (see write_session).
+get_db = get_async_db if DB_ASYNC else get_sync_db
+get_read_db = get_async_read_db if DB_ASYNC else get_sync_read_db
+
+@asynccontextmanager
+async def write_session() -> AsyncIterator[DbSession]:
+    """A writer session of its own, so a request holds the writer (on SQLite, the one writer
+    connection) only for the write itself, e.g. the password rehash at login."""
+    if DB_ASYNC:
+        async with AsyncSessionLocal() as db:
+            yield db
+    else:
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+async def release(db: DbSession) -> None:
+    """Ends the session's transaction and returns its connection to the pool. Call it before
+    awaiting anything that does not use the database (password hashing, the request body, the
+    write pipeline): a session keeps its connection until then, and a write session's is the
+    one writer connection on SQLite. The session stays usable (the next query checks out a
+    connection again); close() leaves loaded objects detached with their state, so they have
+    to be add()ed back before they are modified."""
+    if is_async_session(db):
+        await db.close()
+    else:
+        db.close()
+
+# Checking out a pooled connection timed out (on SQLite, the writer stayed busy for
+# SQLITE_WRITE_POOL_TIMEOUT): answered with 503 and Retry-After rather than a 500.
+POOL_TIMEOUT_RETRY_AFTER_SECONDS = int(os.getenv("POOL_TIMEOUT_RETRY_AFTER_SECONDS", "1"))
+
+async def pool_timeout_handler(request: Request, exc: PoolTimeoutError) -> Response:
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "The database is busy. Please retry shortly."},
+        headers={"Retry-After": str(POOL_TIMEOUT_RETRY_AFTER_SECONDS)},
+    )
+
 def create_tables():
     """
     Creates all database tables defined by models inheriting from Base.
@@ -38,3 +238,28 @@ def create_tables():
     # from . import models # This would cause circular import if models.py imports Base from here
     # It's better to ensure models are imported before calling this in main.py or a script.
     Base.metadata.create_all(bind=engine)
+    add_missing_columns()
+    # create_all skips indexes on tables that already exist, so add any that are
+    # missing (e.g. indexes introduced after the database was first created).
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+def add_missing_columns():
+    """
+    Adds columns that exist on the models but not yet in the database.
+    create_all never alters existing tables, so columns introduced after a database
+    was created (e.g. posts.excerpt) are added here. New columns must be nullable or
+    carry a server_default for this to succeed on populated tables.
+    """
+    with engine.begin() as conn:
+        # Inspect through this connection: the SQLite writer pool holds only one.
+        inspector = inspect(conn)
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_ddl = CreateColumn(column).compile(dialect=engine.dialect)
+                    conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {column_ddl}")
@@ -0,0 +1,112 @@
+"""RSS 2.0 and Atom rendering for the syndication feeds (see routers/feeds.py)."""
+import os
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from typing import List, Optional
+from xml.sax.saxutils import escape
+
+from . import models, response_cache
+from .conditional import as_utc
+
+# Entries per feed, newest first.
+FEED_SIZE = int(os.getenv("FEED_SIZE", "20"))
+# Absolute URL of the site for links in the feeds; defaults to the URL the request came in on
+# (then feeds are cached per Host header). Set it in production.
+PUBLIC_BASE_URL = os.getenv("PUBLIC_BASE_URL", "").rstrip("/")
+FEED_TITLE = os.getenv("FEED_TITLE", "Simple Blog")
+
+RSS_MEDIA_TYPE = "application/rss+xml"
+ATOM_MEDIA_TYPE = "application/atom+xml"
+
+def _attr(value: str) -> str:
+    # escape() leaves double quotes alone, which would end a "..." attribute value.
+    return escape(value, {'"': "&quot;"})
+
+def _rfc822(value: datetime) -> str:
+    return format_datetime(as_utc(value), usegmt=True)
+
+def _rfc3339(value: datetime) -> str:
+    return as_utc(value).replace(microsecond=0).isoformat().replace("+00:00", "Z")
+
+# Tags whose invalidation may change a feed (see routers/feeds.py).
+FEED_TAG_PREFIXES = ("posts:list", "posts:user:", "post:", "owner:")
+# When a feed last changed as far as this process knows. Removals (a deleted post, or one pushed
+# out by a new post) do not show in the posts' updated_at, so Last-Modified also takes this. It
+# starts at process start: changes made before then are unknown.
+_changed_at = datetime.now(timezone.utc)
+
+def _note_invalidation(tags: Optional[List[str]]) -> None:
+    global _changed_at
+    if tags is None or any(tag.startswith(FEED_TAG_PREFIXES) for tag in tags):
+        _changed_at = datetime.now(timezone.utc)
+
+response_cache.on_invalidate(_note_invalidation)
+
+def _newest(posts: List[models.Post]) -> Optional[datetime]:
+    return max((post.updated_at for post in posts), default=None)
+
+def last_modified(posts: List[models.Post]) -> datetime:
+    """The feed's Last-Modified: the newest updated_at in it or the last change to any feed,
+    whichever is later. Rounded up to a whole second (the resolution of HTTP dates), so a
+    change within the second a client's copy is dated still counts as newer."""
+    changed_at = _changed_at
+    if changed_at.microsecond:
+        changed_at = changed_at.replace(microsecond=0) + timedelta(seconds=1)
+    newest = _newest(posts)
+    return changed_at if newest is None else max(changed_at, as_utc(newest))
+
+def render_rss(posts: List[models.Post], title: str, site_url: str, feed_url: str) -> bytes:
+    items = []
+    for post in posts:
+        link = f"{site_url}/post/{post.id}"
+        items.append(
+            "<item>"
+            f"<title>{escape(post.title)}</title>"
+            f"<link>{escape(link)}</link>"
+            f'<guid isPermaLink="true">{escape(link)}</guid>'
+            f"<description>{escape(post.excerpt)}</description>"
+            f"<dc:creator>{escape(post.owner.username)}</dc:creator>" # RSS <author> must be an email address
+            f"<pubDate>{_rfc822(post.created_at)}</pubDate>"
+            "</item>"
+        )
+    updated = _newest(posts)
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom" xmlns:dc="http://purl.org/dc/elements/1.1/"><channel>'
+        f"<title>{escape(title)}</title>"
+        f"<link>{escape(site_url)}/</link>"
+        f"<description>{escape(title)}</description>"
+        f'<atom:link href="{_attr(feed_url)}" rel="self" type="{RSS_MEDIA_TYPE}"/>'
+        + (f"<lastBuildDate>{_rfc822(updated)}</lastBuildDate>" if updated else "")
+        + "".join(items)
+        + "</channel></rss>\n"
+    ).encode("utf-8")
+
+def render_atom(posts: List[models.Post], title: str, site_url: str, feed_url: str) -> bytes:
+    entries = []
+    for post in posts:
+        link = f"{site_url}/post/{post.id}"
+        entries.append(
+            "<entry>"
+            f"<title>{escape(post.title)}</title>"
+            f'<link href="{_attr(link)}"/>'
+            f"<id>{escape(link)}</id>"
+            f"<published>{_rfc3339(post.created_at)}</published>"
+            f"<updated>{_rfc3339(post.updated_at)}</updated>"
+            f"<author><name>{escape(post.owner.username)}</name></author>"
+            f"<summary>{escape(post.excerpt)}</summary>"
+            "</entry>"
+        )
+    updated = _newest(posts)
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<feed xmlns="http://www.w3.org/2005/Atom">'
+        f"<title>{escape(title)}</title>"
+        f'<link href="{_attr(site_url)}/"/>'
+        f'<link href="{_attr(feed_url)}" rel="self"/>'
+        f"<id>{escape(feed_url)}</id>"
+        # An Atom feed must have <updated>; an empty one has no better date than the epoch.
+        f"<updated>{_rfc3339(updated) if updated else '1970-01-01T00:00:00Z'}</updated>"
+        + "".join(entries)
+        + "</feed>\n"
+    ).encode("utf-8")
@@ -0,0 +1,96 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, status
+
+from . import metrics
+
+# bcrypt runs in its own bounded pool so a burst of logins cannot occupy the request threadpool
+# that every other endpoint depends on. Work beyond HASH_QUEUE_SIZE is rejected with 503.
+HASH_EXECUTOR = os.getenv("HASH_EXECUTOR", "thread").lower() # "thread" or "process"
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Hash operations admitted at once (running + waiting for a worker).
+HASH_QUEUE_SIZE = int(os.getenv("HASH_QUEUE_SIZE", str(HASH_WORKERS * 8)))
+HASH_RETRY_AFTER_SECONDS = int(os.getenv("HASH_RETRY_AFTER_SECONDS", "1"))
+# Raising or lowering the cost factor takes effect for existing users on their next login,
+# when their hash is found to need an update and is re-hashed (see verify_and_update).
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+@lru_cache(maxsize=None)
+def get_pwd_context():
+    """The passlib CryptContext, built on first use so importing the app does not load passlib."""
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+class HashingOverloadedError(HTTPException):
+    """Raised when the hashing queue is full; rendered as 503 with Retry-After."""
+
+    def __init__(self):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many authentication requests in progress. Please retry shortly.",
+            headers={"Retry-After": str(HASH_RETRY_AFTER_SECONDS)},
+        )
+
+# Module-level so a ProcessPoolExecutor can pickle them by reference.
+def _hash(password: str) -> str:
+    return get_pwd_context().hash(password)
+
+def _verify_and_update(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return get_pwd_context().verify_and_update(password, hashed_password)
+
+class HashPool:
+    """A lazily started executor with a hard cap on admitted work."""
+
+    def __init__(self, kind: str = HASH_EXECUTOR, workers: int = HASH_WORKERS, queue_size: int = HASH_QUEUE_SIZE):
+        self.kind = kind
+        self.workers = workers
+        self.queue_size = queue_size
+        self.pending = 0
+        self.rejected = 0
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> Executor:
+        # Created on first use: nothing is forked at import time or in processes that never hash.
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def run(self, fn, *args):
+        with self._lock:
+            if self.pending >= self.queue_size:
+                self.rejected += 1
+                raise HashingOverloadedError()
+            self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+hash_pool = HashPool()
+
+async def hash_password(password: str) -> str:
+    """Hashes a password in the hash pool. Raises HashingOverloadedError when it is saturated."""
+    return await hash_pool.run(_hash, password)
+
+async def verify_and_update(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verifies a password in the hash pool. Returns (valid, new_hash); new_hash is set when the
+    stored hash uses outdated settings (passlib's needs_update) and should be replaced."""
+    return await hash_pool.run(_verify_and_update, password, hashed_password)
+
+metrics.CallbackMetric("hash_pool_pending", "Password hash operations admitted (running or queued).", "gauge", lambda: hash_pool.pending)
+metrics.CallbackMetric("hash_pool_rejected_total", "Password hash operations rejected with 503 because the queue was full.", "counter", lambda: hash_pool.rejected)
@@ -1,60 +1,124 @@
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import Response
 from fastapi.middleware.cors import CORSMiddleware
 from pathlib import Path
+from typing import Callable
+import asyncio
+import signal
+import threading
 
-# Import for database table creation
-from .database import create_tables # Corrected: import create_tables
-from . import models # Ensure models are imported so Base knows about them
+from . import admission, cluster, compression, database, hashing, metrics, models, post_events, schema, views, write_pipeline # Ensure models are imported so Base knows about them
+from .serialization import FastJSONResponse
 
 # Import routers
-from .routers import posts, users # Corrected: Uncommented and imported
+from .routers import feeds, posts, users # Corrected: Uncommented and imported
+from .static_files import IMMUTABLE_CACHE_CONTROL, CompressedStaticFiles, SPAIndex
 
 PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
 FRONTEND_BUILD_DIR = PROJECT_ROOT / "frontend" / "build"
 STATIC_ASSETS_DIR = FRONTEND_BUILD_DIR / "static" # Common for React builds
 
+DEFAULT_INDEX_HTML = """
+    <!DOCTYPE html>
+    <html lang=\"en\">
+    <head><meta charset=\"UTF-8\"><title>App Loading...</title></head>
+    <body><h1>Simple Blog Application</h1><p>Frontend not found. Please build the frontend application.</p></body>
+    </html>
+    """
+
+# index.html is served from memory for every client-side route (reloaded when the build changes).
+spa_index = SPAIndex(FRONTEND_BUILD_DIR / "index.html", fallback_html=DEFAULT_INDEX_HTML)
+
 app = FastAPI(
     title="Simple Blog API",
     description="API for a simple blog platform.",
-    version="0.1.0"
+    version="0.1.0",
+    default_response_class=FastJSONResponse, # Routes returning plain dicts are encoded with orjson when installed
 )
 
+app.add_exception_handler(database.PoolTimeoutError, database.pool_timeout_handler) # 503 + Retry-After
+
 # CORS (Cross-Origin Resource Sharing) Middleware
 origins = [
     "http://localhost:3000",
     "http://localhost:9000",
 ]
 
+# Innermost of the middleware, so rejected requests still get CORS headers and are counted in metrics.
+app.add_middleware(admission.AdmissionMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
     allow_credentials=True,
     allow_methods=["*"],
-    allow_headers=["*"]
+    allow_headers=["*"],
+    expose_headers=[posts.NEXT_CURSOR_HEADER], # Let browsers read the pagination cursor
 )
+app.add_middleware(compression.CompressionMiddleware)
+# Added last so it wraps everything else and times the whole request (and sees compressed sizes).
+app.add_middleware(metrics.MetricsMiddleware)
+
+def _on_drain(callback: Callable[[], None]) -> None:
+    """Runs callback on the event loop as soon as uvicorn is told to stop (SIGTERM/SIGINT, which
+    is also how app.serve stops each worker of a rolling restart). Lifespan shutdown only comes
+    once open connections have closed or GRACEFUL_TIMEOUT_SECONDS has passed, too late for
+    anything that keeps a connection open, like the event streams."""
+    if threading.current_thread() is not threading.main_thread():
+        return # Not under uvicorn (e.g. a test client): signals are not ours to handle
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        previous = signal.getsignal(sig)
+
+        def handler(signum, frame, previous=previous):
+            loop.call_soon_threadsafe(callback)
+            if callable(previous):
+                previous(signum, frame) # uvicorn's handler, which starts the drain
+            else:
+                signal.signal(signum, previous)
+                signal.raise_signal(signum)
+
+        signal.signal(sig, handler)
 
 @app.on_event("startup")
 async def on_startup():
     """Perform actions on application startup."""
     print("Application starting up...")
-    # Initialize database and create tables if they don't exist
-    print("Creating database tables...")
-    create_tables() # Corrected: Call create_tables to set up DB schema
-    print("Database tables created (if they didn't exist).")
+    # Schema setup normally runs once, out of band (python -m app.schema setup); here it
+    # costs one query unless the schema is missing or out of date (see SCHEMA_SETUP).
+    if schema.ensure_schema():
+        print("Database schema created or upgraded.")
+    cluster.cluster.start() # Cross-worker cache invalidation and load reports (multi-worker mode only)
+    views.view_counter.start() # Periodic flush of post view counts
+    post_events.post_event_hub.start() # Fan-out for GET /posts/stream
+    _on_drain(post_events.post_event_hub.stop) # Streams would otherwise hold the drain open
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    """Release resources held for the lifetime of the app."""
+    post_events.post_event_hub.stop() # Ends streams if the server did not drain first
+    write_pipeline.write_pipeline.shutdown() # Commits writes still queued
+    await views.view_counter.stop() # Writes view counts not flushed yet
+    hashing.hash_pool.shutdown()
+    cluster.cluster.stop()
 
 # Include API routers
 app.include_router(users.router, prefix="/api/v1", tags=["users"]) # Corrected: Uncommented
 app.include_router(posts.router, prefix="/api/v1", tags=["posts"]) # Corrected: Uncommented
+app.include_router(feeds.router) # /feed.xml and /users/{id}/feed.xml, ahead of the SPA catch-all
 
 @app.get("/api/healthcheck", tags=["Health"])
 async def healthcheck():
     """Basic health check endpoint."""
     return {"status": "ok", "message": "API is running"}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    """Request, database and cache metrics in the Prometheus text format."""
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 if STATIC_ASSETS_DIR.exists():
-    app.mount("/static", StaticFiles(directory=STATIC_ASSETS_DIR), name="frontend_static_assets")
+    # Build output under static/ has content hashes in its file names, so it can be cached forever.
+    app.mount("/static", CompressedStaticFiles(directory=STATIC_ASSETS_DIR, cache_control=IMMUTABLE_CACHE_CONTROL), name="frontend_static_assets")
 else:
     print(f"Warning: Frontend static assets directory not found: {STATIC_ASSETS_DIR}")
     print("Ensure the frontend has been built and assets are in frontend/build/static/")
@@ -68,41 +132,15 @@ if FRONTEND_BUILD_DIR.exists():
     # If 'assets' is a real folder in 'frontend/build', then this is correct.
     # If it's meant to serve individual files like 'favicon.ico' directly from 'frontend/build', that needs specific routes or careful StaticFiles usage.
     # Let's assume 'assets' is not a conflicting name and is intended for general files in build root.
-    app.mount("/assets", StaticFiles(directory=FRONTEND_BUILD_DIR), name="frontend_root_assets")
+    app.mount("/assets", CompressedStaticFiles(directory=FRONTEND_BUILD_DIR), name="frontend_root_assets")
 
 @app.get("/{full_path:path}", include_in_schema=False)
 async def serve_react_app(request: Request, full_path: str):
-    index_html_path = FRONTEND_BUILD_DIR / "index.html"
-    default_index_html_path = PROJECT_ROOT / "backend" / "app" / "default_index.html"
-
     # If an API path that wasn't matched by any router reaches here, it's a 404.
     # This prevents serving index.html for /api/* typos or non-existent endpoints.
     if full_path.startswith("api/"):
         raise HTTPException(status_code=404, detail=f"API endpoint '/{full_path}' not found.")
 
-    # If the actual frontend index.html doesn't exist, serve the default/fallback.
-    if not index_html_path.exists():
-        if default_index_html_path.exists():
-            return FileResponse(default_index_html_path, media_type="text/html")
-        else:
-            # This case should be rare if the startup file creation logic works.
-            raise HTTPException(status_code=500, detail="Frontend not built and default fallback page is missing.")
-
-    # For any other path not caught by API routers or specific StaticFiles mounts,
-    # serve the main SPA index.html file.
-    return FileResponse(index_html_path, media_type="text/html")
-
-# This logic ensures default_index.html is created if the main one is missing.
-# It runs once when the Python module is loaded.
-if not (FRONTEND_BUILD_DIR / "index.html").exists():
-    default_html_content = """
-    <!DOCTYPE html>
-    <html lang=\"en\">
-    <head><meta charset=\"UTF-8\"><title>App Loading...</title></head>
-    <body><h1>Simple Blog Application</h1><p>Frontend not found. Please build the frontend application.</p></body>
-    </html>
-    """
-    # Ensure backend/app directory exists before writing this fallback file
-    (PROJECT_ROOT / "backend" / "app").mkdir(parents=True, exist_ok=True)
-    with open(PROJECT_ROOT / "backend" / "app" / "default_index.html", "w") as f:
-        f.write(default_html_content)
+    # For any other path not caught by API routers or specific StaticFiles mounts, serve the
+    # SPA's index.html (or the built-in placeholder page until the frontend has been built).
+    return spa_index.response(request)
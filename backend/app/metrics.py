@@ -0,0 +1,286 @@
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Request instrumentation exposed in the Prometheus text format at GET /metrics.
+# Metrics live in this process only; no prometheus_client dependency is needed for the handful
+# of counters, gauges and histograms below.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+# Adds a Server-Timing header (db / auth / serialize / total) to every response. Useful in
+# browser devtools; off by default because it reveals internal timings to clients.
+SERVER_TIMING = os.getenv("SERVER_TIMING", "false").lower() in ("1", "true", "yes")
+# Requests slower than this are logged with the SQL they issued. 0 disables the log.
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "500"))
+SLOW_REQUEST_MAX_STATEMENTS = int(os.getenv("SLOW_REQUEST_MAX_STATEMENTS", "50"))
+
+slow_log = logging.getLogger("app.slow_requests")
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+LabelValues = Tuple[str, ...]
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+class Metric:
+    """Base class: a named metric family with fixed label names, registered on creation."""
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    def _key(self, labels: dict) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> Iterator[Tuple[str, Sequence[str], Sequence[str], float]]:
+        """Yields (suffix, label names, label values, value)."""
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, names, values, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(names, values)} {_format_value(value)}")
+        return lines
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def total(self) -> float:
+        """Sum over all label sets."""
+        with self._lock:
+            return sum(self._values.values())
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield "", self.labelnames, key, value
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # Per label set: [per-bucket counts (last one is +Inf), sum, count]
+        self._series: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(key, (list(counts), total, count)) for key, (counts, total, count) in self._series.items()]
+        names = self.labelnames + ("le",)
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                yield "_bucket", names, key + (_format_value(bound),), cumulative
+            yield "_sum", self.labelnames, key, total
+            yield "_count", self.labelnames, key, count
+
+class CallbackMetric(Metric):
+    """A metric whose value is read at scrape time, e.g. from a cache's stats()."""
+
+    def __init__(self, name, documentation, kind: str, read: Callable[[], float]):
+        super().__init__(name, documentation)
+        self.kind = kind
+        self._read = read
+
+    def samples(self):
+        yield "", (), (), self._read()
+
+registry: List[Metric] = []
+
+def render() -> str:
+    """All registered metrics in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+REQUESTS = Counter("http_requests_total", "HTTP requests handled.", ("method", "route", "status"))
+LATENCY = Histogram("http_request_duration_seconds", "Time from request start to the end of the response body.", ("method", "route"))
+IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests currently being handled.")
+RESPONSE_SIZE = Histogram("http_response_size_bytes", "Response body size.", ("method", "route"), buckets=SIZE_BUCKETS)
+REQUEST_QUERIES = Histogram("http_request_db_queries", "SQL statements executed per request.", ("route",), buckets=QUERY_COUNT_BUCKETS)
+REQUEST_DB_TIME = Histogram("http_request_db_seconds", "Time spent executing SQL per request.", ("route",))
+DB_QUERIES = Counter("db_queries_total", "SQL statements executed, including outside requests.")
+DB_TIME = Counter("db_query_seconds_total", "Total time spent executing SQL statements.")
+for _metric in (IN_FLIGHT, DB_QUERIES, DB_TIME):
+    _metric.inc(0) # Export the unlabelled series from the first scrape
+
+# --- Per-request accounting ---
+
+class RequestStats:
+    """Accumulated while a request is handled; read by the middleware when it finishes."""
+    __slots__ = ("queries", "db_seconds", "statements", "phases", "_phase")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.statements: List[Tuple[str, float]] = []
+        self.phases: Dict[str, float] = {}
+        self._phase: Optional[str] = None
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+@contextmanager
+def phase(name: str):
+    """Adds the block's duration to the current request's `name` phase (Server-Timing).
+    Nested phases are not double counted: only the outermost one records."""
+    stats = _current.get()
+    if stats is None or stats._phase is not None:
+        yield
+        return
+    stats._phase = name
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.phases[name] = stats.phases.get(name, 0.0) + time.perf_counter() - start
+        stats._phase = None
+
+# Registered on the Engine class, so every engine (writer, reader, and the sync engines behind
+# the async ones) is covered. The request's stats travel with the context into threadpool
+# workers and AsyncSession.run_sync greenlets.
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    DB_QUERIES.inc()
+    DB_TIME.inc(elapsed)
+    stats = _current.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+        if SLOW_REQUEST_MS > 0 and len(stats.statements) < SLOW_REQUEST_MAX_STATEMENTS:
+            stats.statements.append((statement, elapsed))
+
+def _route_label(scope) -> str:
+    # The route template (e.g. /api/v1/posts/{post_id}) keeps label cardinality bounded.
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+def _server_timing(stats: RequestStats, total: float) -> bytes:
+    entries = [f'db;dur={stats.db_seconds * 1000:.2f};desc="{stats.queries} queries"']
+    entries += [f"{name};dur={seconds * 1000:.2f}" for name, seconds in stats.phases.items()]
+    entries.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(entries).encode("latin-1")
+
+class MetricsMiddleware:
+    """Pure ASGI middleware (streaming responses pass straight through) recording request metrics."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        status_code = 500
+        body_bytes = 0
+
+        async def send_wrapper(message):
+            nonlocal status_code, body_bytes
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if SERVER_TIMING:
+                    # Streaming responses start before their body is produced; the header then
+                    # covers the work done up to this point.
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", _server_timing(stats, time.perf_counter() - start)))
+                    message = {**message, "headers": headers}
+            elif message["type"] == "http.response.body":
+                body_bytes += len(message.get("body", b""))
+            await send(message)
+
+        IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            IN_FLIGHT.dec()
+            _current.reset(token)
+            elapsed = time.perf_counter() - start
+            method, route = scope["method"], _route_label(scope)
+            REQUESTS.inc(method=method, route=route, status=status_code)
+            LATENCY.observe(elapsed, method=method, route=route)
+            RESPONSE_SIZE.observe(body_bytes, method=method, route=route)
+            REQUEST_QUERIES.observe(stats.queries, route=route)
+            REQUEST_DB_TIME.observe(stats.db_seconds, route=route)
+            if SLOW_REQUEST_MS > 0 and elapsed * 1000 >= SLOW_REQUEST_MS:
+                _log_slow_request(scope, status_code, elapsed, stats)
+
+def _log_slow_request(scope, status_code: int, elapsed: float, stats: RequestStats) -> None:
+    query = scope.get("query_string", b"").decode("latin-1")
+    lines = [
+        f"Slow request: {scope['method']} {scope['path']}{'?' + query if query else ''} -> {status_code} "
+        f"in {elapsed * 1000:.1f} ms ({stats.queries} queries, {stats.db_seconds * 1000:.1f} ms in the database)"
+    ]
+    for statement, seconds in stats.statements:
+        lines.append(f"  [{seconds * 1000:.2f} ms] {' '.join(statement.split())}")
+    if stats.queries > len(stats.statements):
+        lines.append(f"  ... {stats.queries - len(stats.statements)} more statements not recorded")
+    slow_log.warning("\n".join(lines))
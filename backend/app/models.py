@@ -1,8 +1,14 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean
+from sqlalchemy import BigInteger, Column, Integer, String, Text, DateTime, ForeignKey, Boolean, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
+from datetime import datetime, timezone
 from .database import Base # Import Base from database.py
 
+def _utcnow() -> datetime:
+    # Used for updated_at on UPDATE instead of func.now(): SQLite's CURRENT_TIMESTAMP only has
+    # one-second resolution, and updated_at feeds the HTTP validators (see conditional.py).
+    return datetime.now(timezone.utc)
+
 class User(Base):
     __tablename__ = "users"
 
@@ -12,7 +18,7 @@ class User(Base):
     hashed_password = Column(String, nullable=False)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
-    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=_utcnow, nullable=False)
 
     # Relationship to Post model
     # cascade="all, delete-orphan" means posts are deleted if the user is deleted.
@@ -27,13 +33,38 @@ class Post(Base):
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True, nullable=False)
     content = Column(Text, nullable=False)
+    # Derived from content on every write (see crud.summarize_content) so listings
+    # can render cards without loading the full body.
+    excerpt = Column(Text, nullable=False, server_default="")
+    word_count = Column(Integer, nullable=False, server_default="0")
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
-    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=_utcnow, nullable=False)
     
     owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
 
     # Relationship to User model
     owner = relationship("User", back_populates="posts")
 
+    # Composite indexes backing keyset pagination (see crud._paginate_posts).
+    # Both match the (created_at DESC, id DESC) ordering, so a page is an index range scan.
+    __table_args__ = (
+        Index("ix_posts_created_at_id", "created_at", "id"),
+        Index("ix_posts_owner_id_created_at_id", "owner_id", "created_at", "id"),
+    )
+
     def __repr__(self):
         return f"<Post(id={self.id}, title='{self.title}', owner_id={self.owner_id})>"
+
+class PostStats(Base):
+    """Per-post counters kept out of `posts`, so counting a view never rewrites (or locks) the post
+    row and never touches updated_at. Written in batches by views.ViewCounter."""
+    __tablename__ = "post_stats"
+
+    post_id = Column(Integer, ForeignKey("posts.id", ondelete="CASCADE"), primary_key=True)
+    view_count = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), nullable=False, default=_utcnow, onupdate=_utcnow)
+
+    # Kept up to date by each flush's upsert; GET /posts/popular is a reverse scan of this index.
+    __table_args__ = (
+        Index("ix_post_stats_view_count_post_id", "view_count", "post_id"),
+    )
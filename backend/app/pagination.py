@@ -0,0 +1,57 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+
+# A keyset cursor identifies the last row of the previous page by its sort key.
+# Post listings are ordered by (created_at DESC, id DESC), so that pair is what we encode.
+CursorKey = Tuple[datetime, int]
+
+class InvalidCursorError(ValueError):
+    """Raised when a client supplies a cursor that cannot be decoded."""
+
+# Search results are ordered by (rank DESC, id DESC); see search.py.
+SearchCursorKey = Tuple[float, int]
+
+def _encode(data: dict) -> str:
+    raw = json.dumps(data, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def _decode(cursor: str) -> dict:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    if not isinstance(data, dict):
+        raise ValueError("cursor payload is not an object")
+    return data
+
+def encode_cursor(created_at: datetime, post_id: int) -> str:
+    """Encodes a (created_at, id) sort key as an opaque, URL-safe cursor string."""
+    return _encode({"c": created_at.isoformat(), "i": post_id})
+
+def decode_cursor(cursor: str) -> CursorKey:
+    """Decodes a cursor produced by encode_cursor back into its (created_at, id) sort key."""
+    try:
+        data = _decode(cursor)
+        return datetime.fromisoformat(data["c"]), int(data["i"])
+    except (ValueError, TypeError, KeyError, UnicodeError) as e:
+        raise InvalidCursorError("Malformed pagination cursor") from e
+
+def encode_search_cursor(rank: float, post_id: int) -> str:
+    """Encodes a search result's (rank, id) sort key as an opaque cursor string."""
+    return _encode({"r": rank, "i": post_id})
+
+def decode_search_cursor(cursor: str) -> SearchCursorKey:
+    """Decodes a cursor produced by encode_search_cursor."""
+    try:
+        data = _decode(cursor)
+        return float(data["r"]), int(data["i"])
+    except (ValueError, TypeError, KeyError, UnicodeError) as e:
+        raise InvalidCursorError("Malformed search cursor") from e
+
+def next_cursor_for(posts: list, limit: int) -> Optional[str]:
+    """Returns the cursor for the page after `posts`, or None if this was the last page.
+    Callers fetch limit + 1 rows; the presence of the extra row means another page exists."""
+    if len(posts) <= limit:
+        return None
+    last = posts[limit - 1]
+    return encode_cursor(last.created_at, last.id)
@@ -0,0 +1,215 @@
+"""
+Server-Sent Events for post changes (GET /posts/stream), so clients learn about new, edited and
+deleted posts without polling the post list.
+
+One hub per process fans each event out to every subscriber. An event is encoded once and each
+subscriber only holds a reference to the shared frame in its bounded queue. A subscriber whose
+queue fills up (a client not reading) is dropped; EventSource reconnects on its own and resumes
+from the ring buffer with Last-Event-ID. An idle subscriber is one suspended coroutine and an
+empty queue: keep-alive comments come from a single timer for the whole hub.
+
+Event ids are "<epoch>-<number>". Under app.serve the number is the event's id in the cluster
+change log (app.cluster) and the epoch that of the cluster state file, so ids are the same in
+every worker and a client can resume on whichever worker it reconnects to; every worker, the
+publishing one included, dispatches events from that log in id order. A single process numbers
+events itself under an epoch of its own. A Last-Event-ID that cannot be resumed from (from before
+a restart, older than the ring buffer, or lost while this worker fell behind the change log) gets
+a `reset` event, telling the client to refetch instead of trusting that it missed nothing.
+
+Streams end when the server starts draining (see main.py), not at app shutdown, which uvicorn
+only runs once open connections have closed or GRACEFUL_TIMEOUT_SECONDS has passed.
+"""
+import asyncio
+import os
+import time
+import uuid
+from collections import deque
+from typing import AsyncIterator, Deque, Optional, Set, Tuple
+
+from . import cluster, metrics, serialization
+
+POST_EVENTS_BUFFER_SIZE = int(os.getenv("POST_EVENTS_BUFFER_SIZE", "1000"))
+# Frames a subscriber may have waiting before it is dropped.
+POST_EVENTS_QUEUE_SIZE = int(os.getenv("POST_EVENTS_QUEUE_SIZE", "256"))
+POST_EVENTS_KEEPALIVE_SECONDS = float(os.getenv("POST_EVENTS_KEEPALIVE_SECONDS", "15"))
+# Streams are ended after this long (the client reconnects and resumes). This spreads long-lived
+# connections over workers again after a restart and bounds how long a stream can delay draining.
+POST_EVENTS_MAX_STREAM_SECONDS = float(os.getenv("POST_EVENTS_MAX_STREAM_SECONDS", "300"))
+# Reconnection delay suggested to EventSource clients.
+POST_EVENTS_RETRY_MS = int(os.getenv("POST_EVENTS_RETRY_MS", "3000"))
+
+KEEPALIVE_FRAME = b": keepalive\n\n"
+
+SUBSCRIBERS_DROPPED = metrics.Counter("post_events_subscribers_dropped_total", "Event stream subscribers dropped for not keeping up.")
+EVENTS_PUBLISHED = metrics.Counter("post_events_published_total", "Post events sent to the stream subscribers of this process.", ("event",))
+SUBSCRIBERS_DROPPED.inc(0)
+
+def _frame(event_id: str, event: str, data: str) -> bytes:
+    return f"id: {event_id}\nevent: {event}\ndata: {data}\n\n".encode()
+
+class _Subscriber:
+    __slots__ = ("queue", "dropped")
+
+    def __init__(self, size: int):
+        self.queue: asyncio.Queue = asyncio.Queue(size)
+        self.dropped = False
+
+class PostEventHub:
+    """Fan-out of post events to the stream subscribers of this process. publish() may be called
+    from any thread; everything else runs on the event loop the hub was started on."""
+
+    def __init__(self, buffer_size: int = POST_EVENTS_BUFFER_SIZE, queue_size: int = POST_EVENTS_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.epoch = uuid.uuid4().hex[:8]
+        self._last_id = 0
+        # Events with ids up to here may be missing from the buffer (evicted, from before this
+        # process started, or skipped in a cluster resync); None until the next event after a resync.
+        self._floor: Optional[int] = 0
+        self._buffer: Deque[Tuple[int, bytes]] = deque(maxlen=buffer_size)
+        self._subscribers: Set[_Subscriber] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._keepalive: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Binds the hub to the running loop (app startup, after cluster.start())."""
+        self._loop = asyncio.get_running_loop()
+        if cluster.cluster.epoch is not None:
+            self.epoch = cluster.cluster.epoch
+            self._last_id = self._floor = cluster.cluster.start_id
+        if self._keepalive is None and POST_EVENTS_KEEPALIVE_SECONDS > 0:
+            self._keepalive = self._loop.create_task(self._send_keepalives())
+
+    def stop(self) -> None:
+        """Ends every open stream and every later one right away (server draining, app shutdown)."""
+        if self._keepalive is not None:
+            self._keepalive.cancel()
+            self._keepalive = None
+        for subscriber in list(self._subscribers):
+            self._drop(subscriber)
+        self._loop = None
+
+    def publish(self, event: str, data: dict) -> None:
+        """Sends an event to the subscribers of this process and of the other workers."""
+        encoded = serialization.dumps(data).decode()
+        if cluster.cluster.enabled:
+            # Comes back through the change log with its id, like the other workers' events.
+            cluster.cluster.publish("post_event", [event, encoded])
+        else:
+            self.publish_local(None, event, encoded)
+
+    def publish_local(self, event_id: Optional[int], event: str, encoded: str) -> None:
+        """Sends an event to this process's subscribers; event_id None numbers it locally."""
+        loop = self._loop
+        if loop is None: # Not serving (a script using crud): nobody to notify
+            return
+        loop.call_soon_threadsafe(self._dispatch, event_id, event, encoded)
+
+    def resync(self) -> None:
+        """Called by the cluster thread when this worker missed events from the change log."""
+        loop = self._loop
+        if loop is not None:
+            loop.call_soon_threadsafe(self._forget)
+
+    def _forget(self) -> None:
+        # Open streams have a gap and the buffer cannot vouch for what came before it.
+        self._buffer.clear()
+        self._floor = None
+        for subscriber in list(self._subscribers):
+            self._drop(subscriber)
+
+    def _dispatch(self, event_id: Optional[int], event: str, encoded: str) -> None:
+        if event_id is None:
+            event_id = self._last_id + 1
+        if self._floor is None:
+            self._floor = event_id - 1
+        if len(self._buffer) == self._buffer.maxlen:
+            self._floor = self._buffer[0][0] if self._buffer else event_id
+        self._last_id = event_id
+        frame = _frame(f"{self.epoch}-{event_id}", event, encoded)
+        self._buffer.append((event_id, frame))
+        EVENTS_PUBLISHED.inc(event=event)
+        for subscriber in list(self._subscribers):
+            self._offer(subscriber, frame)
+
+    def _offer(self, subscriber: _Subscriber, frame: bytes) -> None:
+        try:
+            subscriber.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            SUBSCRIBERS_DROPPED.inc()
+            self._drop(subscriber)
+
+    def _drop(self, subscriber: _Subscriber) -> None:
+        # The stream ends once it reaches the None left in place of its backlog.
+        self._subscribers.discard(subscriber)
+        subscriber.dropped = True
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(None)
+
+    async def _send_keepalives(self) -> None:
+        # Proxies close connections that stay silent; one timer covers every subscriber.
+        while True:
+            await asyncio.sleep(POST_EVENTS_KEEPALIVE_SECONDS)
+            for subscriber in list(self._subscribers):
+                if subscriber.queue.empty():
+                    subscriber.queue.put_nowait(KEEPALIVE_FRAME)
+
+    def _replay(self, last_event_id: Optional[str]) -> Optional[list]:
+        """Buffered frames after last_event_id, or None if the client has to start over."""
+        epoch, _, seen = (last_event_id or "").partition("-")
+        if epoch != self.epoch or not (seen.isascii() and seen.isdigit()):
+            return None
+        seen = int(seen)
+        if self._floor is None or not self._floor <= seen <= self._last_id:
+            return None
+        return [frame for event_id, frame in self._buffer if event_id > seen]
+
+    async def stream(self, last_event_id: Optional[str] = None) -> AsyncIterator[bytes]:
+        """The body of one GET /posts/stream response."""
+        subscriber = _Subscriber(self.queue_size)
+        # Registered before replaying, on the loop thread, so no event falls between the two.
+        self._subscribers.add(subscriber)
+        try:
+            yield f"retry: {POST_EVENTS_RETRY_MS}\n\n".encode()
+            if self._loop is None: # Stopped (draining): the client reconnects to another worker
+                return
+            if last_event_id:
+                replay = self._replay(last_event_id)
+                if replay is None:
+                    yield _frame(f"{self.epoch}-{self._last_id}", "reset", "{}")
+                else:
+                    for frame in replay:
+                        yield frame
+            deadline = time.monotonic() + POST_EVENTS_MAX_STREAM_SECONDS
+            while True:
+                frame = await subscriber.queue.get()
+                if frame is None:
+                    return
+                yield frame
+                if time.monotonic() >= deadline:
+                    return
+        finally:
+            self._subscribers.discard(subscriber)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+post_event_hub = PostEventHub()
+
+# Under app.serve every worker's events, this one's included, reach the subscribers from the change log.
+cluster.subscribe_ordered("post_event", lambda change_id, payload: post_event_hub.publish_local(change_id, *payload), post_event_hub.resync)
+
+def _post_data(post_id: int, owner_id: int, title: str, updated_at) -> dict:
+    return {"id": post_id, "owner_id": owner_id, "title": title, "updated_at": updated_at}
+
+def post_created(post) -> None:
+    post_event_hub.publish("post_created", _post_data(post.id, post.owner_id, post.title, post.updated_at))
+
+def post_updated(post) -> None:
+    post_event_hub.publish("post_updated", _post_data(post.id, post.owner_id, post.title, post.updated_at))
+
+def post_deleted(post_id: int, owner_id: int) -> None:
+    post_event_hub.publish("post_deleted", {"id": post_id, "owner_id": owner_id})
+
+metrics.CallbackMetric("post_events_subscribers", "Open post event streams in this process.", "gauge", lambda: post_event_hub.subscriber_count)
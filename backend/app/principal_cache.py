@@ -0,0 +1,107 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Set
+
+from . import cluster, metrics
+
+# Verified principals are cached per bearer token so repeat requests skip both the JWT
+# decode and the users lookup. Entries never outlive the token's own `exp`.
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000")) # 0 disables the cache
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "300"))
+
+class _Entry:
+    __slots__ = ("user_id", "snapshot", "expires_at")
+
+    def __init__(self, user_id: int, snapshot: dict, expires_at: float):
+        self.user_id = user_id
+        self.snapshot = snapshot
+        self.expires_at = expires_at
+
+class PrincipalCache:
+    """
+    Thread-safe LRU + TTL cache mapping a bearer token to a snapshot of its user's columns.
+    invalidate_user() drops every token belonging to a user; it is called by crud when a
+    user is updated or deleted so deactivations and renames apply immediately.
+    """
+
+    def __init__(self, max_size: int = PRINCIPAL_CACHE_SIZE, ttl_seconds: float = PRINCIPAL_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._tokens_by_user: Dict[int, Set[str]] = {}
+        # Bumped by every invalidation. A lookup that started before an invalidation must not
+        # repopulate the cache with what it read (see put()).
+        self.epoch = 0
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[dict]:
+        """Returns the cached user snapshot for `token`, or None on a miss or expiry."""
+        if self.max_size <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None or entry.expires_at <= time.time():
+                if entry is not None:
+                    self._remove(token)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return entry.snapshot
+
+    def put(self, token: str, user_id: int, snapshot: dict, token_exp: Optional[float], epoch: int) -> None:
+        """Caches a verified principal until the earlier of the TTL and the token's `exp`.
+        Dropped if any invalidation happened since `epoch` was read."""
+        if self.max_size <= 0:
+            return
+        expires_at = time.time() + self.ttl_seconds
+        if token_exp is not None:
+            expires_at = min(expires_at, token_exp)
+        with self._lock:
+            if epoch != self.epoch:
+                return
+            if token in self._entries:
+                self._remove(token)
+            self._entries[token] = _Entry(user_id, snapshot, expires_at)
+            self._tokens_by_user.setdefault(user_id, set()).add(token)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id: int, publish: bool = True) -> None:
+        """Drops all cached tokens for a user, here and (if `publish`) in the other workers."""
+        with self._lock:
+            self.epoch += 1
+            for token in self._tokens_by_user.pop(user_id, ()):
+                self._entries.pop(token, None)
+        if publish:
+            cluster.cluster.publish("principal_user", user_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.epoch += 1
+            self._entries.clear()
+            self._tokens_by_user.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+    def _remove(self, token: str) -> None:
+        # Caller holds the lock.
+        entry = self._entries.pop(token)
+        tokens = self._tokens_by_user.get(entry.user_id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_user[entry.user_id]
+
+principal_cache = PrincipalCache()
+cluster.subscribe("principal_user", lambda user_id: principal_cache.invalidate_user(user_id, publish=False), principal_cache.clear)
+
+metrics.CallbackMetric("principal_cache_hits_total", "Bearer tokens resolved from the principal cache.", "counter", lambda: principal_cache.hits)
+metrics.CallbackMetric("principal_cache_misses_total", "Bearer tokens that needed a JWT decode and user lookup.", "counter", lambda: principal_cache.misses)
+metrics.CallbackMetric("principal_cache_entries", "Principals currently cached.", "gauge", lambda: principal_cache.stats()["size"])
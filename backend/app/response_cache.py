@@ -0,0 +1,282 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+from fastapi import Request, Response
+
+from . import cluster, compression, conditional, metrics
+
+# Read-through cache for public GET endpoints. Entries hold the already-encoded JSON body plus
+# its validators and are tagged with the resources they were built from, so writes can drop
+# exactly the entries they affect (see the invalidate_* helpers used by crud).
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory") # "memory" or "none"
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "10000"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Safety net only; correctness comes from tag invalidation.
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "300"))
+
+class CachedResponse:
+    """A pre-encoded response body with the validators and headers needed to replay it.
+    Compressed copies of the body are made on first request for each coding and kept with
+    the entry, so a cached response is compressed once however often it is served. (They are
+    not counted against RESPONSE_CACHE_MAX_BYTES; each is a fraction of the body's size.)"""
+    __slots__ = ("body", "etag", "last_modified", "headers", "tags", "media_type", "expires_at", "encoded")
+
+    def __init__(self, body: bytes, etag: str, tags: Iterable[str], last_modified: Optional[datetime] = None,
+                 headers: Optional[Dict[str, str]] = None, media_type: str = "application/json"):
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.headers = headers or {}
+        self.tags = frozenset(tags)
+        self.media_type = media_type
+        self.expires_at = time.monotonic() + RESPONSE_CACHE_TTL_SECONDS
+        self.encoded: Dict[str, bytes] = {}
+
+    def to_response(self, request: Request) -> Response:
+        if conditional.is_not_modified(request, self.etag, self.last_modified):
+            return conditional.not_modified(self.etag, self.last_modified)
+        encoding = compression.choose_encoding(request.headers, self.media_type, len(self.body))
+        if encoding is None:
+            body = self.body
+        else:
+            body = self.encoded.get(encoding)
+            if body is None:
+                body = self.encoded[encoding] = compression.compress(self.body, encoding)
+        response = Response(content=body, media_type=self.media_type, headers=self.headers)
+        conditional.set_validators(response, self.etag, self.last_modified)
+        if encoding is not None:
+            compression.mark_encoded(response.headers, encoding)
+        return response
+
+class CacheBackend:
+    """
+    Storage interface for the response cache. Implementations must be thread-safe: invalidation
+    is called from crud, which runs in the threadpool or inside AsyncSession.run_sync.
+    `epoch` must increase on every invalidation so in-flight builds can detect they raced a write.
+    """
+    epoch = 0
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        raise NotImplementedError
+
+    def set(self, key: str, entry: CachedResponse, epoch: int) -> None:
+        raise NotImplementedError
+
+    def invalidate_tags(self, tags: Iterable[str]) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+class NullBackend(CacheBackend):
+    """Disables caching; every request is built fresh."""
+
+    def get(self, key):
+        return None
+
+    def set(self, key, entry, epoch):
+        pass
+
+    def invalidate_tags(self, tags):
+        pass
+
+    def clear(self):
+        pass
+
+class MemoryLRUBackend(CacheBackend):
+    """In-process LRU bounded by entry count and total body bytes, with a tag -> keys index."""
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES, max_bytes: int = RESPONSE_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.epoch = 0
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._keys_by_tag: Dict[str, Set[str]] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry, epoch):
+        if len(entry.body) > self.max_bytes:
+            return
+        with self._lock:
+            if epoch != self.epoch:
+                return # A write landed while this entry was being built; it may already be stale
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._bytes += len(entry.body)
+            for tag in entry.tags:
+                self._keys_by_tag.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_tags(self, tags):
+        with self._lock:
+            self.epoch += 1
+            for tag in tags:
+                for key in self._keys_by_tag.pop(tag, ()):
+                    if key in self._entries:
+                        self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self.epoch += 1
+            self._entries.clear()
+            self._keys_by_tag.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes}
+
+    def _remove(self, key: str) -> None:
+        # Caller holds the lock.
+        entry = self._entries.pop(key)
+        self._bytes -= len(entry.body)
+        for tag in entry.tags:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+
+class _Flight:
+    __slots__ = ("done", "entry")
+
+    def __init__(self):
+        self.done = asyncio.Event()
+        self.entry: Optional[CachedResponse] = None
+
+class ResponseCache:
+    """Read-through front end over a CacheBackend with single-flight builds per key."""
+
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._flights: Dict[str, _Flight] = {}
+
+    def contains(self, key: str) -> bool:
+        return self.backend.get(key) is not None
+
+    async def get_or_build(self, key: str, build: Callable[[], Awaitable[CachedResponse]]) -> CachedResponse:
+        """
+        Returns the cached entry for `key`, building it with `build()` on a miss.
+        Concurrent misses on the same key wait for the first builder instead of all querying
+        the database (stampede protection). If that build fails, waiters build for themselves.
+        """
+        entry = self.backend.get(key)
+        if entry is not None:
+            self.hits += 1
+            return entry
+        flight = self._flights.get(key)
+        if flight is not None:
+            self.coalesced += 1
+            await flight.done.wait()
+            if flight.entry is not None:
+                return flight.entry
+        self.misses += 1
+        flight = self._flights[key] = _Flight()
+        epoch = self.backend.epoch
+        try:
+            entry = await build()
+            flight.entry = entry
+            self.backend.set(key, entry, epoch)
+            return entry
+        finally:
+            flight.done.set()
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "coalesced": self.coalesced}
+
+def _default_backend() -> CacheBackend:
+    if RESPONSE_CACHE_BACKEND == "none":
+        return NullBackend()
+    return MemoryLRUBackend()
+
+response_cache = ResponseCache(_default_backend())
+
+def _backend_stat(name: str) -> float:
+    stats = getattr(response_cache.backend, "stats", None)
+    return stats()[name] if stats else 0
+
+metrics.CallbackMetric("response_cache_hits_total", "Responses served from the response cache.", "counter", lambda: response_cache.hits)
+metrics.CallbackMetric("response_cache_misses_total", "Responses built because they were not cached.", "counter", lambda: response_cache.misses)
+metrics.CallbackMetric("response_cache_coalesced_total", "Requests that waited for a concurrent build of the same entry.", "counter", lambda: response_cache.coalesced)
+metrics.CallbackMetric("response_cache_entries", "Entries in the response cache.", "gauge", lambda: _backend_stat("entries"))
+metrics.CallbackMetric("response_cache_bytes", "Body bytes held by the response cache.", "gauge", lambda: _backend_stat("bytes"))
+
+def set_backend(backend: CacheBackend) -> None:
+    """Swaps in a different storage backend (e.g. a shared cache)."""
+    response_cache.backend = backend
+
+def cache_key(request: Request) -> str:
+    """Route path plus query parameters in a canonical order."""
+    params = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+    return f"{request.url.path}?{params}"
+
+# --- Tags and invalidation ---
+# "posts:list"         every page of GET /posts
+# "posts:user:{id}"    every page of GET /posts/user/{id}
+# "post:{id}"          GET /posts/{id} and any list page containing that post
+# "owner:{id}"         any response embedding that user's username
+
+# Called after tags are invalidated in this process, for changes made here or in another worker;
+# with None when everything was dropped because changes may have been missed (a cluster resync).
+_invalidation_listeners: List[Callable[[Optional[List[str]]], None]] = []
+
+def on_invalidate(listener: Callable[[Optional[List[str]]], None]) -> None:
+    _invalidation_listeners.append(listener)
+
+def _invalidate_local(tags: List[str]) -> None:
+    # Looked up through response_cache at call time, so a backend swapped in later is the one used.
+    response_cache.backend.invalidate_tags(tags)
+    for listener in _invalidation_listeners:
+        listener(tags)
+
+def _resync() -> None:
+    response_cache.backend.clear()
+    for listener in _invalidation_listeners:
+        listener(None)
+
+def invalidate_tags(tags: List[str]) -> None:
+    """Drops entries carrying any of `tags` in this process and in the other workers."""
+    _invalidate_local(tags)
+    cluster.cluster.publish("response_tags", tags)
+
+cluster.subscribe("response_tags", _invalidate_local, _resync)
+
+def invalidate_post_created(owner_id: int) -> None:
+    invalidate_tags(["posts:list", f"posts:user:{owner_id}"])
+
+def invalidate_post_updated(post_id: int) -> None:
+    # Updates never change created_at, so page membership and order are unaffected.
+    invalidate_tags([f"post:{post_id}"])
+
+def invalidate_post_deleted(post_id: int, owner_id: int) -> None:
+    invalidate_tags([f"post:{post_id}", "posts:list", f"posts:user:{owner_id}"])
+
+def invalidate_user_renamed(user_id: int) -> None:
+    invalidate_tags([f"owner:{user_id}"])
+
+def invalidate_user_deleted(user_id: int) -> None:
+    invalidate_tags([f"owner:{user_id}", "posts:list", f"posts:user:{user_id}"])
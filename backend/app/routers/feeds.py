@@ -0,0 +1,62 @@
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+
+from .. import crud_async, feeds
+from ..response_cache import CachedResponse, cache_key, response_cache
+from ..database import DbSession, get_db
+from ..conditional import make_etag
+
+# Syndication feeds, served outside /api/v1 at the paths feed readers expect. They go through
+# the response cache like the API listings, with the same tags, so a feed is rendered once and
+# re-rendered only after a write that touches it: a new or deleted post (posts:list /
+# posts:user:{id}), an edit of a post it contains (post:{id}) or an author rename (owner:{id}).
+# Polls carrying the cached ETag or Last-Modified get a 304 without touching the database.
+router = APIRouter(tags=["feeds"])
+
+FEED_FORMAT = Query("rss", pattern="^(rss|atom)$", description="rss (RSS 2.0) or atom.")
+
+def _site_url(request: Request) -> str:
+    return feeds.PUBLIC_BASE_URL or str(request.base_url).rstrip("/")
+
+def _feed_key(request: Request) -> str:
+    # Without PUBLIC_BASE_URL the links come from the request's Host header, so each host gets its
+    # own entry; otherwise the first requester's Host would be served to everyone.
+    key = cache_key(request)
+    return key if feeds.PUBLIC_BASE_URL else f"{key}#{_site_url(request)}"
+
+def _feed_entry(request: Request, posts, title: str, format: str, tags: set) -> CachedResponse:
+    site_url = _site_url(request)
+    feed_url = site_url + request.url.path + (f"?format={format}" if format != "rss" else "")
+    render, media_type = (feeds.render_atom, feeds.ATOM_MEDIA_TYPE) if format == "atom" else (feeds.render_rss, feeds.RSS_MEDIA_TYPE)
+    for post in posts:
+        tags.update((f"post:{post.id}", f"owner:{post.owner_id}"))
+    return CachedResponse(
+        body=render(posts, title, site_url, feed_url),
+        etag=make_etag("feed", format, title, site_url, [(post.id, post.updated_at, post.owner.username) for post in posts]),
+        last_modified=feeds.last_modified(posts),
+        tags=tags,
+        media_type=media_type,
+    )
+
+@router.get("/feed.xml")
+async def site_feed(request: Request, format: str = FEED_FORMAT, db: DbSession = Depends(get_db)):
+    """The latest posts of all authors as an RSS 2.0 (default) or Atom feed."""
+    async def build() -> CachedResponse:
+        posts = await crud_async.get_posts(db, limit=feeds.FEED_SIZE, include_content=False)
+        return _feed_entry(request, posts, feeds.FEED_TITLE, format, {"posts:list"})
+
+    entry = await response_cache.get_or_build(_feed_key(request), build)
+    return entry.to_response(request)
+
+@router.get("/users/{user_id}/feed.xml")
+async def user_feed(user_id: int, request: Request, format: str = FEED_FORMAT, db: DbSession = Depends(get_db)):
+    """The latest posts of one author as an RSS 2.0 (default) or Atom feed."""
+    async def build() -> CachedResponse:
+        db_user = await crud_async.get_user(db, user_id=user_id)
+        if db_user is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+        posts = await crud_async.get_posts_by_user(db, owner_id=user_id, limit=feeds.FEED_SIZE, include_content=False)
+        title = f"{feeds.FEED_TITLE}: {db_user.username}"
+        return _feed_entry(request, posts, title, format, {f"posts:user:{user_id}", f"owner:{user_id}"})
+
+    entry = await response_cache.get_or_build(_feed_key(request), build)
+    return entry.to_response(request)
@@ -1,9 +1,57 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from typing import List, Annotated
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from datetime import datetime
+from typing import List, Annotated, Optional, Union
 
-from .. import crud, schemas, auth, models
-from ..database import get_db
+from .. import batch_reads, bulk, compression, conditional, crud_async, post_events, schemas, search, serialization, auth, models, views
+from ..response_cache import CachedResponse, cache_key, response_cache
+from ..database import DbSession, get_db, release
+from ..pagination import InvalidCursorError, decode_cursor, decode_search_cursor, encode_search_cursor, next_cursor_for
+
+# Response header carrying the opaque keyset cursor for the next page (absent on the last page).
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def _parse_cursor(cursor: Optional[str]):
+    if cursor is None:
+        return None
+    try:
+        return decode_cursor(cursor)
+    except InvalidCursorError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid pagination cursor")
+
+def _list_body(posts: List[models.Post], full: bool) -> bytes:
+    # Listings default to PostSummary; the content column is not even loaded in that case.
+    # Rows come straight from our database, so they are encoded without re-validation.
+    return serialization.dump_orm_list(schemas.PostList if full else schemas.PostSummary, posts)
+
+PostListResponse = List[Union[schemas.PostSummary, schemas.PostList]] # For the OpenAPI schema
+
+def _post_etag(post_id: int, updated_at, owner_username: str) -> str:
+    # A post's JSON is determined by its own row (tracked by updated_at) plus the embedded owner username.
+    return conditional.make_etag("post", post_id, updated_at, owner_username)
+
+def _post_last_modified(updated_at: datetime, owner_updated_at: datetime) -> datetime:
+    # Like the ETag, the Last-Modified covers the owner too: a rename changes the post's JSON.
+    return max(conditional.as_utc(updated_at), conditional.as_utc(owner_updated_at))
+
+def _list_etag(variant: str, posts: List[models.Post]) -> str:
+    # Includes the extra look-ahead row so a change to the next-page cursor also changes the tag.
+    return conditional.make_etag(variant, [(post.id, post.updated_at, post.owner.username) for post in posts])
+
+def _list_entry(posts: List[models.Post], limit: int, full: bool, tags: set) -> CachedResponse:
+    """Encodes a page of posts (fetched with limit + 1 rows) as a cacheable response."""
+    next_cursor = next_cursor_for(posts, limit)
+    page = posts[:limit]
+    for post in page:
+        tags.update((f"post:{post.id}", f"owner:{post.owner_id}"))
+    return CachedResponse(
+        body=_list_body(page, full),
+        # Lists carry only an ETag: a deletion changes the page without moving any updated_at,
+        # so Last-Modified could not be trusted here.
+        etag=_list_etag("full" if full else "summary", posts),
+        headers={NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None,
+        tags=tags,
+    )
 
 router = APIRouter(
     prefix="/posts",
@@ -11,10 +59,10 @@ router = APIRouter(
 )
 
 @router.post("", response_model=schemas.Post, status_code=status.HTTP_201_CREATED)
-def create_post_endpoint(
+async def create_post_endpoint(
     post_in: schemas.PostCreate,
     current_user: Annotated[models.User, Depends(auth.get_current_active_user)],
-    db: Session = Depends(get_db)
+    db: DbSession = Depends(get_db)
 ):
     """
     Create a new blog post.
@@ -22,85 +70,259 @@ def create_post_endpoint(
     - **title**: The title of the post.
     - **content**: The main content of the post.
     """
-    return crud.create_post(db=db, post=post_in, owner_id=current_user.id)
+    db_post = await crud_async.create_post(db=db, post=post_in, owner_id=current_user.id)
+    return serialization.json_response(schemas.Post, db_post, status_code=status.HTTP_201_CREATED)
 
-@router.get("", response_model=List[schemas.PostList])
-def read_posts_endpoint(
+@router.get("", response_model=PostListResponse)
+async def read_posts_endpoint(
+    request: Request,
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100), # Default to 20, max 100 posts per page
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="Opaque cursor from a previous page's X-Next-Cursor header. Takes precedence over skip."),
+    full: bool = Query(False, description="Include each post's full content instead of its excerpt."),
+    db: DbSession = Depends(get_db)
 ):
     """
     Retrieve a list of blog posts.
     Publicly accessible. Posts are paginated and ordered by creation date (newest first).
+    The cursor for the following page is returned in the `X-Next-Cursor` response header.
+    Items are summaries (excerpt and word count) unless `full=true` is passed.
+    """
+    after = _parse_cursor(cursor)
+
+    async def build() -> CachedResponse:
+        posts = await crud_async.get_posts(db, skip=skip, limit=limit + 1, after=after, include_content=full)
+        return _list_entry(posts, limit, full, {"posts:list"})
+
+    entry = await response_cache.get_or_build(cache_key(request), build)
+    return entry.to_response(request)
+
+@router.get("/export", response_class=StreamingResponse)
+async def export_posts_endpoint(
+    current_user: Annotated[models.User, Depends(auth.get_current_active_user)],
+):
+    """
+    Stream every post as newline-delimited JSON (one post per line, ordered by id).
+    Requires authentication. Memory use is constant regardless of the number of posts.
+    """
+    return StreamingResponse(bulk.export_posts(), media_type="application/x-ndjson")
+
+@router.get("/stream", response_class=StreamingResponse)
+@compression.no_compression
+async def stream_post_events_endpoint(request: Request):
+    """
+    Server-Sent Events announcing created, updated and deleted posts (`post_created`,
+    `post_updated`, `post_deleted`, carrying the post id, owner id and, except for deletions,
+    title and updated_at). Publicly accessible; holds no database connection.
+    Reconnects resume after the `Last-Event-ID` header; a `reset` event means events were
+    missed and the client should refetch the posts it shows.
+    """
+    return StreamingResponse(
+        post_events.post_event_hub.stream(request.headers.get("last-event-id")),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}, # Tell proxies not to buffer the stream
+    )
+
+@router.post("/import", response_model=schemas.BulkImportResult)
+async def import_posts_endpoint(
+    request: Request,
+    current_user: Annotated[models.User, Depends(auth.get_current_active_user)],
+    db: DbSession = Depends(get_db)
+):
+    """
+    Bulk-create posts from a newline-delimited JSON request body (application/x-ndjson).
+    Requires authentication; the authenticated user owns every imported post.
+    Each line needs `title` and `content` and may carry `created_at`/`updated_at`.
+    Valid lines are inserted in batched transactions; invalid lines, and lines longer than
+    1 MiB, are reported by line number without aborting the rest of the import.
+    """
+    importer = bulk.BatchImporter(owner_id=current_user.id)
+    # Not waiting for the body on the connection of the user lookup; each batch checks one out.
+    await release(db)
+    async for chunk in request.stream():
+        for _ in importer.feed_chunk(chunk):
+            await crud_async.run(db, bulk.insert_batch, *importer.take_batch(), importer.report)
+    importer.finish()
+    await crud_async.run(db, bulk.insert_batch, *importer.take_batch(), importer.report)
+    return serialization.json_response(schemas.BulkImportResult, importer.report.result())
+
+# Declared before /{post_id} so "batch" is not captured as a post id.
+@router.get("/batch", response_model=schemas.PostBatch)
+async def read_posts_batch_endpoint(
+    ids: str = Query(..., description=f"Comma-separated post ids, at most {batch_reads.BATCH_MAX_IDS}."),
+    db: DbSession = Depends(get_db)
+):
+    """
+    Retrieve several posts by id in one request and one query.
+    Publicly accessible. `items` follow the order of `ids` (duplicates removed); ids with no
+    post are listed in `missing`. Not served from the response cache: arbitrary id sets rarely
+    repeat, and caching them would only evict the entries that do.
     """
-    posts = crud.get_posts(db, skip=skip, limit=limit)
-    return posts
+    post_ids = batch_reads.parse_ids(ids)
+    posts, missing = batch_reads.in_request_order(post_ids, await crud_async.get_posts_by_ids(db, post_ids))
+    body = serialization.dumps({"items": [serialization.orm_to_dict(schemas.Post, post) for post in posts], "missing": missing})
+    return Response(content=body, media_type="application/json")
+
+# Declared before /{post_id} so "popular" is not captured as a post id.
+@router.get("/popular", response_model=List[schemas.PostPopular])
+async def popular_posts_endpoint(
+    request: Request,
+    limit: int = Query(20, ge=1, le=100),
+    db: DbSession = Depends(get_db)
+):
+    """
+    The most viewed posts, most views first.
+    Publicly accessible. View counts are written in batches (see app.views), so the ranking
+    lags recent reads by up to VIEW_FLUSH_SECONDS.
+    """
+    async def build() -> CachedResponse:
+        ranked = await crud_async.get_popular_posts(db, limit=limit)
+        tags = {"posts:popular"}
+        for post, _ in ranked:
+            tags.update((f"post:{post.id}", f"owner:{post.owner_id}"))
+        return CachedResponse(
+            body=serialization.dumps([
+                {**serialization.orm_to_dict(schemas.PostSummary, post), "view_count": view_count}
+                for post, view_count in ranked
+            ]),
+            etag=conditional.make_etag("popular", [(post.id, post.updated_at, post.owner.username, view_count) for post, view_count in ranked]),
+            tags=tags,
+        )
+
+    entry = await response_cache.get_or_build(cache_key(request), build)
+    return entry.to_response(request)
+
+# Declared before /{post_id} so "search" is not captured as a post id.
+@router.get("/search", response_model=List[schemas.PostSearchResult])
+async def search_posts_endpoint(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from a previous page's X-Next-Cursor header."),
+    db: DbSession = Depends(get_db)
+):
+    """
+    Full-text search over post titles and content.
+    Publicly accessible. Results are ordered by relevance (best first) and include an
+    HTML-safe highlighted title and content snippet. Paginate with the `X-Next-Cursor` header.
+    """
+    if not search.search_available:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Search is not available on this database")
+    after = None
+    if cursor is not None:
+        try:
+            after = decode_search_cursor(cursor)
+        except InvalidCursorError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid search cursor")
+    hits = await crud_async.run(db, search.search_posts, q, limit=limit + 1, after=after)
+    headers = {}
+    if len(hits) > limit:
+        last_post, last_rank, _, _ = hits[limit - 1]
+        headers[NEXT_CURSOR_HEADER] = encode_search_cursor(last_rank, last_post.id)
+    body = serialization.dumps([
+        {**serialization.orm_to_dict(schemas.PostSummary, post), "rank": rank, "title_highlight": title, "snippet": snippet}
+        for post, rank, title, snippet in hits[:limit]
+    ])
+    return Response(content=body, media_type="application/json", headers=headers)
 
 @router.get("/{post_id}", response_model=schemas.Post)
-def read_post_endpoint(
+async def read_post_endpoint(
     post_id: int,
-    db: Session = Depends(get_db)
+    request: Request,
+    db: DbSession = Depends(get_db)
 ):
     """
     Retrieve a single blog post by its ID.
-    Publicly accessible.
+    Publicly accessible. Supports conditional requests via ETag / Last-Modified.
     """
-    db_post = crud.get_post(db, post_id=post_id)
-    if db_post is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Post not found")
-    return db_post
+    key = cache_key(request)
+    if conditional.has_conditional_headers(request) and not response_cache.contains(key):
+        # Revalidation only needs the post's version, not the row or its serialization.
+        version = await crud_async.get_post_version(db, post_id=post_id)
+        if version is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Post not found")
+        updated_at, owner_updated_at, owner_username = version
+        etag = _post_etag(post_id, updated_at, owner_username)
+        last_modified = _post_last_modified(updated_at, owner_updated_at)
+        if conditional.is_not_modified(request, etag, last_modified):
+            views.view_counter.record(post_id) # A revalidated read is still a view
+            return conditional.not_modified(etag, last_modified)
+
+    async def build() -> CachedResponse:
+        db_post = await crud_async.get_post(db, post_id=post_id)
+        if db_post is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Post not found")
+        return CachedResponse(
+            body=serialization.dump_orm(schemas.Post, db_post),
+            etag=_post_etag(db_post.id, db_post.updated_at, db_post.owner.username),
+            last_modified=_post_last_modified(db_post.updated_at, db_post.owner.updated_at),
+            tags={f"post:{db_post.id}", f"owner:{db_post.owner_id}"},
+        )
+
+    entry = await response_cache.get_or_build(key, build)
+    views.view_counter.record(post_id) # Counted in memory, see app.views
+    return entry.to_response(request)
 
 @router.put("/{post_id}", response_model=schemas.Post)
-def update_post_endpoint(
+async def update_post_endpoint(
     post_id: int,
     post_in: schemas.PostUpdate,
     current_user: Annotated[models.User, Depends(auth.get_current_active_user)],
-    db: Session = Depends(get_db)
+    db: DbSession = Depends(get_db)
 ):
     """
     Update an existing blog post.
     Requires authentication. Only the owner of the post can update it.
     """
-    db_post = crud.get_post(db, post_id=post_id)
+    db_post = await crud_async.get_post(db, post_id=post_id)
     if db_post is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Post not found")
     if db_post.owner_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to update this post")
-    return crud.update_post(db=db, db_post=db_post, post_in=post_in)
+    db_post = await crud_async.update_post(db=db, db_post=db_post, post_in=post_in)
+    return serialization.json_response(schemas.Post, db_post)
 
 @router.delete("/{post_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_post_endpoint(
+async def delete_post_endpoint(
     post_id: int,
     current_user: Annotated[models.User, Depends(auth.get_current_active_user)],
-    db: Session = Depends(get_db)
+    db: DbSession = Depends(get_db)
 ):
     """
     Delete a blog post.
     Requires authentication. Only the owner of the post can delete it.
     Returns 204 No Content on successful deletion.
     """
-    db_post = crud.get_post(db, post_id=post_id)
+    db_post = await crud_async.get_post(db, post_id=post_id)
     if db_post is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Post not found")
     if db_post.owner_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to delete this post")
-    crud.delete_post(db=db, db_post=db_post) 
+    await crud_async.delete_post(db=db, db_post=db_post) 
     return # FastAPI handles 204 response automatically
 
-@router.get("/user/{user_id}", response_model=List[schemas.PostList])
-def read_posts_by_user_endpoint(
+@router.get("/user/{user_id}", response_model=PostListResponse)
+async def read_posts_by_user_endpoint(
     user_id: int,
+    request: Request,
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="Opaque cursor from a previous page's X-Next-Cursor header. Takes precedence over skip."),
+    full: bool = Query(False, description="Include each post's full content instead of its excerpt."),
+    db: DbSession = Depends(get_db)
 ):
     """
     Retrieve posts by a specific user ID.
     Publicly accessible. Useful for viewing a specific author's posts.
+    Supports the same cursor pagination as the main post listing.
     """
-    user = crud.get_user(db, user_id=user_id)
-    if not user:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-    posts = crud.get_posts_by_user(db, owner_id=user_id, skip=skip, limit=limit)
-    return posts
+    after = _parse_cursor(cursor)
+
+    async def build() -> CachedResponse:
+        user = await crud_async.get_user(db, user_id=user_id)
+        if not user:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+        posts = await crud_async.get_posts_by_user(db, owner_id=user_id, skip=skip, limit=limit + 1, after=after, include_content=full)
+        return _list_entry(posts, limit, full, {f"posts:user:{user_id}", f"owner:{user_id}"})
+
+    entry = await response_cache.get_or_build(cache_key(request), build)
+    return entry.to_response(request)
@@ -1,10 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
 from typing import List, Annotated
 
-from .. import crud, schemas, auth, models
-from ..database import get_db
+from .. import batch_reads, conditional, crud_async, schemas, serialization, auth, models
+from ..response_cache import CachedResponse, cache_key, response_cache
+from ..database import DbSession, get_db, get_read_db
 
 router = APIRouter(
     prefix="/users",  # Corrected: To integrate with main.py's app.include_router(..., prefix="/api/v1")
@@ -12,35 +12,36 @@ router = APIRouter(
 )
 
 @router.post("/register", response_model=schemas.User, status_code=status.HTTP_201_CREATED)
-def register_user(user_in: schemas.UserCreate, db: Session = Depends(get_db)):
+async def register_user(user_in: schemas.UserCreate, db: DbSession = Depends(get_db)):
     """
     Register a new user.
     - **username**: Unique username.
     - **email**: Unique email address.
     - **password**: User's password.
     """
-    db_user_by_email = crud.get_user_by_email(db, email=user_in.email)
+    db_user_by_email = await crud_async.get_user_by_email(db, email=user_in.email)
     if db_user_by_email:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
-    db_user_by_username = crud.get_user_by_username(db, username=user_in.username)
+    db_user_by_username = await crud_async.get_user_by_username(db, username=user_in.username)
     if db_user_by_username:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Username already taken"
         )
-    return crud.create_user(db=db, user=user_in)
+    db_user = await crud_async.create_user(db=db, user=user_in)
+    return serialization.json_response(schemas.User, db_user, status_code=status.HTTP_201_CREATED)
 
 @router.post("/token", response_model=schemas.Token)
-def login_for_access_token(form_data: Annotated[OAuth2PasswordRequestForm, Depends()], db: Session = Depends(get_db)):
+async def login_for_access_token(form_data: Annotated[OAuth2PasswordRequestForm, Depends()], db: DbSession = Depends(get_read_db)):
     """
     Authenticate user and return an access token (JWT).
     Uses OAuth2PasswordRequestForm, so expects 'username' and 'password' in form data.
     The 'username' field can be either the actual username or the email.
     """
-    user = auth.authenticate_user(db, username_or_email=form_data.username, password=form_data.password)
+    user = await auth.authenticate_user(db, username_or_email=form_data.username, password=form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -58,17 +59,17 @@ def login_for_access_token(form_data: Annotated[OAuth2PasswordRequestForm, Depen
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.get("/me", response_model=schemas.User)
-def read_users_me(current_user: Annotated[models.User, Depends(auth.get_current_active_user)]):
+async def read_users_me(current_user: Annotated[models.User, Depends(auth.get_current_active_user)]):
     """
     Get current authenticated user's details.
     """
-    return current_user
+    return serialization.json_response(schemas.User, current_user)
 
 @router.put("/me", response_model=schemas.User)
-def update_users_me(
+async def update_users_me(
     user_in: schemas.UserUpdate,
     current_user: Annotated[models.User, Depends(auth.get_current_active_user)],
-    db: Session = Depends(get_db)
+    db: DbSession = Depends(get_db)
 ):
     """
     Update current authenticated user's details.
@@ -76,39 +77,65 @@ def update_users_me(
     """
     # Check for email conflict if email is being changed
     if user_in.email and user_in.email != current_user.email:
-        existing_user = crud.get_user_by_email(db, email=user_in.email)
+        existing_user = await crud_async.get_user_by_email(db, email=user_in.email)
         if existing_user and existing_user.id != current_user.id:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered by another user.")
     
     # Check for username conflict if username is being changed
     if user_in.username and user_in.username != current_user.username:
-        existing_user = crud.get_user_by_username(db, username=user_in.username)
+        existing_user = await crud_async.get_user_by_username(db, username=user_in.username)
         if existing_user and existing_user.id != current_user.id:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Username already taken by another user.")
 
-    updated_user = crud.update_user(db, db_user=current_user, user_in=user_in)
-    return updated_user
+    updated_user = await crud_async.update_user(db, db_user=current_user, user_in=user_in)
+    return serialization.json_response(schemas.User, updated_user)
+
+# Declared before /{user_id} so "batch" is not captured as a user id.
+@router.get("/batch", response_model=schemas.UserBatch)
+async def read_users_batch(
+    ids: str = Query(..., description=f"Comma-separated user ids, at most {batch_reads.BATCH_MAX_IDS}."),
+    db: DbSession = Depends(get_db)
+):
+    """
+    Get several users by ID (minimal public information) in one request and one query.
+    `items` follow the order of `ids` (duplicates removed); ids with no user are listed in `missing`.
+    """
+    user_ids = batch_reads.parse_ids(ids)
+    users, missing = batch_reads.in_request_order(user_ids, await crud_async.get_users_by_ids(db, user_ids))
+    body = serialization.dumps({"items": [serialization.orm_to_dict(schemas.UserMinimal, user) for user in users], "missing": missing})
+    return Response(content=body, media_type="application/json")
 
 @router.get("/{user_id}", response_model=schemas.UserMinimal)
-def read_user_by_id(user_id: int, db: Session = Depends(get_db)):
+async def read_user_by_id(user_id: int, request: Request, db: DbSession = Depends(get_db)):
     """
     Get a specific user by ID (minimal public information).
+    Supports conditional requests via ETag / Last-Modified.
     """
-    db_user = crud.get_user(db, user_id=user_id)
-    if db_user is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-    return db_user
+    async def build() -> CachedResponse:
+        db_user = await crud_async.get_user(db, user_id=user_id)
+        if db_user is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+        return CachedResponse(
+            body=serialization.dump_orm(schemas.UserMinimal, db_user),
+            # UserMinimal exposes only id and username, so those alone determine the representation.
+            etag=conditional.make_etag("user", db_user.id, db_user.username),
+            last_modified=db_user.updated_at,
+            tags={f"owner:{db_user.id}"},
+        )
+
+    entry = await response_cache.get_or_build(cache_key(request), build)
+    return entry.to_response(request)
 
 @router.get("", response_model=List[schemas.UserMinimal])
-def read_users(
+async def read_users(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=200),
-    db: Session = Depends(get_db)
+    db: DbSession = Depends(get_db)
     # current_user: Annotated[models.User, Depends(auth.get_current_active_user)] # Uncomment for admin-only access
 ):
     """
     Retrieve a list of users (minimal public information).
     Currently public, can be restricted to admin users if needed.
     """
-    users = crud.get_users(db, skip=skip, limit=limit)
-    return users
+    users = await crud_async.get_users(db, skip=skip, limit=limit)
+    return Response(content=serialization.dump_orm_list(schemas.UserMinimal, users), media_type="application/json")
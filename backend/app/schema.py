@@ -0,0 +1,98 @@
+"""
+One-time schema setup, kept out of the per-process startup path.
+
+Setting up the schema (create_all, missing columns and indexes, the full-text index, and
+backfilling post summaries) inspects every table and can rewrite rows. It runs once per schema
+change, and the result is recorded in the schema_meta table as a fingerprint of the models and
+search DDL. After that, a process only needs one SELECT at startup to confirm the schema is current.
+
+Run it before starting the server (from backend/):
+    python -m app.schema setup
+
+SCHEMA_SETUP controls what app startup does:
+- auto (default): run the setup only when the recorded fingerprint is missing or out of date
+- skip: trust that `python -m app.schema setup` has been run (the cheapest startup)
+- always: run the setup every time, as startup used to
+"""
+import hashlib
+import os
+from typing import Optional
+
+from sqlalchemy import Column, String, Table, delete, insert, select
+from sqlalchemy.exc import DBAPIError
+
+from . import crud, models, search # models registers the tables on Base.metadata
+from .database import Base, SessionLocal, create_tables, engine
+
+SCHEMA_SETUP = os.getenv("SCHEMA_SETUP", "auto").lower()
+# Bump when the setup must rerun without a model change, e.g. a new data backfill.
+SCHEMA_REVISION = 1
+
+schema_meta = Table(
+    "schema_meta", Base.metadata,
+    Column("key", String(64), primary_key=True),
+    Column("value", String(255), nullable=False),
+)
+
+def schema_fingerprint() -> str:
+    """Hash of everything setup_schema() creates: tables, columns, indexes and the search DDL."""
+    parts = [f"revision:{SCHEMA_REVISION}"]
+    for table in Base.metadata.sorted_tables:
+        parts.append(f"table:{table.name}")
+        for column in table.columns:
+            parts.append(f"column:{column.name}:{column.type!r}:{column.nullable}")
+        for index in sorted(table.indexes, key=lambda index: index.name or ""):
+            parts.append(f"index:{index.name}:{[column.name for column in index.columns]}:{index.unique}")
+    parts.extend(search._SQLITE_DDL + search._POSTGRES_DDL)
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+def _read_meta() -> Optional[dict]:
+    """The recorded schema_meta values, or None if the table does not exist yet."""
+    try:
+        with engine.connect() as conn:
+            return {key: value for key, value in conn.execute(select(schema_meta.c.key, schema_meta.c.value))}
+    except DBAPIError:
+        return None
+
+def _write_meta(values: dict) -> None:
+    with engine.begin() as conn:
+        conn.execute(delete(schema_meta).where(schema_meta.c.key.in_(values)))
+        conn.execute(insert(schema_meta), [{"key": key, "value": value} for key, value in values.items()])
+
+def setup_schema() -> None:
+    """Creates or upgrades the schema and records its fingerprint."""
+    create_tables()
+    search_ready = search.ensure_search_index()
+    db = SessionLocal()
+    try:
+        backfilled = crud.backfill_post_summaries(db)
+        if backfilled:
+            print(f"Computed excerpts for {backfilled} existing posts.")
+    finally:
+        db.close()
+    _write_meta({"fingerprint": schema_fingerprint(), "search_available": "1" if search_ready else "0"})
+
+def ensure_schema(mode: str = SCHEMA_SETUP) -> bool:
+    """Called at app startup. Runs setup_schema() if `mode` requires it; returns True if it ran."""
+    meta = _read_meta() if mode != "always" else None
+    if mode == "skip" or (meta is not None and meta.get("fingerprint") == schema_fingerprint()):
+        # Search availability was probed by the setup run; reuse its answer instead of re-probing.
+        search.search_available = (meta or {}).get("search_available", "1") == "1"
+        return False
+    setup_schema()
+    return True
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Create or upgrade the database schema.")
+    parser.add_argument("command", choices=["setup", "check"])
+    args = parser.parse_args()
+    if args.command == "setup":
+        setup_schema()
+        print("Schema is up to date.")
+    else:
+        meta = _read_meta()
+        current = meta is not None and meta.get("fingerprint") == schema_fingerprint()
+        print("Schema is up to date." if current else "Schema setup required: run `python -m app.schema setup`.")
+        raise SystemExit(0 if current else 1)
@@ -37,6 +37,11 @@ class UserMinimal(BaseModel):
     class Config:
         from_attributes = True
 
+# GET /users/batch: users in request order, plus the requested ids that do not exist.
+class UserBatch(BaseModel):
+    items: List[UserMinimal]
+    missing: List[int]
+
 # --- Post Schemas ---
 class PostBase(BaseModel):
     title: str = Field(..., min_length=1, max_length=200)
@@ -51,6 +56,8 @@ class PostUpdate(BaseModel):
 
 class PostInDBBase(PostBase):
     id: int
+    excerpt: str
+    word_count: int
     owner_id: int
     created_at: datetime
     updated_at: datetime
@@ -67,6 +74,53 @@ class Post(PostInDBBase):
 class PostList(Post):
     pass 
 
+# Lightweight list item: carries the stored excerpt instead of the full content.
+# This is the default shape for post listings; pass full=true to get PostList instead.
+class PostSummary(BaseModel):
+    id: int
+    title: str
+    excerpt: str
+    word_count: int
+    owner_id: int
+    created_at: datetime
+    updated_at: datetime
+    owner: UserMinimal
+
+    class Config:
+        from_attributes = True
+
+# A search hit: the post summary plus its relevance and highlighted fragments.
+# title_highlight and snippet are HTML-escaped with matched terms wrapped in <mark>.
+class PostSearchResult(PostSummary):
+    rank: float
+    title_highlight: str
+    snippet: str
+
+# An entry of GET /posts/popular: the post summary plus its recorded views.
+class PostPopular(PostSummary):
+    view_count: int
+
+# GET /posts/batch: posts in request order, plus the requested ids that do not exist.
+class PostBatch(BaseModel):
+    items: List[Post]
+    missing: List[int]
+
+# --- Bulk Import Schemas ---
+# One NDJSON line of a bulk import. Lines from the export endpoint validate as-is (extra
+# fields such as id and owner_username are ignored); timestamps are optional.
+class PostImport(PostCreate):
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+class BulkImportError(BaseModel):
+    line: int
+    error: str
+
+class BulkImportResult(BaseModel):
+    inserted: int
+    failed: int
+    errors: List[BulkImportError] # Capped; `failed` has the full count
+
 # --- Token Schemas (for Authentication) ---
 class Token(BaseModel):
     access_token: str
@@ -0,0 +1,196 @@
+"""
+Full-text search over posts.
+
+SQLite: an external-content FTS5 table (posts_fts) mirrors posts.title/content and is kept in
+sync by triggers, so every write path (ORM, bulk import, raw SQL) updates it. Ranked by BM25.
+PostgreSQL: a stored generated tsvector column with a GIN index, ranked by ts_rank_cd.
+
+Both rank with higher = better and page by (rank DESC, id DESC) keyset cursors.
+
+Rebuild the index for an existing database (run from backend/; DATABASE_URL selects the database,
+by default the server's simpleblog.db in the project root, see database.py):
+    python -m app.search rebuild
+"""
+import html
+import re
+from typing import List, Optional, Tuple
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from . import crud, models
+from .database import engine as default_engine
+from .pagination import SearchCursorKey
+
+# Control characters mark highlighted terms inside the database; they are swapped for <mark>
+# after the surrounding text is HTML-escaped, so post content can never inject markup.
+_OPEN, _CLOSE = "\x02", "\x03"
+TITLE_WEIGHT, CONTENT_WEIGHT = 10.0, 1.0
+SNIPPET_TOKENS = 24
+
+# Set by ensure_search_index(); False when the database lacks FTS5 support.
+search_available = True
+
+_SQLITE_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(
+        title, content, content='posts', content_rowid='id', tokenize='porter unicode61')""",
+    """CREATE TRIGGER IF NOT EXISTS posts_fts_ai AFTER INSERT ON posts BEGIN
+        INSERT INTO posts_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS posts_fts_ad AFTER DELETE ON posts BEGIN
+        INSERT INTO posts_fts(posts_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS posts_fts_au AFTER UPDATE OF title, content ON posts BEGIN
+        INSERT INTO posts_fts(posts_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+        INSERT INTO posts_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END""",
+]
+
+_POSTGRES_DDL = [
+    """ALTER TABLE posts ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(content, '')), 'B')) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_posts_search_vector ON posts USING GIN (search_vector)",
+]
+
+def ensure_search_index(bind: Engine = default_engine) -> bool:
+    """Creates the search structures if missing. On SQLite a newly created index is populated
+    from existing posts. Returns False (and disables search) if the backend lacks support."""
+    global search_available
+    dialect = bind.dialect.name
+    try:
+        with bind.begin() as conn:
+            if dialect == "sqlite":
+                existed = conn.exec_driver_sql(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'posts_fts'"
+                ).first() is not None
+                for statement in _SQLITE_DDL:
+                    conn.exec_driver_sql(statement)
+                if not existed:
+                    conn.exec_driver_sql("INSERT INTO posts_fts(posts_fts) VALUES ('rebuild')")
+            elif dialect == "postgresql":
+                for statement in _POSTGRES_DDL:
+                    conn.exec_driver_sql(statement)
+            else:
+                search_available = False
+                return False
+    except OperationalError as e:
+        print(f"Warning: full-text search disabled ({e.orig}).")
+        search_available = False
+        return False
+    search_available = True
+    return True
+
+def rebuild_search_index(bind: Engine = default_engine) -> None:
+    """Rebuilds the search index from the posts table."""
+    ensure_search_index(bind)
+    with bind.begin() as conn:
+        if bind.dialect.name == "sqlite":
+            conn.exec_driver_sql("INSERT INTO posts_fts(posts_fts) VALUES ('rebuild')")
+            conn.exec_driver_sql("INSERT INTO posts_fts(posts_fts) VALUES ('optimize')")
+        else:
+            conn.exec_driver_sql("REINDEX INDEX ix_posts_search_vector")
+
+def _fts5_query(q: str) -> Optional[str]:
+    # Quote every term so user input can never be parsed as FTS5 syntax. Terms are ANDed and
+    # the last one is a prefix match, which suits search-as-you-type.
+    terms = re.findall(r"\w+", q)
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+def _render_highlight(marked: str) -> str:
+    return html.escape(marked).replace(_OPEN, "<mark>").replace(_CLOSE, "</mark>")
+
+SearchHit = Tuple[models.Post, float, str, str] # (post, rank, highlighted title, snippet)
+
+def _sqlite_page(db: Session, q: str, limit: int, after: Optional[SearchCursorKey]) -> List[Tuple[int, float, str, str]]:
+    match = _fts5_query(q)
+    if match is None:
+        return []
+    keyset = "" if after is None else "WHERE rank < :after_rank OR (rank = :after_rank AND id < :after_id)"
+    # Rank the full match set but only compute highlights for the rows on this page.
+    ranked = db.execute(
+        text(f"""
+            SELECT id, rank FROM (
+                SELECT rowid AS id, -bm25(posts_fts, :title_weight, :content_weight) AS rank
+                FROM posts_fts WHERE posts_fts MATCH :match
+            ) {keyset}
+            ORDER BY rank DESC, id DESC LIMIT :limit
+        """),
+        {"match": match, "limit": limit, "title_weight": TITLE_WEIGHT, "content_weight": CONTENT_WEIGHT,
+         **({"after_rank": after[0], "after_id": after[1]} if after else {})},
+    ).all()
+    if not ranked:
+        return []
+    highlights = {
+        row.id: (row.title, row.snippet)
+        for row in db.execute(
+            text("""
+                SELECT rowid AS id,
+                       highlight(posts_fts, 0, :open, :close) AS title,
+                       snippet(posts_fts, 1, :open, :close, '...', :tokens) AS snippet
+                FROM posts_fts WHERE posts_fts MATCH :match AND rowid IN :ids
+            """).bindparams(bindparam("ids", expanding=True)),
+            {"match": match, "ids": [row.id for row in ranked], "open": _OPEN, "close": _CLOSE, "tokens": SNIPPET_TOKENS},
+        )
+    }
+    return [(row.id, row.rank, *highlights[row.id]) for row in ranked]
+
+def _postgres_page(db: Session, q: str, limit: int, after: Optional[SearchCursorKey]) -> List[Tuple[int, float, str, str]]:
+    keyset = "" if after is None else "AND (rank < :after_rank OR (rank = :after_rank AND id < :after_id))"
+    options = f"StartSel={_OPEN}, StopSel={_CLOSE}, MaxWords={SNIPPET_TOKENS}, MinWords=8, MaxFragments=1"
+    # ts_headline is expensive, so it runs in the outer query over the page rows only.
+    rows = db.execute(
+        text(f"""
+            WITH query AS (SELECT websearch_to_tsquery('english', :q) AS tsq),
+            page AS (
+                SELECT id, rank FROM (
+                    SELECT posts.id, ts_rank_cd(posts.search_vector, query.tsq)::float8 AS rank
+                    FROM posts, query WHERE posts.search_vector @@ query.tsq
+                ) ranked WHERE true {keyset}
+                ORDER BY rank DESC, id DESC LIMIT :limit
+            )
+            SELECT page.id, page.rank,
+                   ts_headline('english', posts.title, query.tsq, :title_options) AS title,
+                   ts_headline('english', posts.content, query.tsq, :options) AS snippet
+            FROM page JOIN posts ON posts.id = page.id, query
+            ORDER BY page.rank DESC, page.id DESC
+        """),
+        {"q": q, "limit": limit, "options": options, "title_options": f"StartSel={_OPEN}, StopSel={_CLOSE}, HighlightAll=true",
+         **({"after_rank": after[0], "after_id": after[1]} if after else {})},
+    ).all()
+    return [(row.id, row.rank, row.title, row.snippet) for row in rows]
+
+def search_posts(db: Session, q: str, limit: int = 20, after: Optional[SearchCursorKey] = None) -> List[SearchHit]:
+    """
+    Returns up to `limit` posts matching `q`, best match first, as (post, rank, title, snippet).
+    Title and snippet are HTML-escaped with matched terms wrapped in <mark>.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        page = _postgres_page(db, q, limit, after)
+    else:
+        page = _sqlite_page(db, q, limit, after)
+    if not page:
+        return []
+    # Results are PostSummary: the content column is not needed (the snippet comes from the index).
+    posts = {post.id: post for post in crud.get_posts_by_ids(db, [post_id for post_id, *_ in page], include_content=False)}
+    return [
+        (posts[post_id], rank, _render_highlight(title), _render_highlight(snippet))
+        for post_id, rank, title, snippet in page
+        if post_id in posts
+    ]
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Manage the post full-text search index.")
+    parser.add_argument("command", choices=["rebuild"], help="rebuild: repopulate the index from the posts table")
+    args = parser.parse_args()
+    if args.command == "rebuild":
+        rebuild_search_index()
+        print("Search index rebuilt.")
@@ -0,0 +1,101 @@
+"""
+Fast JSON encoding for API responses.
+
+Two paths, both producing bytes ready to send:
+- dump_validated(): a cached TypeAdapter validates from ORM attributes and dumps straight to
+  JSON in pydantic-core. Used where the input should still be checked (mutations, user input).
+- dump_orm()/dump_orm_list(): for rows that just came out of our own database. Fields are
+  read from the ORM objects following the response schema's shape, without re-validating,
+  and encoded with orjson when it is installed (stdlib json otherwise).
+
+FastJSONResponse is the app's default response class for routes that return plain dicts.
+"""
+import json
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import Any, Iterable, Optional, Tuple, Type
+
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, TypeAdapter
+
+from . import metrics
+
+try:
+    import orjson
+except ImportError: # Optional dependency; fall back to the stdlib encoder
+    orjson = None
+
+def _default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        text = value.isoformat()
+        # UTC as "Z", like orjson with OPT_UTC_Z and pydantic, so output does not depend on orjson.
+        if value.utcoffset() == timedelta(0) and text.endswith("+00:00"):
+            text = text[:-6] + "Z"
+        return text
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(value: Any) -> bytes:
+    """Encodes plain Python data (dicts, lists, datetimes, ...) as compact JSON bytes."""
+    with metrics.phase("serialize"):
+        if orjson is not None:
+            # OPT_UTC_Z renders aware UTC datetimes as "...Z", matching pydantic's output.
+            return orjson.dumps(value, default=_default, option=orjson.OPT_UTC_Z)
+        return json.dumps(value, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+@lru_cache(maxsize=None)
+def adapter(tp: Any) -> TypeAdapter:
+    """Returns a TypeAdapter for `tp`, built once per type (building one compiles its schema)."""
+    return TypeAdapter(tp)
+
+def dump_validated(tp: Any, value: Any) -> bytes:
+    """Validates `value` (ORM objects allowed) against `tp` and dumps it to JSON bytes."""
+    type_adapter = adapter(tp)
+    with metrics.phase("serialize"):
+        return type_adapter.dump_json(type_adapter.validate_python(value, from_attributes=True))
+
+# A plan is the schema's field names, each paired with the plan for a nested model (or None).
+_Plan = Tuple[Tuple[str, Optional["_Plan"]], ...]
+
+@lru_cache(maxsize=None)
+def _plan(schema: Type[BaseModel]) -> _Plan:
+    fields = []
+    for name, field in schema.model_fields.items():
+        annotation = field.annotation
+        nested = _plan(annotation) if isinstance(annotation, type) and issubclass(annotation, BaseModel) else None
+        fields.append((name, nested))
+    return tuple(fields)
+
+def _to_dict(plan: _Plan, obj: Any) -> Optional[dict]:
+    if obj is None:
+        return None
+    return {
+        name: _to_dict(nested, value) if nested is not None else value
+        for name, nested in plan
+        for value in (getattr(obj, name),)
+    }
+
+def orm_to_dict(schema: Type[BaseModel], obj: Any) -> dict:
+    """Reads `schema`'s fields (recursing into nested models) from an ORM object, unvalidated."""
+    return _to_dict(_plan(schema), obj)
+
+def dump_orm(schema: Type[BaseModel], obj: Any) -> bytes:
+    with metrics.phase("serialize"):
+        return dumps(orm_to_dict(schema, obj))
+
+def dump_orm_list(schema: Type[BaseModel], objs: Iterable[Any]) -> bytes:
+    plan = _plan(schema)
+    with metrics.phase("serialize"):
+        return dumps([_to_dict(plan, obj) for obj in objs])
+
+def json_response(tp: Any, value: Any, status_code: int = 200) -> Response:
+    """A JSON response validated and encoded through the cached TypeAdapter for `tp`."""
+    return Response(content=dump_validated(tp, value), status_code=status_code, media_type="application/json")
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with dumps() (orjson when available)."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,88 @@
+"""
+Production entry point: one-time setup in this (parent) process, then WEB_CONCURRENCY uvicorn
+worker processes sharing the listening socket.
+
+- Schema setup (app.schema) runs here once; workers start with SCHEMA_SETUP=skip.
+- Workers share a cluster state file (app.cluster) for cross-worker cache invalidation and load
+  reports, which this process logs every LOAD_REPORT_SECONDS.
+- Draining: on SIGTERM/SIGINT workers stop accepting connections and get up to
+  GRACEFUL_TIMEOUT_SECONDS to finish in-flight requests. SIGHUP replaces the workers one at a
+  time (rolling restart), each old worker draining the same way; SIGTTIN/SIGTTOU add or remove one.
+
+Usage (from the project root, as in startup.sh, or from backend/ as `python -m app.serve`):
+    python -m backend.app.serve [--workers 4] [--host 0.0.0.0] [--port 9000]
+    python -m backend.app.serve report [--port 9000]   # print the current per-worker load
+"""
+import argparse
+import os
+import tempfile
+import threading
+
+import uvicorn
+
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+GRACEFUL_TIMEOUT_SECONDS = int(os.getenv("GRACEFUL_TIMEOUT_SECONDS", "30"))
+LOAD_REPORT_SECONDS = float(os.getenv("LOAD_REPORT_SECONDS", "60")) # 0 disables the periodic report
+
+def default_state_path(port: int) -> str:
+    # Per port, so `report` can find a running server's file and two servers never share one.
+    return os.path.join(tempfile.gettempdir(), f"simpleblog-cluster-{port}.db")
+
+def _report_periodically(path: str, interval: float, stop: threading.Event) -> None:
+    from . import cluster
+
+    while not stop.wait(interval):
+        try:
+            print(cluster.format_load_report(cluster.load_report(path)), flush=True)
+        except Exception as e: # Reporting must never take the server down
+            print(f"Load report failed: {e}", flush=True)
+
+def serve(host: str, port: int, workers: int) -> None:
+    state_path = os.getenv("CLUSTER_STATE_PATH") or default_state_path(port)
+    # Set before importing the app, so the modules (and the workers, which inherit the
+    # environment) read the multi-worker settings.
+    os.environ["CLUSTER_STATE_PATH"] = state_path
+    from . import cluster, database, schema
+
+    print(f"Setting up the database schema and cluster state ({state_path})...", flush=True)
+    schema.setup_schema()
+    database.engine.dispose() # Workers open their own connections
+    database.read_engine.dispose()
+    cluster.init_state(state_path)
+    os.environ["SCHEMA_SETUP"] = "skip"
+
+    stop = threading.Event()
+    if LOAD_REPORT_SECONDS > 0:
+        threading.Thread(target=_report_periodically, args=(state_path, LOAD_REPORT_SECONDS, stop), daemon=True).start()
+    try:
+        uvicorn.run(
+            f"{__package__}.main:app", host=host, port=port, workers=workers,
+            timeout_graceful_shutdown=GRACEFUL_TIMEOUT_SECONDS,
+        )
+    finally:
+        stop.set()
+        for suffix in ("", "-wal", "-shm"):
+            try:
+                os.remove(state_path + suffix)
+            except FileNotFoundError:
+                pass
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the API with multiple worker processes.")
+    parser.add_argument("command", nargs="?", choices=["run", "report"], default="run")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "9000")))
+    parser.add_argument("--workers", type=int, default=WEB_CONCURRENCY)
+    args = parser.parse_args()
+    if args.command == "report":
+        from . import cluster
+
+        path = os.getenv("CLUSTER_STATE_PATH") or default_state_path(args.port)
+        if not os.path.exists(path):
+            raise SystemExit(f"No cluster state at {path}; is the server running on port {args.port}?")
+        print(cluster.format_load_report(cluster.load_report(path)))
+        return
+    serve(args.host, args.port, max(1, args.workers))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Static file serving for the built frontend.
+
+- SPAIndex keeps index.html in memory (plus compressed copies) and reloads it when the file's
+  mtime changes, so client-side routes never touch the disk beyond one stat().
+- CompressedStaticFiles serves a precompressed sibling (main.js.br / main.js.gz) when the client
+  accepts it, otherwise compresses compressible files once on first request and keeps the result
+  in a bounded in-memory cache. Each encoding gets its own ETag, and Vary: Accept-Encoding is set.
+
+Precompress a build ahead of time (run from backend/):
+    python -m app.static_files compress ../frontend/build
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import anyio
+from fastapi import Request, Response
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+from . import compression, conditional
+
+# Content-hashed bundles (CRA puts them under build/static) never change under the same name.
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Everything else may change in place, so clients revalidate with the ETag every time.
+REVALIDATE_CACHE_CONTROL = "no-cache"
+STATIC_COMPRESS_MIN_BYTES = int(os.getenv("STATIC_COMPRESS_MIN_BYTES", "1024"))
+STATIC_COMPRESS_CACHE_BYTES = int(os.getenv("STATIC_COMPRESS_CACHE_BYTES", str(32 * 1024 * 1024)))
+
+class _CompressedFileCache:
+    """LRU of lazily compressed file bodies keyed by (path, mtime, size, encoding), bounded in bytes."""
+
+    def __init__(self, max_bytes: int = STATIC_COMPRESS_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[tuple, bytes]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get_or_compress(self, path: str, stat_result: os.stat_result, encoding: str) -> bytes:
+        key = (path, stat_result.st_mtime_ns, stat_result.st_size, encoding)
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+                return body
+        with open(path, "rb") as f:
+            body = compression.compress(f.read(), encoding)
+        if len(body) <= self.max_bytes:
+            with self._lock:
+                if key not in self._entries:
+                    self._entries[key] = body
+                    self._bytes += len(body)
+                while self._bytes > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._bytes -= len(evicted)
+        return body
+
+_compressed_files = _CompressedFileCache()
+
+def _find_variant(path: str, stat_result: os.stat_result, encoding: str) -> Tuple[Optional[str], Optional[os.stat_result]]:
+    # A precompressed sibling is used only if it is at least as new as the original.
+    sibling = path + compression.FILE_SUFFIXES[encoding]
+    try:
+        sibling_stat = os.stat(sibling)
+    except OSError:
+        return None, None
+    if sibling_stat.st_mtime_ns < stat_result.st_mtime_ns:
+        return None, None
+    return sibling, sibling_stat
+
+class CompressedStaticFiles(StaticFiles):
+    """StaticFiles with content negotiation for compressed variants and a fixed Cache-Control."""
+
+    def __init__(self, *args, cache_control: str = REVALIDATE_CACHE_CONTROL, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_control = cache_control
+
+    async def get_response(self, path: str, scope) -> Response:
+        response = await super().get_response(path, scope)
+        if isinstance(response, FileResponse) and response.status_code == 200:
+            response = await self._negotiate(response, scope)
+        if response.status_code in (200, 304):
+            response.headers["Cache-Control"] = self.cache_control
+        return response
+
+    async def _negotiate(self, response: FileResponse, scope) -> Response:
+        stat_result = response.stat_result
+        if not compression.is_compressible(response.media_type) or stat_result is None:
+            return response
+        response.headers["Vary"] = "Accept-Encoding"
+        request_headers = Headers(scope=scope)
+        if stat_result.st_size < STATIC_COMPRESS_MIN_BYTES or "range" in request_headers:
+            return response
+        encoding = compression.negotiate(request_headers.get("accept-encoding"))
+        if encoding is None:
+            return response
+
+        path = str(response.path)
+        headers = {"Content-Encoding": encoding, "Vary": "Accept-Encoding"}
+        sibling, sibling_stat = await anyio.to_thread.run_sync(_find_variant, path, stat_result, encoding)
+        if sibling is not None:
+            # FileResponse derives this ETag from the sibling's own stat, so it differs per encoding.
+            variant = FileResponse(sibling, stat_result=sibling_stat, media_type=response.media_type, headers=headers)
+        else:
+            body = await anyio.to_thread.run_sync(_compressed_files.get_or_compress, path, stat_result, encoding)
+            identity_etag = response.headers["etag"]
+            variant = Response(content=body, media_type=response.media_type, headers={
+                **headers, "ETag": f'{identity_etag[:-1]}-{encoding}"', "Last-Modified": response.headers["last-modified"],
+            })
+        if self.is_not_modified(variant.headers, request_headers):
+            return NotModifiedResponse(variant.headers)
+        return variant
+
+class SPAIndex:
+    """index.html held in memory with precomputed compressed variants, reloaded when its mtime changes.
+    Serves `fallback_html` while the file does not exist (frontend not built)."""
+
+    def __init__(self, path: Path, fallback_html: str):
+        self.path = path
+        self.fallback_html = fallback_html.encode("utf-8")
+        self._mtime_ns: Optional[int] = -1 # -1: not loaded yet; None: serving the fallback
+        # (etag, {encoding or "identity": body})
+        self._snapshot: Tuple[str, Dict[str, bytes]] = ("", {})
+        self._lock = threading.Lock()
+
+    def _current(self) -> Tuple[str, Dict[str, bytes]]:
+        try:
+            mtime_ns = os.stat(self.path).st_mtime_ns
+        except OSError:
+            mtime_ns = None
+        if mtime_ns != self._mtime_ns:
+            with self._lock:
+                if mtime_ns != self._mtime_ns:
+                    body = self.path.read_bytes() if mtime_ns is not None else self.fallback_html
+                    bodies = {"identity": body}
+                    for encoding in compression.ENCODINGS:
+                        bodies[encoding] = compression.compress(body, encoding, best=True)
+                    etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+                    self._snapshot = (etag, bodies)
+                    self._mtime_ns = mtime_ns
+        return self._snapshot
+
+    def response(self, request: Request) -> Response:
+        digest, bodies = self._current()
+        encoding = compression.negotiate(request.headers.get("accept-encoding"))
+        etag = f'"{digest}-{encoding}"' if encoding else f'"{digest}"'
+        headers = {"Cache-Control": REVALIDATE_CACHE_CONTROL, "Vary": "Accept-Encoding"}
+        if conditional.is_not_modified(request, etag):
+            response = conditional.not_modified(etag)
+            response.headers.update(headers)
+            return response
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        response = Response(content=bodies[encoding or "identity"], media_type="text/html", headers=headers)
+        conditional.set_validators(response, etag)
+        return response
+
+def precompress_directory(directory: Path) -> int:
+    """Writes .gz (and .br when brotli is installed) next to every compressible file. Returns the count written."""
+    import mimetypes
+
+    written = 0
+    for path in directory.rglob("*"):
+        if not path.is_file() or path.suffix in (".gz", ".br"):
+            continue
+        media_type, _ = mimetypes.guess_type(path.name)
+        if not compression.is_compressible(media_type) or path.stat().st_size < STATIC_COMPRESS_MIN_BYTES:
+            continue
+        data = path.read_bytes()
+        for encoding in compression.ENCODINGS:
+            compressed = compression.compress(data, encoding, best=True)
+            if len(compressed) < len(data):
+                Path(str(path) + compression.FILE_SUFFIXES[encoding]).write_bytes(compressed)
+                written += 1
+    return written
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Precompress a frontend build for CompressedStaticFiles.")
+    parser.add_argument("command", choices=["compress"])
+    parser.add_argument("directory", nargs="?", default=str(Path(__file__).resolve().parent.parent.parent / "frontend" / "build"))
+    args = parser.parse_args()
+    count = precompress_directory(Path(args.directory))
+    print(f"Wrote {count} compressed files ({', '.join(compression.ENCODINGS)}).")
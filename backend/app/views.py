@@ -0,0 +1,97 @@
+import asyncio
+import os
+from typing import Dict, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from . import crud, metrics, response_cache
+from .database import SessionLocal
+
+# Post views are counted in memory and added to post_stats in one batched upsert every
+# VIEW_FLUSH_SECONDS (and at shutdown), instead of an UPDATE per read. Counts not yet flushed are
+# lost if the process is killed without a clean shutdown.
+VIEW_COUNTING = os.getenv("VIEW_COUNTING", "true").lower() in ("1", "true", "yes")
+VIEW_FLUSH_SECONDS = float(os.getenv("VIEW_FLUSH_SECONDS", "10"))
+# Flush early once this many distinct posts have pending counts, bounding memory.
+VIEW_MAX_PENDING_POSTS = int(os.getenv("VIEW_MAX_PENDING_POSTS", "10000"))
+
+class ViewCounter:
+    """
+    Pending view counts per post id. record() is only called from async routes, i.e. on the event
+    loop thread, and the flush swaps the dict out on that same thread, so no lock is needed: a view
+    costs one dict update.
+    """
+
+    def __init__(self, flush_seconds: float = VIEW_FLUSH_SECONDS, max_pending: int = VIEW_MAX_PENDING_POSTS):
+        self.flush_seconds = flush_seconds
+        self.max_pending = max_pending
+        self.recorded = 0
+        self.flushed = 0
+        self._pending: Dict[int, int] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+
+    def record(self, post_id: int) -> None:
+        if not VIEW_COUNTING:
+            return
+        pending = self._pending
+        pending[post_id] = pending.get(post_id, 0) + 1
+        self.recorded += 1
+        if len(pending) >= self.max_pending:
+            self._wakeup.set()
+
+    async def flush(self) -> int:
+        """Writes the pending counts; returns the number of views written (views of since-deleted
+        posts are dropped). On failure the counts are put back to be retried with the next flush."""
+        counts, self._pending = self._pending, {}
+        if not counts:
+            return 0
+        try:
+            written = await run_in_threadpool(_write_counts, counts)
+        except Exception:
+            for post_id, count in counts.items():
+                self._pending[post_id] = self._pending.get(post_id, 0) + count
+            raise
+        self.flushed += written
+        if written:
+            response_cache.invalidate_tags(["posts:popular"])
+        return written
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e: # Keep counting; the next flush retries
+                print(f"Warning: flushing view counts failed ({e}).")
+
+    def start(self) -> None:
+        """Starts the periodic flush (app startup)."""
+        if VIEW_COUNTING and self._task is None:
+            self._wakeup = asyncio.Event() # Bound to the running loop
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stops the periodic flush and writes what is still pending (app shutdown)."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+def _write_counts(counts: Dict[int, int]) -> int:
+    with SessionLocal() as db:
+        return crud.add_post_views(db, counts)
+
+view_counter = ViewCounter()
+
+metrics.CallbackMetric("post_views_recorded_total", "Post views counted in this process.", "counter", lambda: view_counter.recorded)
+metrics.CallbackMetric("post_views_flushed_total", "Post views written to post_stats (views of since-deleted posts are dropped, not counted).", "counter", lambda: view_counter.flushed)
+metrics.CallbackMetric("post_views_pending_posts", "Posts with view counts waiting for the next flush.", "gauge", lambda: len(view_counter._pending))
@@ -0,0 +1,262 @@
+"""
+Group commit for post and user mutations (WRITE_PIPELINE=true).
+
+Without the pipeline every mutation is its own transaction: a commit (an fsync) followed by a
+refresh() SELECT, with all writers serialized on the single writer connection. With it, mutations
+submitted within WRITE_PIPELINE_WINDOW_MS of each other run on a dedicated connection as one
+transaction, each inside its own SAVEPOINT so one caller's failure (e.g. a unique constraint)
+rolls back only that caller's statements. Every statement uses RETURNING, so the committed row
+comes back with the write and no refresh is needed. Each caller then gets its own result or
+exception, and the cache invalidations for the batch run after the commit, before callers resume.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
+
+from . import crud, metrics, models, post_events, response_cache, schemas
+from .database import DbSession, create_savepoint_writer_engine, is_async_session, release
+
+WRITE_PIPELINE = os.getenv("WRITE_PIPELINE", "false").lower() in ("1", "true", "yes")
+# How long the first write of a batch waits for others to join it. Writes that arrive while a
+# batch is committing join the next batch regardless, so under load batches form on their own.
+WRITE_PIPELINE_WINDOW_MS = float(os.getenv("WRITE_PIPELINE_WINDOW_MS", "2"))
+WRITE_PIPELINE_MAX_BATCH = int(os.getenv("WRITE_PIPELINE_MAX_BATCH", "64"))
+
+BATCHES = metrics.Counter("write_pipeline_batches_total", "Transactions committed by the write pipeline.")
+BATCH_SIZE = metrics.Histogram("write_pipeline_batch_size", "Mutations per write pipeline transaction.", buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+FAILED = metrics.Counter("write_pipeline_failed_total", "Mutations that failed in the write pipeline (rolled back to their savepoint).")
+BATCHES.inc(0)
+HOOK_FAILED = metrics.Counter("write_pipeline_hook_failures_total", "After-commit hooks (cache invalidation, events) that raised in the write pipeline.")
+FAILED.inc(0)
+HOOK_FAILED.inc(0)
+
+log = logging.getLogger("app.write_pipeline")
+
+class _Op:
+    __slots__ = ("fn", "args", "after_commit", "future", "loop", "result", "error")
+
+    def __init__(self, fn, args, after_commit, future, loop):
+        self.fn = fn
+        self.args = args
+        self.after_commit = after_commit
+        self.future = future
+        self.loop = loop
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+def _resolve(op: _Op) -> None:
+    # Runs on the caller's event loop; the caller may have been cancelled meanwhile.
+    if op.future.done():
+        return
+    if op.error is not None:
+        op.future.set_exception(op.error)
+    else:
+        op.future.set_result(op.result)
+
+class WritePipeline:
+    """Collects mutations from any number of requests and commits them in batches on one thread."""
+
+    def __init__(self, window_ms: float = WRITE_PIPELINE_WINDOW_MS, max_batch: int = WRITE_PIPELINE_MAX_BATCH):
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._pending: List[_Op] = []
+        self._draining = False
+        self._lock = threading.Lock()
+        self._engine: Optional[Engine] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    async def submit(self, fn: Callable[..., Any], *args, after_commit: Optional[Callable[[Any], None]] = None) -> Any:
+        """Runs fn(connection, *args) in the next batch and returns its result once committed.
+        after_commit(result) runs after the commit (cache invalidation)."""
+        loop = asyncio.get_running_loop()
+        op = _Op(fn, args, after_commit, loop.create_future(), loop)
+        with self._lock:
+            self._pending.append(op)
+            start = not self._draining
+            self._draining = True
+            if self._executor is None:
+                # Its own connection: request sessions may hold the regular writer connection
+                # while they wait here, so sharing that pool could deadlock.
+                self._engine = create_savepoint_writer_engine()
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="write-pipeline")
+        if start:
+            self._executor.submit(self._drain)
+        return await op.future
+
+    def _drain(self) -> None:
+        finished = False
+        try:
+            while True:
+                if self.window > 0:
+                    time.sleep(self.window)
+                with self._lock:
+                    batch = self._pending[:self.max_batch]
+                    del self._pending[:self.max_batch]
+                    if not batch:
+                        self._draining = False
+                        finished = True
+                        return
+                self._run_batch(batch)
+        finally:
+            if not finished:
+                # An unexpected error: let the next submit() start a new drain rather than queue
+                # behind this one forever.
+                with self._lock:
+                    self._draining = False
+
+    def _run_batch(self, batch: List[_Op]) -> None:
+        try:
+            try:
+                with self._engine.connect() as conn:
+                    with conn.begin():
+                        for op in batch:
+                            try:
+                                with conn.begin_nested():
+                                    op.result = op.fn(conn, *op.args)
+                            except Exception as e:
+                                op.error = e
+                                FAILED.inc()
+            except Exception as e: # The commit itself failed: nothing in the batch was written
+                for op in batch:
+                    if op.error is None:
+                        op.error, op.result = e, None
+            else:
+                BATCHES.inc()
+                BATCH_SIZE.observe(len(batch))
+                for op in batch:
+                    if op.error is None and op.after_commit is not None:
+                        try:
+                            op.after_commit(op.result)
+                        except Exception:
+                            # The write is committed, so the caller still gets its result; a failed
+                            # invalidation or event publish is logged rather than failing the batch.
+                            HOOK_FAILED.inc()
+                            log.exception("Write pipeline after-commit hook failed")
+        finally:
+            for op in batch:
+                try:
+                    op.loop.call_soon_threadsafe(_resolve, op)
+                except RuntimeError: # The caller's loop is closed; nobody is waiting
+                    pass
+
+    def shutdown(self) -> None:
+        """Waits for queued writes to commit (app shutdown)."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+            self._engine.dispose()
+
+write_pipeline = WritePipeline()
+
+# --- Statements (run on the pipeline thread inside a savepoint) ---
+
+def _detached(model, row) -> Any:
+    """An ORM instance holding a committed row, attached to no session (as if loaded and closed)."""
+    obj = model(**row)
+    make_transient_to_detached(obj)
+    return obj
+
+def _apply_row(obj: Any, row: dict) -> None:
+    # Committed values: the instance is not marked as modified.
+    for key, value in row.items():
+        set_committed_value(obj, key, value)
+
+_post_columns = models.Post.__table__.columns
+_user_columns = models.User.__table__.columns
+
+def _insert_post(conn: Connection, values: dict, owner: Optional[models.User]) -> models.Post:
+    row = conn.execute(insert(models.Post).values(**values).returning(*_post_columns)).mappings().one()
+    post = _detached(models.Post, row)
+    if owner is None: # Post responses embed the owner's username
+        owner_row = conn.execute(select(models.User.id, models.User.username).where(models.User.id == row["owner_id"])).mappings().one()
+        owner = _detached(models.User, owner_row)
+    set_committed_value(post, "owner", owner) # No backref event, so owner.posts is left unloaded
+    return post
+
+def _update_post(conn: Connection, post_id: int, values: dict) -> dict:
+    row = conn.execute(
+        update(models.Post).where(models.Post.id == post_id).values(**values).returning(*_post_columns)
+    ).mappings().first()
+    if row is None: # Deleted since the route loaded it
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Post not found")
+    return dict(row)
+
+def _delete_post(conn: Connection, post_id: int) -> None:
+    conn.execute(delete(models.PostStats).where(models.PostStats.post_id == post_id)) # See crud._delete_post_stats
+    conn.execute(delete(models.Post).where(models.Post.id == post_id))
+
+def _insert_user(conn: Connection, values: dict) -> models.User:
+    try:
+        row = conn.execute(insert(models.User).values(**values).returning(*_user_columns)).mappings().one()
+    except IntegrityError:
+        # A concurrent registration in the same batch (or one just before it) took the name or email
+        # after the route's own checks passed; report it the way those checks do.
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Username or email already registered")
+    return _detached(models.User, row)
+
+# --- Pipelined counterparts of the crud mutations (called by crud_async) ---
+
+def _loaded_user(db: DbSession, user_id: int) -> Optional[models.User]:
+    # The current user is normally in the request's session already (see auth.get_current_user).
+    session = db.sync_session if is_async_session(db) else db
+    user = session.identity_map.get(identity_key(models.User, user_id))
+    return user if user is not None and "username" in user.__dict__ else None
+
+# After-commit hooks: the same invalidations and events as the crud functions.
+
+def _post_created(post: models.Post) -> None:
+    response_cache.invalidate_post_created(post.owner_id)
+    post_events.post_created(post)
+
+def _post_updated(row: dict) -> None:
+    response_cache.invalidate_post_updated(row["id"])
+    post_events.post_updated(models.Post(**row))
+
+def _post_deleted(post_id: int, owner_id: int) -> None:
+    response_cache.invalidate_post_deleted(post_id, owner_id)
+    post_events.post_deleted(post_id, owner_id)
+
+async def create_post(db: DbSession, post: schemas.PostCreate, owner_id: int) -> models.Post:
+    values = {**post.model_dump(), **crud.summarize_content(post.content), "owner_id": owner_id}
+    owner = _loaded_user(db, owner_id)
+    await release(db) # Otherwise the session keeps the writer for the whole wait
+    return await write_pipeline.submit(_insert_post, values, owner, after_commit=_post_created)
+
+async def update_post(db: DbSession, db_post: models.Post, post_in: schemas.PostUpdate) -> models.Post:
+    values = post_in.model_dump(exclude_unset=True)
+    if values.get("content") is not None:
+        values.update(crud.summarize_content(values["content"]))
+    if not values:
+        return db_post # Nothing to write; updated_at stays as it was
+    post_id = db_post.id
+    await release(db)
+    row = await write_pipeline.submit(_update_post, post_id, values, after_commit=_post_updated)
+    _apply_row(db_post, row)
+    return db_post
+
+async def delete_post(db: DbSession, db_post: models.Post) -> models.Post:
+    post_id, owner_id = db_post.id, db_post.owner_id
+    await release(db)
+    await write_pipeline.submit(
+        _delete_post, post_id, after_commit=lambda _: _post_deleted(post_id, owner_id),
+    )
+    return db_post
+
+async def create_user(db: DbSession, user: schemas.UserCreate, hashed_password: str) -> models.User:
+    values = {"username": user.username, "email": user.email, "hashed_password": hashed_password}
+    await release(db)
+    return await write_pipeline.submit(_insert_user, values)
+
+metrics.CallbackMetric("write_pipeline_pending", "Mutations waiting for the next write pipeline batch.", "gauge", lambda: len(write_pipeline._pending))
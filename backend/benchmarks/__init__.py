@@ -0,0 +1,13 @@
+"""
+Performance benchmarks for the backend. Run from backend/ against a dedicated database, e.g.:
+    export DATABASE_URL=sqlite:///./bench.db
+    python -m benchmarks.seed --users 10000 --posts 1000000
+    python -m benchmarks.micro --output micro.json
+    python -m benchmarks.load --output load.json
+    python -m benchmarks.serialization
+    python -m benchmarks.startup --output startup.json
+    python -m benchmarks.compare before.json after.json
+
+Every benchmark prints a JSON document (see common.emit) and can also write it with --output,
+so runs from different commits can be diffed with benchmarks.compare.
+"""
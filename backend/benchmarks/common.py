@@ -0,0 +1,80 @@
+"""Shared helpers: latency summaries and the JSON result envelope every benchmark writes."""
+import json
+import math
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from time import perf_counter
+from typing import Callable, List, Optional, Sequence
+
+RESULT_FORMAT_VERSION = 1
+
+def percentile(sorted_samples: Sequence[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted sequence."""
+    if not sorted_samples:
+        return 0.0
+    rank = math.ceil(pct / 100 * len(sorted_samples)) - 1
+    return sorted_samples[max(0, min(rank, len(sorted_samples) - 1))]
+
+def summarize(samples: List[float]) -> dict:
+    """Latency summary in milliseconds for a list of durations in seconds."""
+    ordered = sorted(samples)
+    to_ms = lambda seconds: round(seconds * 1000, 4)
+    return {
+        "count": len(ordered),
+        "mean_ms": to_ms(sum(ordered) / len(ordered)) if ordered else 0.0,
+        "min_ms": to_ms(ordered[0]) if ordered else 0.0,
+        "p50_ms": to_ms(percentile(ordered, 50)),
+        "p95_ms": to_ms(percentile(ordered, 95)),
+        "p99_ms": to_ms(percentile(ordered, 99)),
+        "max_ms": to_ms(ordered[-1]) if ordered else 0.0,
+    }
+
+def time_calls(fn: Callable[[], object], repeat: int, warmup: int = 1, reset: Optional[Callable[[], None]] = None) -> dict:
+    """Times `repeat` calls of fn() after `warmup` untimed calls. reset() runs between calls, untimed."""
+    for _ in range(warmup):
+        fn()
+        if reset:
+            reset()
+    samples = []
+    for _ in range(repeat):
+        start = perf_counter()
+        fn()
+        samples.append(perf_counter() - start)
+        if reset:
+            reset()
+    return summarize(samples)
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True, timeout=5,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def emit(benchmark: str, config: dict, results: dict, output: Optional[str] = None) -> dict:
+    """Wraps results with run metadata and writes them as JSON to stdout and, if given, `output`."""
+    from app.database import DATABASE_URL, DB_ASYNC
+    from app.response_cache import RESPONSE_CACHE_BACKEND
+
+    document = {
+        "format": RESULT_FORMAT_VERSION,
+        "benchmark": benchmark,
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "git_commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "database": DATABASE_URL.split("://", 1)[0],
+        "db_async": DB_ASYNC,
+        "response_cache": RESPONSE_CACHE_BACKEND,
+        "config": config,
+        "results": results,
+    }
+    text = json.dumps(document, indent=2)
+    print(text)
+    if output:
+        Path(output).write_text(text + "\n")
+    return document
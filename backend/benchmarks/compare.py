@@ -0,0 +1,55 @@
+"""
+Compares two benchmark result files written with --output.
+
+Usage (from backend/):
+    python -m benchmarks.compare baseline.json candidate.json [--metric p95_ms] [--json]
+"""
+import argparse
+import json
+from pathlib import Path
+from typing import Dict, Iterator, Tuple
+
+def _cases(results: dict, prefix: str = "") -> Iterator[Tuple[str, dict]]:
+    # Results are either {case: metrics} or nested one level deeper (e.g. per schema).
+    for name, value in results.items():
+        if isinstance(value, dict) and any(isinstance(v, (int, float)) for v in value.values()):
+            yield prefix + name, value
+        elif isinstance(value, dict):
+            yield from _cases(value, f"{prefix}{name}.")
+
+def compare(baseline: dict, candidate: dict, metric: str) -> Dict[str, dict]:
+    """Per-case change of `metric` between two result documents (cases present in both)."""
+    old_cases = dict(_cases(baseline["results"]))
+    rows = {}
+    for name, new in _cases(candidate["results"]):
+        old = old_cases.get(name)
+        if old is None or metric not in old or metric not in new:
+            continue
+        change = (new[metric] - old[metric]) / old[metric] * 100 if old[metric] else None
+        rows[name] = {"baseline": old[metric], "candidate": new[metric], "change_pct": round(change, 1) if change is not None else None}
+    return rows
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--metric", default="p50_ms", help="metric to compare, e.g. p50_ms, p99_ms, throughput_rps")
+    parser.add_argument("--json", action="store_true", help="print the comparison as JSON")
+    args = parser.parse_args()
+    baseline = json.loads(Path(args.baseline).read_text())
+    candidate = json.loads(Path(args.candidate).read_text())
+    if baseline.get("benchmark") != candidate.get("benchmark"):
+        parser.error(f"cannot compare {baseline.get('benchmark')!r} results with {candidate.get('benchmark')!r} results")
+    rows = compare(baseline, candidate, args.metric)
+    if args.json:
+        print(json.dumps({"metric": args.metric, "baseline": baseline.get("git_commit"),
+                          "candidate": candidate.get("git_commit"), "cases": rows}, indent=2))
+        return
+    print(f"{args.metric}: {baseline.get('git_commit')} -> {candidate.get('git_commit')}")
+    width = max((len(name) for name in rows), default=10)
+    for name, row in rows.items():
+        change = "n/a" if row["change_pct"] is None else f"{row['change_pct']:+.1f}%"
+        print(f"{name:<{width}}  {row['baseline']:>12}  {row['candidate']:>12}  {change:>8}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+In-process HTTP load driver. Requests go through the real ASGI app (middleware, routing,
+dependencies, serialization) via httpx.ASGITransport, with no network or server in between,
+so the numbers isolate the application's own cost.
+
+Each scenario runs `--requests` requests from `--concurrency` concurrent clients and reports
+p50/p95/p99 latency, throughput and error counts. Paths and parameters come from a seeded RNG.
+Set RESPONSE_CACHE_BACKEND=none to measure uncached reads.
+
+The write scenarios (create_post, update_post) modify the database, so they only run when named
+in --scenarios; compare WRITE_PIPELINE=false and true with them, ideally on a fresh copy of the
+seeded database each time.
+
+Usage (from backend/, after benchmarks.seed):
+    python -m benchmarks.load [--requests 2000] [--concurrency 16] [--scenarios posts_list,post_detail] [--output FILE]
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import httpx
+from sqlalchemy import func, select
+
+# Every request comes from one client, which per-client rate limits would throttle within the
+# first second. Set ADMISSION_RATE_LIMITS=true to measure with them anyway.
+os.environ.setdefault("ADMISSION_RATE_LIMITS", "false")
+
+from app import models
+from app.database import SessionLocal
+from app.main import app
+from .common import emit, summarize
+from .seed import SEED_PASSWORD, WORDS, make_post
+
+API = "/api/v1"
+
+# Authenticated as user0 (updates target user0's own posts); skipped unless requested by name.
+WRITE_SCENARIOS = ("create_post", "update_post")
+
+def scenarios(rng: random.Random, max_user_id: int, max_post_id: int) -> Dict[str, Callable[[], str]]:
+    """Scenario name -> function returning the next request path (all GETs)."""
+    return {
+        "posts_list": lambda: f"{API}/posts?limit=20",
+        "posts_list_deep": lambda: f"{API}/posts?limit=20&skip={rng.randrange(0, 2000) * 20}",
+        "posts_list_full_100": lambda: f"{API}/posts?limit=100&full=true",
+        "post_detail": lambda: f"{API}/posts/{rng.randint(1, max_post_id)}",
+        "user_posts": lambda: f"{API}/posts/user/{rng.randint(1, max_user_id)}",
+        "user_detail": lambda: f"{API}/users/{rng.randint(1, max_user_id)}",
+        "search": lambda: f"{API}/posts/search?q={'+'.join(rng.sample(WORDS, 2))}",
+        "users_me": lambda: f"{API}/users/me",
+    }
+
+def write_scenarios(rng: random.Random, own_post_ids: List[int]) -> Dict[str, Callable[[], Tuple[str, str, dict]]]:
+    """Scenario name -> function returning the next (method, path, JSON body)."""
+    def body() -> dict:
+        return make_post(rng, 0, 0)
+    return {
+        "create_post": lambda: ("POST", f"{API}/posts", {key: body()[key] for key in ("title", "content")}),
+        "update_post": lambda: ("PUT", f"{API}/posts/{rng.choice(own_post_ids)}", {"content": body()["content"]}),
+    }
+
+async def _run_scenario(client: httpx.AsyncClient, next_request: Callable[[], Union[str, Tuple[str, str, dict]]],
+                        requests: int, concurrency: int, headers: Optional[dict]) -> dict:
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            request = next_request()
+            method, path, body = ("GET", request, None) if isinstance(request, str) else request
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body, headers=headers)
+                status = str(response.status_code)
+            except Exception as e: # Count transport-level failures instead of aborting the run
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    errors = sum(count for status, count in statuses.items() if not status.startswith(("2", "3")))
+    return {
+        **summarize(latencies),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "errors": errors,
+        "statuses": statuses,
+    }
+
+async def run(requests: int, concurrency: int, seed: int, only=None, warmup: int = 50) -> Dict[str, dict]:
+    with SessionLocal() as db:
+        max_user_id = db.scalar(select(func.max(models.User.id))) or 0
+        max_post_id = db.scalar(select(func.max(models.Post.id))) or 0
+    if not max_user_id or not max_post_id:
+        raise SystemExit("The database has no users or posts; run benchmarks.seed first.")
+
+    rng = random.Random(seed)
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            login = await client.post(f"{API}/users/token", data={"username": "user0", "password": SEED_PASSWORD})
+            login.raise_for_status()
+            auth_headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+            all_scenarios = dict(scenarios(rng, max_user_id, max_post_id))
+            if only and only.intersection(WRITE_SCENARIOS):
+                with SessionLocal() as db:
+                    own_post_ids = list(db.scalars(select(models.Post.id).join(models.Post.owner).where(models.User.username == "user0").limit(1000)))
+                if not own_post_ids:
+                    raise SystemExit("user0 owns no posts to update.")
+                all_scenarios.update(write_scenarios(rng, own_post_ids))
+            for name, next_request in all_scenarios.items():
+                if (only and name not in only) or (not only and name in WRITE_SCENARIOS):
+                    continue
+                headers = auth_headers if name == "users_me" or name in WRITE_SCENARIOS else None
+                await _run_scenario(client, next_request, warmup, concurrency, headers)
+                results[name] = await _run_scenario(client, next_request, requests, concurrency, headers)
+    return results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="In-process HTTP load test of the main endpoints.")
+    parser.add_argument("--requests", type=int, default=2000, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--scenarios", help="comma-separated scenario names to run")
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    args = parser.parse_args()
+    only = set(args.scenarios.split(",")) if args.scenarios else None
+    config = {"requests": args.requests, "concurrency": args.concurrency, "seed": args.seed,
+              "scenarios": sorted(only) if only else None}
+    emit("load", config, asyncio.run(run(args.requests, args.concurrency, args.seed, only)), args.output)
+
+if __name__ == "__main__":
+    main()
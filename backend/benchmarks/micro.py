@@ -0,0 +1,94 @@
+"""
+Micro-benchmarks for crud queries and the auth primitives, run directly (no HTTP) against the
+database in DATABASE_URL, normally one filled by benchmarks.seed. Query arguments are drawn from
+a seeded RNG so every run issues the same calls. The session's identity map is cleared between
+calls, so each one pays for loading its rows.
+
+Usage (from backend/):
+    python -m benchmarks.micro [--repeat 200] [--depth 10000] [--only get_post,jwt_decode] [--output FILE]
+"""
+import argparse
+import random
+from typing import Callable, Dict, Iterator
+
+from jose import jwt
+from sqlalchemy import func, select
+
+from app import auth, crud, models, search
+from app.database import ReadSessionLocal
+from .common import emit, time_calls
+from .seed import SEED_PASSWORD, WORDS
+
+BCRYPT_REPEAT = 20 # Hashing is deliberately slow; a few samples are enough
+
+def _cycle(values) -> Iterator:
+    while True:
+        yield from values
+
+def run(repeat: int, depth: int, seed: int, only=None) -> Dict[str, dict]:
+    rng = random.Random(seed)
+    results = {}
+    search_ready = search.ensure_search_index() # Before opening the session: it needs the writer connection
+    # GET requests are served from the read-only pool, so the queries are timed there too.
+    with ReadSessionLocal() as db:
+        max_user_id = db.scalar(select(func.max(models.User.id))) or 0
+        max_post_id = db.scalar(select(func.max(models.Post.id))) or 0
+        if not max_user_id or not max_post_id:
+            raise SystemExit("The database has no users or posts; run benchmarks.seed first.")
+        samples = repeat + 1 # One warmup call per case
+        user_ids = _cycle([rng.randint(1, max_user_id) for _ in range(samples)])
+        post_ids = _cycle([rng.randint(1, max_post_id) for _ in range(samples)])
+        usernames = _cycle([f"user{rng.randrange(max_user_id)}" for _ in range(samples)])
+        id_batches = _cycle([[rng.randint(1, max_post_id) for _ in range(50)] for _ in range(samples)])
+        terms = _cycle([" ".join(rng.sample(WORDS, 2)) for _ in range(samples)])
+        anchor = crud.get_posts(db, skip=depth, limit=1, include_content=False)
+        after = (anchor[0].created_at, anchor[0].id) if anchor else None
+
+        cases: Dict[str, Callable[[], object]] = {
+            "get_user": lambda: crud.get_user(db, next(user_ids)),
+            "get_user_by_username": lambda: crud.get_user_by_username(db, next(usernames)),
+            "get_post": lambda: crud.get_post(db, next(post_ids)),
+            "get_post_version": lambda: crud.get_post_version(db, next(post_ids)),
+            "get_posts_by_ids_50": lambda: crud.get_posts_by_ids(db, next(id_batches), include_content=False),
+            "get_posts_first_page_summary": lambda: crud.get_posts(db, limit=21, include_content=False),
+            "get_posts_first_page_full_100": lambda: crud.get_posts(db, limit=101),
+            f"get_posts_offset_{depth}": lambda: crud.get_posts(db, skip=depth, limit=21, include_content=False),
+            f"get_posts_keyset_{depth}": lambda: crud.get_posts(db, limit=21, after=after, include_content=False),
+            "get_posts_by_user": lambda: crud.get_posts_by_user(db, next(user_ids), limit=11, include_content=False),
+        }
+        if search_ready:
+            cases["search_posts"] = lambda: search.search_posts(db, next(terms), limit=21)
+
+        for name, fn in cases.items():
+            if only and name not in only:
+                continue
+            results[name] = time_calls(fn, repeat, reset=db.expunge_all)
+
+    hashed = auth.get_password_hash(SEED_PASSWORD)
+    token = auth.create_access_token({"sub": "user0"})
+    auth_cases = {
+        "get_password_hash": (lambda: auth.get_password_hash(SEED_PASSWORD), min(repeat, BCRYPT_REPEAT)),
+        "verify_password": (lambda: auth.verify_password(SEED_PASSWORD, hashed), min(repeat, BCRYPT_REPEAT)),
+        "create_access_token": (lambda: auth.create_access_token({"sub": "user0"}), repeat),
+        "jwt_decode": (lambda: jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM]), repeat),
+    }
+    for name, (fn, count) in auth_cases.items():
+        if only and name not in only:
+            continue
+        results[name] = time_calls(fn, count)
+    return results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for crud and auth.")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--depth", type=int, default=10_000, help="page depth for the offset vs keyset comparison")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--only", help="comma-separated case names to run")
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    args = parser.parse_args()
+    only = set(args.only.split(",")) if args.only else None
+    config = {"repeat": args.repeat, "depth": args.depth, "seed": args.seed, "only": sorted(only) if only else None}
+    emit("micro", config, run(args.repeat, args.depth, args.seed, only), args.output)
+
+if __name__ == "__main__":
+    main()
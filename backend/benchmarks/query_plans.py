@@ -0,0 +1,245 @@
+"""
+Query-plan regression guard. Runs every crud query against the database in DATABASE_URL
+(normally one filled by benchmarks.seed), captures the SQL each call emits and asks the database
+how it would execute it: EXPLAIN QUERY PLAN on SQLite, EXPLAIN (FORMAT JSON) on PostgreSQL.
+
+`check` fails (exit status 1) when a case:
+- does a full table scan or a sort (SQLite: SCAN <table> without an index, USE TEMP B-TREE;
+  PostgreSQL: Seq Scan, Sort) that its entry in query_plans.json does not explicitly allow,
+- has a plan that differs from the checked-in one, or
+- issues more statements than recorded (an N+1 creeping in).
+`update` rewrites query_plans.json from the current plans, keeping the allow lists; review the
+diff before committing it. `unused-indexes` lists indexes that no case's plan uses, i.e. indexes
+that only cost write time (those backing a UNIQUE constraint are listed separately).
+
+Write cases run inside one transaction that is rolled back, so the database is left unchanged.
+
+Usage (from backend/, after benchmarks.seed):
+    python -m benchmarks.query_plans [check|update|unused-indexes] [--only get_post,get_posts_by_user]
+"""
+import argparse
+import json
+import re
+import sys
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import event, func, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from app import crud, models, schemas, search
+from app.database import Base, IS_SQLITE, create_savepoint_writer_engine
+from .seed import WORDS
+
+EXPECTED_PATH = Path(__file__).with_name("query_plans.json")
+
+# Statements worth explaining; transaction control (SAVEPOINT, RELEASE, ...) is skipped.
+_EXPLAINABLE = re.compile(r"^\s*(SELECT|WITH|INSERT|UPDATE|DELETE)\b", re.IGNORECASE)
+_SQLITE_TABLE_SCAN = re.compile(r"^SCAN (\w+)$") # "SCAN t USING [COVERING] INDEX i" walks an index
+_SQLITE_INDEX = re.compile(r"USING (?:COVERING )?INDEX (\w+)")
+
+def _cases(db: Session) -> Dict[str, Callable[[], object]]:
+    """Case name -> a call of one crud function, with arguments taken from the seeded data."""
+    max_user_id = db.scalar(select(func.max(models.User.id)))
+    max_post_id = db.scalar(select(func.max(models.Post.id)))
+    if not max_user_id or not max_post_id:
+        raise SystemExit("The database has no users or posts; run benchmarks.seed first.")
+    user = crud.get_user(db, 1)
+    mid_user_id, mid_post_id = max(1, max_user_id // 2), max(1, max_post_id // 2)
+    anchor = crud.get_posts(db, skip=1000, limit=1, include_content=False) or crud.get_posts(db, limit=1)
+    after = (anchor[0].created_at, anchor[0].id)
+    post_ids = list(range(mid_post_id, mid_post_id + 50))
+
+    def post_of_user(user_id: int) -> models.Post:
+        return db.scalars(select(models.Post).where(models.Post.owner_id == user_id).limit(1)).first()
+
+    cases: Dict[str, Callable[[], object]] = {
+        "get_user": lambda: crud.get_user(db, mid_user_id),
+        "get_user_by_email": lambda: crud.get_user_by_email(db, user.email),
+        "get_user_by_username": lambda: crud.get_user_by_username(db, user.username),
+        "get_users": lambda: crud.get_users(db, skip=100, limit=100),
+        "get_users_by_ids": lambda: crud.get_users_by_ids(db, list(range(1, 51))),
+        "get_post": lambda: crud.get_post(db, mid_post_id),
+        "get_posts_by_ids": lambda: crud.get_posts_by_ids(db, post_ids, include_content=False),
+        "get_post_version": lambda: crud.get_post_version(db, mid_post_id),
+        "get_posts_first_page": lambda: crud.get_posts(db, limit=21, include_content=False),
+        "get_posts_offset": lambda: crud.get_posts(db, skip=1000, limit=21, include_content=False),
+        "get_posts_keyset": lambda: crud.get_posts(db, limit=21, after=after, include_content=False),
+        "get_posts_by_user": lambda: crud.get_posts_by_user(db, mid_user_id, limit=21, include_content=False),
+        "get_posts_by_user_keyset": lambda: crud.get_posts_by_user(db, anchor[0].owner_id, limit=21, after=after, include_content=False),
+        "get_popular_posts": lambda: crud.get_popular_posts(db, limit=20),
+        "add_post_views": lambda: crud.add_post_views(db, {post_id: 1 for post_id in post_ids}),
+        "create_user": lambda: crud.create_user(db, schemas.UserCreate(username="plan-check", email="plan-check@example.com", password="unused-password"), hashed_password="x"),
+        "update_user": lambda: crud.update_user(db, crud.get_user(db, mid_user_id), schemas.UserUpdate(username="plan-check-renamed")),
+        "update_password_hash": lambda: crud.update_password_hash(db, crud.get_user(db, mid_user_id), "x"),
+        "create_post": lambda: crud.create_post(db, schemas.PostCreate(title="plan check", content=" ".join(WORDS[:50])), owner_id=mid_user_id),
+        "update_post": lambda: crud.update_post(db, crud.get_post(db, mid_post_id), schemas.PostUpdate(title="plan check", content="changed")),
+        "delete_post": lambda: crud.delete_post(db, crud.get_post(db, mid_post_id + 1)),
+        "delete_user": lambda: crud.delete_user(db, max_user_id),
+        "backfill_post_summaries": lambda: crud.backfill_post_summaries(db),
+    }
+    if post_of_user(max_user_id) is None:
+        del cases["delete_user"] # Deleting a user without posts skips the statements worth checking
+    if search.search_available:
+        cases["search_posts"] = lambda: search.search_posts(db, " ".join(WORDS[:2]), limit=21)
+    return cases
+
+def _explain(conn: Connection, statement: str, parameters) -> List[str]:
+    """The plan of one statement as normalized text lines (indented by depth)."""
+    if IS_SQLITE:
+        rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+        depth = {0: -1}
+        lines = []
+        for node_id, parent, _, detail in rows:
+            depth[node_id] = depth.get(parent, -1) + 1
+            lines.append("  " * depth[node_id] + detail)
+        return lines
+    plan = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, parameters).scalar()
+    lines = []
+
+    def walk(node: dict, level: int) -> None:
+        text = node["Node Type"]
+        if "Relation Name" in node:
+            text += f" on {node['Relation Name']}"
+        if "Index Name" in node:
+            text += f" using {node['Index Name']}"
+        lines.append("  " * level + text)
+        for child in node.get("Plans", ()):
+            walk(child, level + 1)
+
+    walk(plan[0]["Plan"], 0)
+    return lines
+
+def _violations(plan: List[str]) -> List[str]:
+    found = []
+    for line in plan:
+        detail = line.strip()
+        if IS_SQLITE:
+            if _SQLITE_TABLE_SCAN.match(detail) or "USE TEMP B-TREE" in detail:
+                found.append(detail)
+        elif detail.startswith(("Seq Scan", "Sort", "Incremental Sort")):
+            found.append(detail)
+    return found
+
+def _used_indexes(plan: List[str]) -> List[str]:
+    if IS_SQLITE:
+        return [match.group(1) for line in plan for match in _SQLITE_INDEX.finditer(line)]
+    return [line.rsplit(" using ", 1)[1] for line in plan if " using " in line]
+
+def capture(only: Optional[List[str]] = None) -> Dict[str, dict]:
+    """Runs the cases and returns {case: {"statements": n, "plan": [...]}} (one plan block per
+    explainable statement, in order)."""
+    engine = create_savepoint_writer_engine()
+    results: Dict[str, dict] = {}
+    try:
+        with engine.connect() as conn:
+            transaction = conn.begin()
+            # crud's commit() calls release savepoints inside the outer transaction, rolled back below.
+            db = Session(bind=conn, join_transaction_mode="create_savepoint")
+            captured: List[Tuple[str, object]] = []
+
+            def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+                if _EXPLAINABLE.match(statement):
+                    captured.append((statement, parameters[0] if executemany else parameters))
+
+            try:
+                for name, call in _cases(db).items():
+                    if only and name not in only:
+                        continue
+                    db.expunge_all() # Every case loads its rows itself
+                    captured.clear()
+                    event.listen(conn, "before_cursor_execute", before_cursor_execute)
+                    try:
+                        call()
+                    finally:
+                        event.remove(conn, "before_cursor_execute", before_cursor_execute)
+                    plan = []
+                    for statement, parameters in captured:
+                        plan.append("-- " + " ".join(statement.split())[:120])
+                        plan.extend(_explain(conn, statement, parameters))
+                    results[name] = {"statements": len(captured), "plan": plan}
+            finally:
+                db.close()
+                transaction.rollback()
+    finally:
+        engine.dispose()
+    return results
+
+def _load_expected() -> Dict[str, dict]:
+    if not EXPECTED_PATH.exists():
+        return {}
+    return json.loads(EXPECTED_PATH.read_text())
+
+def _dialect_key() -> str:
+    return "sqlite" if IS_SQLITE else "postgresql"
+
+def check(results: Dict[str, dict], expected: Dict[str, dict]) -> List[str]:
+    failures = []
+    for name, result in results.items():
+        entry = expected.get(name)
+        if entry is None:
+            failures.append(f"{name}: no expectation recorded (run `update` and review the plan)")
+            continue
+        allowed = entry.get("allow", [])
+        for violation in _violations(result["plan"]):
+            if not any(pattern in violation for pattern in allowed):
+                failures.append(f"{name}: {violation}")
+        recorded = entry.get(_dialect_key())
+        if recorded is None:
+            continue
+        if result["statements"] > recorded["statements"]:
+            failures.append(f"{name}: {result['statements']} statements, {recorded['statements']} expected")
+        if result["plan"] != recorded["plan"]:
+            failures.append(
+                f"{name}: plan changed\n    expected:\n      " + "\n      ".join(recorded["plan"])
+                + "\n    actual:\n      " + "\n      ".join(result["plan"])
+            )
+    return failures
+
+def update(results: Dict[str, dict], expected: Dict[str, dict]) -> Dict[str, dict]:
+    # Each entry: {"allow": [...violations accepted...], "why": "...", "sqlite": {...}, "postgresql": {...}}
+    for name, result in results.items():
+        entry = expected.setdefault(name, {"allow": []})
+        entry[_dialect_key()] = result
+    return dict(sorted(expected.items()))
+
+def unused_indexes(results: Dict[str, dict]) -> Tuple[List[str], List[str]]:
+    """(unused indexes, unused indexes that enforce uniqueness) among the models' indexes."""
+    used = {index for result in results.values() for index in _used_indexes(result["plan"])}
+    unused, unique = [], []
+    for table in Base.metadata.sorted_tables:
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            if index.name not in used:
+                (unique if index.unique else unused).append(f"{table.name}.{index.name}")
+    return unused, unique
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Check the query plans of the crud functions against query_plans.json.")
+    parser.add_argument("command", nargs="?", choices=["check", "update", "unused-indexes"], default="check")
+    parser.add_argument("--only", help="comma-separated case names")
+    args = parser.parse_args()
+    only = args.only.split(",") if args.only else None
+
+    search.ensure_search_index() # Before capture() opens its connection: this needs the writer
+    results = capture(only)
+    expected = _load_expected()
+    if args.command == "update":
+        EXPECTED_PATH.write_text(json.dumps(update(results, expected), indent=2) + "\n")
+        print(f"Recorded {len(results)} query plans in {EXPECTED_PATH.name}.")
+        return
+    if args.command == "unused-indexes":
+        unused, unique = unused_indexes(results)
+        print("Indexes no crud query uses (candidates to drop):")
+        print("\n".join(f"  {name}" for name in unused) or "  none")
+        print("Unused by queries but enforcing a UNIQUE constraint (keep):")
+        print("\n".join(f"  {name}" for name in unique) or "  none")
+        return
+    failures = check(results, expected)
+    for failure in failures:
+        print("FAIL " + failure)
+    print(f"{len(results)} cases checked, {len(failures)} problems.")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
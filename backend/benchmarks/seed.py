@@ -0,0 +1,107 @@
+"""
+Deterministic dataset generator. The same --seed and sizes always produce the same users and
+posts (ids, text and timestamps), so benchmark runs on different commits see identical data.
+
+Users are named user0..user{N-1} with emails user{i}@example.com and all share SEED_PASSWORD
+(hashed once; bcrypt per user would dominate seeding time).
+
+Usage (from backend/, against an empty database):
+    DATABASE_URL=sqlite:///./bench.db python -m benchmarks.seed --users 10000 --posts 1000000
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+from sqlalchemy import func, insert, select
+
+from app import auth, crud, models, schema
+from app.database import SessionLocal
+from .common import emit
+
+SEED_PASSWORD = "benchmark-password"
+BASE_TIME = datetime(2023, 1, 1, tzinfo=timezone.utc)
+POST_INTERVAL = timedelta(seconds=30) # Posts are spaced evenly, oldest first
+
+WORDS = (
+    "alpha bravo charlie delta echo foxtrot golf hotel india juliet kilo lima mike november oscar "
+    "papa quebec romeo sierra tango uniform victor whiskey xray yankee zulu python rust golang "
+    "database index query cache latency throughput server client request response stream batch "
+    "cursor page search token session commit rollback vacuum journal writer reader pool thread "
+    "async await event loop socket buffer packet kernel memory garden coffee mountain river ocean "
+    "forest desert island winter summer autumn spring morning evening history science music travel"
+).split()
+
+def _sentence(rng: random.Random, low: int, high: int) -> List[str]:
+    return rng.choices(WORDS, k=rng.randint(low, high))
+
+def make_post(rng: random.Random, index: int, owner_id: int) -> dict:
+    """Row for the index-th post. Draws from `rng` in a fixed order, so output depends only on the seed."""
+    title = " ".join(_sentence(rng, 3, 8)).capitalize()
+    paragraphs = [" ".join(_sentence(rng, 20, 80)).capitalize() + "." for _ in range(rng.randint(1, 5))]
+    content = "\n\n".join(paragraphs)
+    created_at = BASE_TIME + index * POST_INTERVAL
+    return {
+        "title": title, "content": content, **crud.summarize_content(content),
+        "owner_id": owner_id, "created_at": created_at, "updated_at": created_at,
+    }
+
+def seed(users: int, posts: int, seed: int = 42, batch_size: int = 5000, progress: bool = True) -> dict:
+    """Bulk-loads `users` users and `posts` posts into an empty database. Returns timing stats."""
+    # Creating the FTS triggers first keeps the search index in step with the inserts.
+    schema.setup_schema()
+    rng = random.Random(seed)
+    with SessionLocal() as db:
+        if db.scalar(select(func.count()).select_from(models.User)):
+            raise SystemExit("Refusing to seed: the users table is not empty. Point DATABASE_URL at a fresh database.")
+
+        started = time.perf_counter()
+        hashed_password = auth.get_password_hash(SEED_PASSWORD)
+        for first in range(0, users, batch_size):
+            db.execute(insert(models.User), [
+                {"username": f"user{i}", "email": f"user{i}@example.com", "hashed_password": hashed_password,
+                 "is_active": True, "created_at": BASE_TIME, "updated_at": BASE_TIME}
+                for i in range(first, min(first + batch_size, users))
+            ])
+            db.commit()
+        user_ids = db.scalars(select(models.User.id).order_by(models.User.id)).all()
+        users_elapsed = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for first in range(0, posts, batch_size):
+            db.execute(insert(models.Post), [
+                make_post(rng, i, user_ids[rng.randrange(len(user_ids))])
+                for i in range(first, min(first + batch_size, posts))
+            ])
+            db.commit()
+            if progress:
+                print(f"\rposts: {min(first + batch_size, posts)}/{posts}", end="", file=sys.stderr)
+        posts_elapsed = time.perf_counter() - started
+        if progress and posts:
+            print(file=sys.stderr)
+
+    return {
+        "users": users,
+        "posts": posts,
+        "users_seconds": round(users_elapsed, 3),
+        "posts_seconds": round(posts_elapsed, 3),
+        "posts_per_second": round(posts / posts_elapsed, 1) if posts_elapsed else None,
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Seed a database with a deterministic benchmark dataset.")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--posts", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    args = parser.parse_args()
+    if args.users < 1:
+        parser.error("--users must be at least 1")
+    config = {"users": args.users, "posts": args.posts, "seed": args.seed, "batch_size": args.batch_size}
+    emit("seed", config, seed(args.users, args.posts, args.seed, args.batch_size), args.output)
+
+if __name__ == "__main__":
+    main()
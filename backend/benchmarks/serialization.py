@@ -0,0 +1,74 @@
+"""
+Compares ways of turning a page of ORM posts into a JSON response body:
+- response_model: what FastAPI does for a route returning ORM objects with a response_model
+  (validate each object, jsonable_encoder, stdlib json.dumps)
+- type_adapter:   validate from attributes, then dump to bytes with a cached TypeAdapter
+- orm_plan:       app.serialization.dump_orm_list (no re-validation; orjson when installed)
+- orm_plan_stdlib: the same, forcing the stdlib json encoder
+
+Usage (from backend/):
+    python -m benchmarks.serialization [--items 100] [--content-bytes 2000] [--repeat 200] [--output FILE]
+"""
+import argparse
+import json
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+
+from app import crud, models, schemas, serialization
+from .common import emit, time_calls
+
+def make_posts(count: int, content_bytes: int) -> List[models.Post]:
+    """Builds transient Post objects (with owners) shaped like rows loaded from the database."""
+    owner = models.User(id=1, username="bench", email="bench@example.com", hashed_password="x", is_active=True)
+    base = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    posts = []
+    for i in range(count):
+        content = ("Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * (content_bytes // 57 + 1))[:content_bytes]
+        created = base + timedelta(minutes=i)
+        posts.append(models.Post(
+            id=i + 1, title=f"Post number {i}", content=content, **crud.summarize_content(content),
+            owner_id=owner.id, owner=owner, created_at=created, updated_at=created,
+        ))
+    return posts
+
+def run(items: int, content_bytes: int, repeat: int) -> dict:
+    posts = make_posts(items, content_bytes)
+    results = {}
+    for schema in (schemas.PostSummary, schemas.PostList):
+        list_type = List[schema]
+        orjson_module = serialization.orjson
+
+        def orm_plan_stdlib() -> bytes:
+            serialization.orjson = None
+            try:
+                return serialization.dump_orm_list(schema, posts)
+            finally:
+                serialization.orjson = orjson_module
+
+        candidates = {
+            "response_model": lambda: json.dumps(jsonable_encoder([schema.model_validate(post) for post in posts])).encode("utf-8"),
+            "type_adapter": lambda: serialization.dump_validated(list_type, posts),
+            "orm_plan": lambda: serialization.dump_orm_list(schema, posts),
+            "orm_plan_stdlib": orm_plan_stdlib,
+        }
+        timings = {name: time_calls(fn, repeat) for name, fn in candidates.items()}
+        baseline = timings["response_model"]["mean_ms"]
+        for timing in timings.values():
+            timing["speedup"] = round(baseline / timing["mean_ms"], 2)
+        results[schema.__name__] = timings
+    return results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Micro-benchmark of response serialization paths.")
+    parser.add_argument("--items", type=int, default=100)
+    parser.add_argument("--content-bytes", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    args = parser.parse_args()
+    config = {"items": args.items, "content_bytes": args.content_bytes, "repeat": args.repeat, "orjson": serialization.orjson is not None}
+    emit("serialization", config, run(args.items, args.content_bytes, args.repeat), args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Startup benchmark: how long a fresh worker process takes to become useful. Each sample is a new
+Python process that imports app.main, runs the app's startup handlers, and serves its first
+requests through httpx.ASGITransport. Reported per phase:
+- import: `import app.main`
+- startup: the lifespan startup (schema check, see app.schema)
+- first_request: GET /api/healthcheck, the first request through the middleware stack
+- first_db_request: GET /api/v1/posts, the first request that opens a database connection
+- process: wall time from spawning the interpreter to its exit, as seen by this process
+
+--importtime adds the modules with the largest self time from `python -X importtime`.
+
+Usage (from backend/; point DATABASE_URL at a database that has had `python -m app.schema setup`):
+    python -m benchmarks.startup [--repeat 10] [--importtime 15] [--output FILE]
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .common import emit, summarize
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+_PROBE = """
+import asyncio, json, time
+start = time.perf_counter()
+from app.main import app
+imported = time.perf_counter()
+import httpx
+
+async def main():
+    timings = {"import": imported - start}
+    async with app.router.lifespan_context(app):
+        started = time.perf_counter()
+        timings["startup"] = started - imported
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for name, path in (("first_request", "/api/healthcheck"), ("first_db_request", "/api/v1/posts?limit=20")):
+                begin = time.perf_counter()
+                response = await client.get(path)
+                response.raise_for_status()
+                timings[name] = time.perf_counter() - begin
+    print(json.dumps(timings))
+
+asyncio.run(main())
+"""
+
+def sample() -> Dict[str, float]:
+    """Runs the probe in a new interpreter and returns its phase timings in seconds."""
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-c", _PROBE], cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+    )
+    timings = json.loads(completed.stdout.strip().splitlines()[-1])
+    timings["process"] = time.perf_counter() - start
+    return timings
+
+def slowest_imports(top: int) -> List[dict]:
+    """The `top` modules with the largest self time when importing app.main."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append({"module": name.strip(), "self_ms": int(self_us) / 1000, "cumulative_ms": int(cumulative_us) / 1000})
+    rows.sort(key=lambda row: row["self_ms"], reverse=True)
+    return rows[:top]
+
+def run(repeat: int, importtime: Optional[int] = None) -> dict:
+    sample() # Warmup: fills the bytecode cache, which a deployed worker would find in place
+    phases: Dict[str, List[float]] = {}
+    for _ in range(repeat):
+        for name, seconds in sample().items():
+            phases.setdefault(name, []).append(seconds)
+    results = {name: summarize(samples) for name, samples in phases.items()}
+    if importtime:
+        results["slowest_imports"] = slowest_imports(importtime)
+    return results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure import time and time to first request.")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--importtime", type=int, metavar="N", help="also list the N slowest imports")
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    args = parser.parse_args()
+    config = {"repeat": args.repeat, "importtime": args.importtime}
+    emit("startup", config, run(args.repeat, args.importtime), args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# The app reads its configuration at import time, so point it at a scratch database first.
+_tmp = tempfile.mkdtemp(prefix="simpleblog-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp}/test.db"
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import pytest
+
+@pytest.fixture(scope="session")
+def tables():
+    from app import database, models # noqa: F401 (registers the models)
+    database.create_tables()
@@ -0,0 +1,49 @@
+import asyncio
+
+from app.admission import ConcurrencyLimiter
+
+class _LateGrantSemaphore(asyncio.Semaphore):
+    """Grants a waiting acquire even when it is cancelled, as when the grant and the queue
+    timeout land in the same event loop iteration."""
+
+    async def acquire(self):
+        if not self.locked():
+            return await super().acquire()
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            pass
+        self._value -= 1
+        return True
+
+def test_slot_granted_as_the_wait_times_out_is_not_leaked():
+    limiter = ConcurrencyLimiter(limit=1, max_queued=1, timeout=0.01)
+
+    async def run():
+        limiter._semaphore = _LateGrantSemaphore(1)
+        assert await limiter.acquire()
+        assert not await limiter.acquire() # Shed, although its acquire went on to take the slot
+        await asyncio.sleep(0)
+        limiter.release()
+        assert await asyncio.wait_for(limiter.acquire(), 1)
+        limiter.release()
+
+    asyncio.run(run())
+    assert limiter.running == 0 and limiter.queued == 0 and limiter._semaphore._value == 1
+
+def test_cancelled_waiter_gives_up_its_place():
+    limiter = ConcurrencyLimiter(limit=1, max_queued=1, timeout=5)
+
+    async def run():
+        assert await limiter.acquire()
+        waiting = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0.01)
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        limiter.release()
+        await asyncio.sleep(0)
+        assert await asyncio.wait_for(limiter.acquire(), 1)
+        limiter.release()
+
+    asyncio.run(run())
+    assert limiter.running == 0 and limiter.queued == 0 and limiter._semaphore._value == 1
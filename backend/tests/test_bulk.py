@@ -0,0 +1,49 @@
+import uuid
+
+from sqlalchemy import text
+
+from app import bulk, crud, schemas
+from app.database import SessionLocal
+
+def _owner_id(db) -> int:
+    name = uuid.uuid4().hex[:8]
+    return crud.create_user(db, schemas.UserCreate(username=name, email=f"{name}@example.com", password="password123"), hashed_password="x").id
+
+def test_import_stores_timestamps_in_utc(tables):
+    with SessionLocal() as db:
+        owner_id = _owner_id(db)
+        result = bulk.import_lines(db, [
+            b'{"title": "offset", "content": "x", "created_at": "2023-01-01T05:00:00+05:00"}',
+            b'{"title": "naive", "content": "x", "created_at": "2023-01-01T00:30:00"}',
+        ], owner_id)
+        assert result.inserted == 2 and result.failed == 0
+        stored = db.execute(
+            text("SELECT title, created_at, updated_at FROM posts WHERE owner_id = :owner_id ORDER BY created_at"), {"owner_id": owner_id}
+        ).all()
+        assert [row.title for row in stored] == ["offset", "naive"]
+        assert stored[0].created_at.startswith("2023-01-01 00:00:00") and stored[0].updated_at == stored[0].created_at
+        posts = crud.get_posts_by_user(db, owner_id)
+        assert [post.title for post in posts] == ["naive", "offset"] # Newest first, like native posts
+
+def _feed_body(importer: bulk.BatchImporter, chunks) -> list:
+    batches = []
+    for chunk in chunks:
+        for _ in importer.feed_chunk(chunk):
+            batches.append(importer.take_batch()[1])
+    importer.finish()
+    return batches + [importer.take_batch()[1]]
+
+def test_feed_chunk_joins_lines_split_across_chunks():
+    importer = bulk.BatchImporter(owner_id=1, batch_size=2)
+    batches = _feed_body(importer, [b'{"title": "a", "con', b'tent": "x"}\n{"title": "b", "content": "x"}\n\n{"ti', b'tle": "c", "content": "x"}'])
+    assert batches == [[1, 2], [4]]
+    assert importer.report.failed == 0
+
+def test_feed_chunk_rejects_overlong_lines_without_buffering_them(monkeypatch):
+    monkeypatch.setattr(bulk, "MAX_LINE_BYTES", 64)
+    importer = bulk.BatchImporter(owner_id=1)
+    long_line = b'{"title": "long", "content": "' + b"x" * 200 + b'"}'
+    batches = _feed_body(importer, [long_line[:50], long_line[50:120], long_line[120:], b'\n{"title": "ok", "content": "x"}\n' + long_line])
+    assert len(importer._tail) == 0
+    assert batches == [[2]]
+    assert [(error.line, error.error) for error in importer.report.errors] == [(1, "line longer than 64 bytes"), (3, "line longer than 64 bytes")]
@@ -0,0 +1,50 @@
+"""
+View counts of deleted posts. SQLite reuses the highest deleted rowid for the next post, so a
+post_stats row left behind would hand its count to an unrelated new post.
+"""
+import asyncio
+import uuid
+
+import pytest
+
+from app import crud, models, schemas, write_pipeline
+from app.database import SessionLocal
+from app.write_pipeline import WritePipeline
+
+def _create_user(db) -> models.User:
+    name = uuid.uuid4().hex[:8]
+    return crud.create_user(db, schemas.UserCreate(username=name, email=f"{name}@example.com", password="password123"), hashed_password="x")
+
+def _create_post(db, owner_id: int) -> int:
+    return crud.create_post(db, schemas.PostCreate(title="stats", content="words " * 10), owner_id=owner_id).id
+
+def _delete_with_crud(db, post_id: int) -> None:
+    crud.delete_post(db, crud.get_post(db, post_id))
+
+def _delete_with_pipeline(db, post_id: int) -> None:
+    pipeline = WritePipeline(window_ms=0)
+    try:
+        asyncio.run(pipeline.submit(write_pipeline._delete_post, post_id))
+    finally:
+        pipeline.shutdown()
+
+@pytest.mark.parametrize("delete", [_delete_with_crud, _delete_with_pipeline])
+def test_recreated_post_does_not_inherit_view_count(tables, delete):
+    with SessionLocal() as db:
+        owner_id = _create_user(db).id
+        post_id = _create_post(db, owner_id)
+        assert crud.add_post_views(db, {post_id: 7}) == 7
+        delete(db, post_id)
+        db.expire_all()
+        assert db.get(models.PostStats, post_id) is None
+        new_id = _create_post(db, owner_id)
+        assert new_id == post_id # The case that matters: SQLite handed out the deleted id again
+        assert new_id not in {post.id for post, _ in crud.get_popular_posts(db)}
+
+def test_deleting_a_user_deletes_their_posts_view_counts(tables):
+    with SessionLocal() as db:
+        user = _create_user(db)
+        post_ids = [_create_post(db, user.id) for _ in range(2)]
+        crud.add_post_views(db, {post_id: 3 for post_id in post_ids})
+        crud.delete_user(db, user.id)
+        assert db.query(models.PostStats).filter(models.PostStats.post_id.in_(post_ids)).count() == 0
@@ -0,0 +1,71 @@
+"""
+Statements issued per read request. Serialization reading a relationship that the crud query did
+not load eagerly (an N+1) shows up here as extra statements.
+"""
+import uuid
+from contextlib import contextmanager
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app import crud, database, schemas
+from app.main import app
+from app.response_cache import response_cache
+
+@pytest.fixture(scope="module")
+def client(tables):
+    with TestClient(app) as client:
+        yield client
+
+@pytest.fixture(scope="module")
+def post_ids(tables):
+    # Several authors, so a per-post owner lookup could not hide behind the identity map.
+    prefix = uuid.uuid4().hex[:8]
+    ids = []
+    with database.SessionLocal() as db:
+        for i in range(3):
+            user = crud.create_user(db, schemas.UserCreate(username=f"{prefix}-{i}", email=f"{prefix}-{i}@example.com", password="password123"), hashed_password="x")
+            for j in range(4):
+                ids.append(crud.create_post(db, schemas.PostCreate(title=f"post {i}-{j}", content="words " * 50), owner_id=user.id).id)
+    return ids
+
+@contextmanager
+def count_statements():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engines = {database.engine, database.read_engine}
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+def _get(client, url, **params):
+    response_cache.backend.clear() # Measure a cold read, not a cache hit
+    with count_statements() as statements:
+        response = client.get(url, params=params)
+    assert response.status_code == 200, response.text
+    return response, statements
+
+@pytest.mark.parametrize("params", [{}, {"full": "true"}, {"limit": 5}])
+def test_list_posts_is_one_query(client, post_ids, params):
+    response, statements = _get(client, "/api/v1/posts", **params)
+    assert response.json() and all(post["owner"]["username"] for post in response.json())
+    assert len(statements) == 1, statements
+
+def test_list_posts_by_user_is_two_queries(client, post_ids):
+    owner_id = client.get(f"/api/v1/posts/{post_ids[0]}").json()["owner_id"]
+    response, statements = _get(client, f"/api/v1/posts/user/{owner_id}")
+    assert len(response.json()) == 4
+    assert len(statements) == 2, statements # The user lookup (404 for unknown users), then the page
+
+def test_read_post_is_one_query(client, post_ids):
+    response, statements = _get(client, f"/api/v1/posts/{post_ids[-1]}")
+    assert response.json()["owner"]["username"]
+    assert len(statements) == 1, statements
@@ -0,0 +1,77 @@
+import asyncio
+import uuid
+
+import pytest
+from fastapi import HTTPException
+
+from app import models, write_pipeline
+from app.database import SessionLocal
+from app.write_pipeline import WritePipeline
+
+def _user_values(username: str) -> dict:
+    return {"username": username, "email": f"{username}@example.com", "hashed_password": "x"}
+
+def _usernames(names) -> set:
+    with SessionLocal() as db:
+        return {row.username for row in db.query(models.User.username).filter(models.User.username.in_(names))}
+
+def test_savepoint_isolates_a_failing_write(tables):
+    prefix = uuid.uuid4().hex[:8]
+    taken, first, last = f"{prefix}-taken", f"{prefix}-first", f"{prefix}-last"
+    pipeline = WritePipeline(window_ms=50) # Long enough for all three to share one batch
+
+    async def run():
+        await pipeline.submit(write_pipeline._insert_user, _user_values(taken))
+        batches = write_pipeline.BATCHES.total()
+        results = await asyncio.gather(
+            pipeline.submit(write_pipeline._insert_user, _user_values(first)),
+            pipeline.submit(write_pipeline._insert_user, _user_values(taken)),
+            pipeline.submit(write_pipeline._insert_user, _user_values(last)),
+            return_exceptions=True,
+        )
+        return results, write_pipeline.BATCHES.total() - batches
+
+    try:
+        results, batches = asyncio.run(run())
+    finally:
+        pipeline.shutdown()
+    assert batches == 1
+    assert results[0].username == first and results[2].username == last
+    assert isinstance(results[1], HTTPException) and results[1].status_code == 400
+    assert _usernames([first, last]) == {first, last}
+
+def test_failing_after_commit_hook_does_not_wedge_the_pipeline(tables):
+    prefix = uuid.uuid4().hex[:8]
+    pipeline = WritePipeline(window_ms=0)
+
+    def failing_hook(result):
+        raise RuntimeError("publish failed")
+
+    async def run():
+        failures = write_pipeline.HOOK_FAILED.total()
+        hooked = await asyncio.wait_for(
+            pipeline.submit(write_pipeline._insert_user, _user_values(f"{prefix}-a"), after_commit=failing_hook), 5,
+        )
+        after = await asyncio.wait_for(pipeline.submit(write_pipeline._insert_user, _user_values(f"{prefix}-b")), 5)
+        return hooked, after, write_pipeline.HOOK_FAILED.total() - failures
+
+    try:
+        hooked, after, failures = asyncio.run(run())
+    finally:
+        pipeline.shutdown()
+    assert hooked.username == f"{prefix}-a" and after.username == f"{prefix}-b"
+    assert failures == 1
+    assert _usernames([f"{prefix}-a", f"{prefix}-b"]) == {f"{prefix}-a", f"{prefix}-b"}
+
+def test_drain_resets_after_an_unexpected_error(monkeypatch):
+    pipeline = WritePipeline(window_ms=0)
+    pipeline._pending.append(object())
+    pipeline._draining = True
+
+    def crash(batch):
+        raise RuntimeError("unexpected")
+
+    monkeypatch.setattr(pipeline, "_run_batch", crash)
+    with pytest.raises(RuntimeError):
+        pipeline._drain()
+    assert pipeline._draining is False
@@ -32,9 +32,12 @@ const BlogPostCard = ({ post }) => {
   const postId = post?.id || '#'; // Fallback for link, though an ID should always exist
   const authorName = post?.owner?.username || 'Unknown Author';
   const createdAtDate = formatDate(post?.created_at);
-  const contentPreview = post?.content 
-    ? (post.content.substring(0, 150) + (post.content.length > 150 ? '...' : '')) 
-    : 'No content preview available.';
+  // Listings return a server-computed excerpt; fall back to truncating full content if present.
+  const contentPreview = post?.excerpt
+    ? post.excerpt
+    : post?.content 
+      ? (post.content.substring(0, 150) + (post.content.length > 150 ? '...' : '')) 
+      : 'No content preview available.';
 
   return (
     <Box
@@ -1,4 +1,4 @@
-import React, { useEffect, useState, useCallback } from 'react';
+import React, { useEffect, useState, useCallback, useRef } from 'react';
 import {
   Box,
   Container,
@@ -44,6 +44,23 @@ const HomePage = () => {
     fetchPosts();
   }, [fetchPosts]);
 
+  // Refresh when posts change instead of polling; a burst of events triggers a single refetch.
+  const refreshTimer = useRef(null);
+  useEffect(() => {
+    const unsubscribe = apiService.subscribeToPostEvents((type, data) => {
+      if (type === 'post_deleted') {
+        setPosts((current) => current.filter((post) => post.id !== data.id));
+        return;
+      }
+      clearTimeout(refreshTimer.current);
+      refreshTimer.current = setTimeout(fetchPosts, 500);
+    });
+    return () => {
+      clearTimeout(refreshTimer.current);
+      unsubscribe();
+    };
+  }, [fetchPosts]);
+
   return (
     <Box as="main" flexGrow={1} py={{ base: '1rem', md: '2rem' }}>
       <Container maxW="container.xl">
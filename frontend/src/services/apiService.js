@@ -53,6 +53,15 @@ export const getPostById = async (postId) => {
   return apiClient.get(`/posts/${postId}`);
 };
 
+// Up to 100 posts in one request: { items (in the order of postIds), missing (ids not found) }.
+export const getPostsByIds = async (postIds) => {
+  return apiClient.get('/posts/batch', { params: { ids: postIds.join(',') } });
+};
+
+export const getUsersByIds = async (userIds) => {
+  return apiClient.get('/users/batch', { params: { ids: userIds.join(',') } });
+};
+
 export const updatePost = async (postId, postData) => {
   return apiClient.put(`/posts/${postId}`, postData);
 };
@@ -64,6 +73,16 @@ export const deletePost = async (postId) => {
 // Consolidating all functions into a single default export object is a common pattern.
 // Alternatively, each function could be a named export without this additional object.
 // The current approach is fine.
+// Server-Sent Events for post changes. EventSource reconnects on its own and resumes from the
+// last event it saw; a 'reset' event means some were missed. Returns a function closing the stream.
+export const subscribeToPostEvents = (onEvent) => {
+  const source = new EventSource(`${API_URL}/posts/stream`);
+  ['post_created', 'post_updated', 'post_deleted', 'reset'].forEach((type) => {
+    source.addEventListener(type, (event) => onEvent(type, JSON.parse(event.data)));
+  });
+  return () => source.close();
+};
+
 const apiService = {
   loginUser,
   registerUser,
@@ -71,8 +90,11 @@ const apiService = {
   createPost,
   getPosts,
   getPostById,
+  getPostsByIds,
+  getUsersByIds,
   updatePost,
   deletePost,
+  subscribeToPostEvents,
 };
 
 export default apiService;
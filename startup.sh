@@ -39,6 +39,8 @@ if [ -d "frontend" ] && [ -f "frontend/package.json" ]; then
       npm install
       echo "Building frontend assets..."
       npm run build
+      echo "Precompressing frontend assets..."
+      (cd ../backend && python -m app.static_files compress ../frontend/build)
   fi
   cd ..
 else
@@ -46,12 +48,9 @@ else
   echo "Ensure frontend is set up with a 'build' script in package.json for full functionality."
 fi
 
-# Run database migrations (Alembic) - Kept commented as per original intent for now.
-# The application itself will handle initial table creation if Alembic is not used.
-# echo "Running database migrations..."
-# alembic upgrade head
-
 echo "Starting FastAPI application on port 9000..."
-# Run Uvicorn server, accessible on the network
-# --reload flag removed for production suitability.
-uvicorn backend.app.main:app --host 0.0.0.0 --port 9000
+# app.serve sets up the database schema once, then runs WEB_CONCURRENCY uvicorn workers
+# (default: one per CPU) that share cache invalidations and report their load.
+# Run from the project root so a relative DATABASE_URL resolves here, as it always has.
+# SIGHUP restarts the workers one at a time; SIGTERM drains in-flight requests before exiting.
+python -m backend.app.serve --host 0.0.0.0 --port 9000